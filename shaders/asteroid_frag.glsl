@@ -0,0 +1,27 @@
+#version 330
+
+// Input vertex attributes (from vertex shader)
+in vec3 fragPosition;
+in vec3 fragNormal;
+
+// Input uniform values
+uniform vec4 colDiffuse;
+
+// Input lighting values
+uniform vec4 ambient;
+uniform vec3 sunPos;
+
+// Output fragment color
+out vec4 finalColor;
+
+void main()
+{
+    vec3 sunDir = normalize(sunPos - fragPosition);
+    float lightDot = max(dot(normalize(fragNormal), sunDir), 0.0);
+
+    finalColor = colDiffuse*vec4(lightDot, lightDot, lightDot, 1.0);
+    finalColor += colDiffuse*(ambient/10.0);
+
+    // Gamma correction
+    finalColor = pow(finalColor, vec4(1.0/2.2));
+}
@@ -0,0 +1,25 @@
+#version 330
+
+// Input vertex attributes
+in vec3 vertexPosition;
+in vec3 vertexNormal;
+in mat4 matModel;
+
+// Input uniform values
+uniform mat4 matProjection;
+uniform mat4 matView;
+
+// Output vertex attributes (to fragment shader)
+out vec3 fragPosition;
+out vec3 fragNormal;
+
+void main()
+{
+    // Send vertex attributes to fragment shader
+    fragPosition = vec3(matModel*vec4(vertexPosition, 1.0));
+    // asteroids are scaled a little differently along each axis, close enough for lighting
+    fragNormal = normalize(mat3(matModel)*vertexNormal);
+
+    // Calculate final vertex position
+    gl_Position = matProjection*matView*vec4(fragPosition, 1.0);
+}
@@ -128,16 +128,28 @@ uniform bool ridge;
 // Invert resulting noise
 uniform bool invert;
 
-const float PI = 3.1415926535;
+// Size of a face of the cubemap, and of the border around it (in pixels, see cubemap.py)
+uniform float faceSize;
+uniform float gutter;
+
+// Direction of a point of a face of the cubemap (st between -1 and 1), in the order and orientation used by OpenGL
+vec3 cubeDirection(int face, vec2 st) {
+	if (face == 0) return vec3(1.0, -st.y, -st.x);
+	if (face == 1) return vec3(-1.0, -st.y, st.x);
+	if (face == 2) return vec3(st.x, 1.0, st.y);
+	if (face == 3) return vec3(st.x, -1.0, -st.y);
+	if (face == 4) return vec3(st.x, -st.y, 1.0);
+	return vec3(-st.x, -st.y, -1.0);
+}
 
 void main() {
-	vec2 coord = (fragTexCoord - 0.5) * vec2(2.0*PI, PI);
-
-	float x = cos(coord.y) * sin(coord.x);
-	float y = cos(coord.y) * cos(coord.x);
-	float z = sin(coord.y);
+	// the faces are laid out in 3 columns and 2 rows, with a border continuing them
+	// (the rows are drawn upside down in the render texture)
+	vec2 cells = vec2(fragTexCoord.x, 1.0 - fragTexCoord.y)*vec2(3.0, 2.0);
+	vec2 cell = min(floor(cells), vec2(2.0, 1.0));
+	vec2 st = ((cells - cell)*(faceSize + 2.0*gutter) - gutter)/faceSize*2.0 - 1.0;
 
-	vec3 p = vec3(x, y, z)*scale + vec3(pos, 0.0);
+	vec3 p = normalize(cubeDirection(int(cell.y)*3 + int(cell.x), st))*scale + vec3(pos, 0.0);
 
 	float amp = 1.0;
 	float freq = 1.0;
@@ -10,32 +10,25 @@ uniform mat4 mvp;
 uniform mat4 matModel;
 uniform mat4 matNormal;
 
-uniform sampler2D texture0;
+// height of the terrain in every direction (see noise.py)
+uniform samplerCube heightMap;
 
 // Output vertex attributes (to fragment shader)
 out vec3 fragPosition;
 out vec4 fragColor;
 out vec3 unrotatedNormal;
-out vec3 fragNormal;
-
-const float PI = 3.1415926535;
 
 void main() {
-    // Calculate UV coordinates from normal
-	float u = atan(vertexNormal.x, vertexNormal.y)/(2*PI) + 0.5;
-	float v = asin(vertexNormal.z)/PI + 0.5;
-
-    // Texel color fetching from texture sampler
-    vec4 texelColor = texture(texture0, vec2(u, v));
+    // the cubemap is sampled with the direction of the vertex
+    float height = texture(heightMap, vertexNormal).r;
 
     vec3 pos = vertexPosition;
-    pos += vertexNormal*texelColor.r /6;
+    pos += vertexNormal*height/6;
 
     // Send vertex attributes to fragment shader
     fragPosition = vec3(matModel*vec4(pos, 1.0));
     fragColor = vertexColor;
 	unrotatedNormal = vertexNormal;
-    fragNormal = normalize(vec3(matNormal*vec4(vertexNormal, 1.0)));
 
     // Calculate final vertex position
     gl_Position = mvp*vec4(pos, 1.0);
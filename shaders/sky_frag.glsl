@@ -1,10 +1,16 @@
 #version 330
 
+// Input vertex attributes (from vertex shader)
+in vec3 fragDirection;
+
+// stars and nebula, baked for the current system
+uniform samplerCube environmentMap;
+
 // Output fragment color
 out vec4 finalColor;
 
 void main()
 {
     // Calculate final fragment color
-    finalColor = vec4(1.0, 1.0, 1.0, 1.0);
+    finalColor = vec4(texture(environmentMap, fragDirection).rgb, 1.0);
 }
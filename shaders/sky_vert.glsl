@@ -2,17 +2,22 @@
 
 // Input vertex attributes
 in vec3 vertexPosition;
-in mat4 matModel;
 
 // Input uniform values
 uniform mat4 matProjection;
 uniform mat4 matView;
 
+// Output vertex attributes (to fragment shader)
+out vec3 fragDirection;
+
 void main()
 {
-    // Remove translation from the view matrix
+    // the cube's vertices are directions from the camera
+    fragDirection = vertexPosition;
+
+    // Remove translation from the view matrix, so that the sky is centered on the camera
     mat4 rotView = mat4(mat3(matView));
-    vec4 clipPos = matProjection*rotView*matModel*vec4(vertexPosition, 1.0);
+    vec4 clipPos = matProjection*rotView*vec4(vertexPosition, 1.0);
 
     // Calculate final vertex position
     gl_Position = clipPos;
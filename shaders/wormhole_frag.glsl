@@ -108,7 +108,6 @@ float ridge(vec3 p) {
 // Input vertex attributes (from vertex shader)
 in vec3 fragPosition;
 in vec4 fragColor;
-in vec3 fragNormal;
 in vec3 unrotatedNormal;
 
 // Output fragment color
@@ -0,0 +1,29 @@
+#version 330
+
+// Input vertex attributes
+in vec3 vertexPosition;
+in vec3 vertexNormal;
+in vec4 vertexColor;
+
+// Input uniform values
+uniform mat4 mvp;
+uniform mat4 matModel;
+
+// Output vertex attributes (to fragment shader)
+out vec3 fragPosition;
+out vec4 fragColor;
+out vec3 unrotatedNormal;
+
+void main() {
+    // the wormhole has no terrain: it is displaced like a planet at the top of its heightmap
+    vec3 pos = vertexPosition;
+    pos += vertexNormal/6;
+
+    // Send vertex attributes to fragment shader
+    fragPosition = vec3(matModel*vec4(pos, 1.0));
+    fragColor = vertexColor;
+	unrotatedNormal = vertexNormal;
+
+    // Calculate final vertex position
+    gl_Position = mvp*vec4(pos, 1.0);
+}
@@ -0,0 +1,77 @@
+from math import radians, tan
+
+import numpy as np
+import pyray as rl
+from pyray import Camera3D
+from raylib import ffi
+
+from belt import AsteroidBelt
+from frustum import Frustum
+from icosphere import load_icosphere
+from shaders import AsteroidMaterial
+from utils import vec3_to_array
+
+# asteroids smaller than this on screen (radius in pixels) aren't drawn
+MIN_PROJECTED_RADIUS = 0.5
+
+class Asteroids:
+    """
+    Draws all the asteroids of a belt in a single instanced draw call,
+    only the asteroids in the camera's frustum and big enough on screen are drawn.
+    Their matrices are computed by `update` (while the simulation is locked), then drawn by `draw`.
+    """
+
+    def __init__(self, capacity: int = 0):
+        # asteroids are small, a rough sphere is enough
+        self.model = load_icosphere(1).create_mesh()
+        self.mat = AsteroidMaterial()
+
+        self.capacity = 0
+        self.transforms = ffi.NULL
+        self.reserve(capacity)
+        # number of asteroids to draw this frame
+        self.count = 0
+
+    def reserve(self, capacity: int):
+        """Makes sure that the matrix buffer can hold the given number of asteroids"""
+        if capacity <= self.capacity:
+            return
+        if self.capacity > 0:
+            rl.mem_free(self.transforms)
+        self.transforms = ffi.cast("Matrix *", rl.mem_alloc(capacity*ffi.sizeof("Matrix")))
+        self.capacity = capacity
+
+    def update(self, belt: AsteroidBelt | None, camera: Camera3D, frustum: Frustum, screen_height: float, alpha: float = 1.0) -> int:
+        """
+        Computes the matrices of the visible asteroids, interpolated between the previous (`alpha` = 0) and current state.
+        Returns how many asteroids will be drawn.
+        """
+        self.count = 0
+        if belt == None:
+            return 0
+        pos, rotation = belt.interpolated(alpha)
+
+        # skip the asteroids that are off-screen or too far away to be seen
+        visible = frustum.spheres_visible(pos, belt.radius)
+        distance = np.linalg.norm(pos - vec3_to_array(camera.position), axis=1)
+        pixels_per_unit = screen_height / (2*tan(radians(camera.fovy) / 2))
+        visible &= belt.radius*pixels_per_unit >= MIN_PROJECTED_RADIUS*distance
+        idx = np.nonzero(visible)[0]
+        if len(idx) == 0:
+            return 0
+
+        matrices = belt.transforms(idx, pos[idx], rotation[idx])
+        self.reserve(len(idx))
+        ffi.memmove(self.transforms, ffi.from_buffer(matrices), matrices.nbytes)
+        self.count = len(idx)
+        return self.count
+
+    def draw(self):
+        if self.count > 0:
+            rl.draw_mesh_instanced(self.model, self.mat.mat, self.transforms, self.count)
+
+    def unload(self):
+        rl.unload_mesh(self.model)
+        if self.capacity > 0:
+            rl.mem_free(self.transforms)
+        self.capacity = 0
@@ -0,0 +1,186 @@
+from math import pi
+from typing import Self
+
+import numpy as np
+
+from gravity import INTERACTION_DURATION, INTERACTION_SLACK, THETA, TREE_THRESHOLD, Interactions, OrbitTree, gravity_acceleration
+
+# mass of an asteroid per cubed unit of radius (about the density of the planets)
+ASTEROID_DENSITY = 0.01
+# a gravity tree is built every this many seconds of simulation (its nodes get bigger as the asteroids drift apart)
+TREE_LIFETIME = 15.0
+# number of gravity trees kept (the predictor uses the trees of the next seconds)
+MAX_TREES = 8
+
+class AsteroidBelt:
+    """
+    Thousands of small bodies on circular orbits in a ring around the sun, stored in compact arrays.
+    Asteroids don't attract each other or the planets, and their gravity is approximated with a Barnes-Hut tree
+    in big belts (see `OrbitTree`). Collisions are only checked against the asteroids when the point is inside the ring.
+    """
+
+    def __init__(self, count: int, inner: float, outer: float, thickness: float, G: float, sun_mass: float, seed_value: int):
+        """
+        Generates `count` asteroids between the `inner` and `outer` radius,
+        up to `thickness` above or below the orbital plane (the generation is given by the seed)
+        """
+        gen = np.random.default_rng(seed_value)
+        self.count = count
+        self.inner = inner
+        self.outer = outer
+        self.thickness = thickness
+
+        # asteroids are denser towards the middle of the ring and close to the plane
+        self.orbit_radius = inner + (outer - inner)*(gen.random(count) + gen.random(count))/2
+        self.height = thickness*(gen.random(count)*2 - 1)**3
+        self.orbit_angle = gen.random(count)*2*pi
+        # angular speed of circular orbits around the sun (see `BodyTable.angular_speeds`)
+        self.speed = np.sqrt(G*sun_mass / self.orbit_radius**3)
+
+        self.radius = (1.5 + 3.5*gen.random(count)**3).astype(np.float32)
+        self.mass = ASTEROID_DENSITY*self.radius.astype(np.float64)**3
+        self.rotation = gen.random(count)*2*pi
+        self.rotation_speed = gen.normal(0.0, 0.5, count)
+
+        # random orientation and (non uniform) scale of the unit sphere, so that every asteroid looks different
+        axes = np.linalg.qr(gen.normal(size=(count, 3, 3)))[0]
+        scale = self.radius[:, None]*gen.uniform(0.6, 1.0, (count, 3))
+        self.shape = (axes*scale[:, None, :]).astype(np.float32)
+
+        self.center = np.zeros(3)
+        self.prev_angle = self.orbit_angle.copy()
+        self.prev_rotation = self.rotation.copy()
+        self.pos = np.zeros((count, 3))
+
+        # simulation time of the belt
+        self.time = 0.0
+        # gravity trees by time (built at multiples of `TREE_LIFETIME`)
+        self.trees: dict[int, OrbitTree] = {}
+        # last interaction list, reused while the point doesn't move much (like in the predictor)
+        self.interactions: Interactions | None = None
+
+        self.place(self.center)
+
+    def copy(self) -> Self:
+        """Returns an independent copy of the belt's state (constant attributes are shared)"""
+        belt = object.__new__(AsteroidBelt)
+        belt.__dict__.update(self.__dict__)
+        # trees only depend on the time, they are shared
+        belt.trees = dict(self.trees)
+        belt.interactions = None
+        for name in ("orbit_angle", "rotation", "prev_angle", "prev_rotation", "pos", "center"):
+            setattr(belt, name, getattr(self, name).copy())
+        return belt
+
+    def positions(self, angles: np.ndarray) -> np.ndarray:
+        """Positions of the asteroids for the given orbit angles (of all asteroids, or shape (..., count))"""
+        pos = np.empty(angles.shape + (3,))
+        pos[..., 0] = np.cos(angles)*self.orbit_radius
+        pos[..., 1] = self.height
+        pos[..., 2] = np.sin(angles)*self.orbit_radius
+        return pos + self.center
+
+    def place(self, center: np.ndarray):
+        """Computes the positions for the current orbit angles (around the given center)"""
+        if not np.array_equal(center, self.center):
+            self.center = center.copy()
+            self.trees.clear()
+        self.pos = self.positions(self.orbit_angle)
+
+    def orbit(self, dt: float, center: np.ndarray):
+        """Moves the asteroids along their orbit around the given center (the sun's position)"""
+        self.orbit_angle += dt*self.speed
+        self.rotation += dt*self.rotation_speed
+        self.time += dt
+        self.place(center)
+
+    def save_state(self):
+        """Keeps the current state as the previous one (for the interpolation of the rendering)"""
+        self.prev_angle[:] = self.orbit_angle
+        self.prev_rotation[:] = self.rotation
+
+    def acceleration_at(self, G: float, point: np.ndarray, t: float = 0.0, theta: float = THETA) -> np.ndarray:
+        """
+        Returns the gravitational acceleration caused by the asteroids at the given point, `t` seconds from now.
+        Small belts are summed exactly, big ones use the tree with the given opening angle (0 to sum them exactly too).
+        """
+        if self.count < TREE_THRESHOLD or theta <= 0.0:
+            pos = self.pos if t == 0.0 else self.positions(self.orbit_angle + self.speed*t)
+            return gravity_acceleration(G*self.mass, pos, point)
+
+        tree, tree_t = self.tree_at(self.time + t)
+        if self.interactions == None or not self.interactions.valid(tree, theta, point, tree_t):
+            self.interactions = tree.interactions(point, tree_t, theta, INTERACTION_SLACK, INTERACTION_DURATION)
+        return self.interactions.acceleration_at(G, point, tree_t)
+
+    def tree_at(self, time: float) -> tuple[OrbitTree, float]:
+        """
+        Returns the gravity tree closest to the given simulation time (building it if needed),
+        and the time from when it was built
+        """
+        key = round(time / TREE_LIFETIME)
+        tree = self.trees.get(key)
+        if tree == None:
+            angle = self.orbit_angle + self.speed*(key*TREE_LIFETIME - self.time)
+            tree = OrbitTree(self.center, self.mass, self.orbit_radius, angle, self.height, self.speed)
+            self.trees[key] = tree
+            if len(self.trees) > MAX_TREES:
+                # drop the trees of the past first, then the ones furthest in the future
+                now = round(self.time / TREE_LIFETIME)
+                del self.trees[max((k for k in self.trees if k != key), key=lambda k: (k < now, abs(k - now)))]
+        return tree, time - key*TREE_LIFETIME
+
+    def in_ring(self, points: np.ndarray) -> np.ndarray:
+        """Checks which points (shape (..., 3)) are in the volume where asteroids can be"""
+        margin = float(self.radius.max(initial=0.0))
+        d = points - self.center
+        r_sqr = d[..., 0]**2 + d[..., 2]**2
+        return (
+            (r_sqr >= max(self.inner - margin, 0.0)**2)
+            & (r_sqr <= (self.outer + margin)**2)
+            & (np.abs(d[..., 1]) <= self.thickness + margin)
+        )
+
+    def collision(self, point: np.ndarray) -> int:
+        """Returns the index of an asteroid containing the given point (its bounding sphere), or -1 if there is none"""
+        if self.count == 0 or not self.in_ring(point):
+            return -1
+        dir = self.pos - point
+        hits = np.nonzero(np.einsum("ij,ij->i", dir, dir) <= self.radius.astype(np.float64)**2)[0]
+        return int(hits[0]) if len(hits) > 0 else -1
+
+    def first_collision(self, points: np.ndarray, times: np.ndarray) -> int:
+        """
+        Returns the index of the first point inside an asteroid, each point being at the given time (in seconds from now),
+        or -1 if no point hits an asteroid
+        """
+        if self.count == 0:
+            return -1
+        for i in np.nonzero(self.in_ring(points))[0]:
+            dir = self.positions(self.orbit_angle + self.speed*times[i]) - points[i]
+            if np.any(np.einsum("ij,ij->i", dir, dir) <= self.radius.astype(np.float64)**2):
+                return int(i)
+        return -1
+
+    def interpolated(self, alpha: float) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the positions and rotations of the asteroids, interpolated between the previous (`alpha` = 0) and current state"""
+        angles = self.prev_angle + (self.orbit_angle - self.prev_angle)*alpha
+        rotation = self.prev_rotation + (self.rotation - self.prev_rotation)*alpha
+        return self.positions(angles), rotation
+
+    def transforms(self, idx: np.ndarray, pos: np.ndarray, rotation: np.ndarray) -> np.ndarray:
+        """
+        Model matrices of the given asteroids (at the given positions and rotations), in raylib's memory layout.
+        Asteroids spin around the vertical axis.
+        """
+        shape = self.shape[idx]
+        c = np.cos(rotation).astype(np.float32)[:, None]
+        s = np.sin(rotation).astype(np.float32)[:, None]
+
+        m = np.zeros((len(idx), 4, 4), dtype=np.float32)
+        m[:, 0, :3] = c*shape[:, 0] + s*shape[:, 2]
+        m[:, 1, :3] = shape[:, 1]
+        m[:, 2, :3] = -s*shape[:, 0] + c*shape[:, 2]
+        m[:, :3, 3] = pos
+        m[:, 3, 3] = 1.0
+        return m
@@ -0,0 +1,167 @@
+"""
+Deterministic benchmarks of the physics core, runnable without a window or a GPU.
+
+Usage: python source/bench.py [--sizes 3 7 20 50] [--asteroids 10000] [--repeat 200] [--seed 1234] [--json results.json]
+"""
+
+import argparse
+import json
+from math import pi, sqrt
+import time
+from typing import Callable
+
+import numpy as np
+import pyray as rl
+from pyray import Vector3
+
+from cubemap import atlas_faces, atlas_size, surface_normals
+from gravity import OrbitTree
+from heightmap import bake
+from icosphere import gen_icosphere
+from integrators import VelocityVerlet
+from map import Map
+from noise import TERRAIN_HEIGHT, NoiseParams
+from player import Player
+from predictor import predict
+from system import LARGE_BELT_SIZE, PLANET_FACE_SIZE, NewSystem, System
+from utils import randf, vec3_to_array
+
+G = 5
+DT = 1 / 60
+
+def measure(fn: Callable[[], object], repeat: int) -> dict[str, float]:
+    """Runs `fn` `repeat` times and returns statistics of its duration (in milliseconds)"""
+    fn() # warm up
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start)*1000)
+
+    return summarize(np.array(times))
+
+def summarize(times: np.ndarray, percentiles: tuple[int, ...] = (99,)) -> dict[str, float]:
+    """Statistics of durations (in milliseconds), with the given percentiles"""
+    stats = {
+        "min": float(times.min()),
+        "mean": float(times.mean()),
+    }
+    for p in percentiles:
+        stats[f"p{p}"] = float(np.percentile(times, p))
+    return stats
+
+def new_player(speed: float = 5.0) -> Player:
+    return Player(
+        Vector3(0, 0, -1300),
+        Vector3(speed, 0, 0),
+        rl.Camera3D(Vector3(0, 0, -150), Vector3(0, 0, 0), Vector3(0, 1, 0), 60, rl.CameraProjection.CAMERA_PERSPECTIVE),
+        rl.quaternion_from_euler(0, pi, 0),
+        rl.quaternion_from_euler(0, pi, 0)
+    )
+
+def new_system(seed: int, nb_planet: int, nb_asteroids: int = 0) -> System:
+    sys = NewSystem(headless=True).new_sys(G, seed, nb_planet, nb_asteroids)
+    for planet in sys.planets():
+        planet.orbit_angle = randf() * 2 * pi
+    sys.place(G)
+    return sys
+
+def bench_system(seed: int, nb_planet: int, repeat: int) -> dict[str, dict[str, float]]:
+    """Benchmarks the physics of a seeded system with the given number of planets"""
+    sys = new_system(seed, nb_planet)
+    # orbit around the sun so that predictions don't stop early because of a collision
+    player = new_player(sqrt(G*sys.bodies[0].mass / 1300))
+    map = Map()
+
+    def map_update_cold():
+        map.cache.invalidate()
+        map.update(G, player, sys, 0.0)
+
+    def map_update_coasting():
+        map.update(G, player, sys, 0.0)
+
+    # point right above the surface of the first planet (low resolution terrain to keep the benchmark short)
+    for planet in sys.planets():
+        planet.load_terrain(atlas_size(40))
+    planet = sys.bodies[1]
+    surface_point = vec3_to_array(planet.pos) + np.array((0.0, planet.radius*1.1, 0.0))
+
+    return {
+        "System.update": measure(lambda: sys.update(G, DT), repeat),
+        "BodyTable.collision (surface)": measure(lambda: sys.table.collision(surface_point), repeat),
+        "BVH.refit": measure(lambda: sys.update_broadphase(), repeat),
+        "BVH.ray_cast": measure(lambda: sys.broadphase.ray_cast(vec3_to_array(player.pos), np.array((0.0, 0.0, 1.0))), repeat),
+        "BVH.query_radius": measure(lambda: sys.broadphase.query_radius(surface_point, 250.0), repeat),
+        "BodyTable.compute_transforms (all dirty)": measure(lambda: (sys.table.dirty.fill(True), sys.table.compute_transforms()), repeat),
+        "BodyTable.compute_transforms (clean)": measure(lambda: sys.table.compute_transforms(), repeat),
+        "Player.step": measure(lambda: new_player().step(G, DT, sys.table), repeat),
+        "predict (1000 steps)": measure(lambda: predict(sys.table, G, vec3_to_array(player.pos), vec3_to_array(player.vel), 1/2, 1000, VelocityVerlet()), max(repeat//20, 1)),
+        "Map.update (recompute)": measure(map_update_cold, repeat),
+        "Map.update (coasting)": measure(map_update_coasting, repeat),
+    }
+
+def bench_belt(seed: int, nb_asteroids: int, repeat: int) -> dict[str, dict[str, float]]:
+    """Benchmarks the physics of a seeded system with an asteroid belt of the given size"""
+    sys = new_system(seed, 7, nb_asteroids)
+    belt = sys.table.belt
+    assert(belt != None)
+    player = new_player(sqrt(G*sys.bodies[0].mass / 1300))
+
+    # point in the middle of the ring, where every asteroid has to be checked
+    ring_point = belt.center + np.array((0.0, 0.0, (belt.inner + belt.outer)/2))
+    everything = np.arange(belt.count)
+
+    def matrices():
+        pos, rotation = belt.interpolated(0.5)
+        belt.transforms(everything, pos, rotation)
+
+    return {
+        "System.update": measure(lambda: sys.update(G, DT), repeat),
+        "Player.step": measure(lambda: new_player().step(G, DT, sys.table), repeat),
+        "AsteroidBelt.collision (ring)": measure(lambda: belt.collision(ring_point), repeat),
+        "OrbitTree (build)": measure(lambda: OrbitTree(belt.center, belt.mass, belt.orbit_radius, belt.orbit_angle, belt.height, belt.speed), max(repeat//10, 1)),
+        "belt gravity (tree)": measure(lambda: belt.acceleration_at(G, ring_point, 1.0), repeat),
+        "belt gravity (exact)": measure(lambda: belt.acceleration_at(G, ring_point, 1.0, 0.0), repeat),
+        "asteroid matrices (all)": measure(matrices, repeat),
+        "predict (1000 steps)": measure(lambda: predict(sys.table, G, vec3_to_array(player.pos), vec3_to_array(player.vel), 1/2, 1000, VelocityVerlet()), max(repeat//20, 1)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3, 7, 20, 50], help="number of planets of the benchmarked systems")
+    parser.add_argument("--asteroids", type=int, default=LARGE_BELT_SIZE, help="number of asteroids of the benchmarked belt (0 to skip it)")
+    parser.add_argument("--repeat", type=int, default=200, help="number of runs of each benchmark")
+    parser.add_argument("--seed", type=int, default=1234, help="seed of the generated systems")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results: dict[str, dict[str, dict[str, float]]] = {}
+    for size in args.sizes:
+        results[f"{size} planets"] = bench_system(args.seed, size, args.repeat)
+    if args.asteroids > 0:
+        results[f"{args.asteroids} asteroids"] = bench_belt(args.seed, args.asteroids, args.repeat)
+    results["icosphere"] = {
+        f"gen_icosphere({level})": measure(lambda: gen_icosphere(level), max(args.repeat//50, 1))
+        for level in (3, 4, 6)
+    }
+    # a quarter of the planets' resolution, with the maximum number of octaves
+    params = NoiseParams(atlas_size(96), (2.0, 2.0, 2.0), (1234, 5678), 8, 2.0, 0.5, 1.0, True, False)
+    # normals of a planet's full resolution heightmap (done once per planet when its texture is finished)
+    faces = atlas_faces(np.random.default_rng(args.seed).integers(0, 256, atlas_size(PLANET_FACE_SIZE)[::-1], dtype=np.uint8))
+    results["heightmap"] = {
+        f"bake ({params.size[0]}x{params.size[1]}, 8 octaves)": measure(lambda: bake(params), max(args.repeat//50, 1)),
+        f"surface_normals ({PLANET_FACE_SIZE})": measure(lambda: surface_normals(faces, TERRAIN_HEIGHT), max(args.repeat//50, 1)),
+    }
+
+    for group, benchmarks in results.items():
+        print(f"== {group}")
+        for name, stats in benchmarks.items():
+            print(f"  {name:<30} min {stats['min']:8.3f} ms   mean {stats['mean']:8.3f} ms   p99 {stats['p99']:8.3f} ms")
+
+    if args.json != None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+from math import inf, sqrt
+
+import numpy as np
+
+# maximum number of bodies in a leaf
+LEAF_SIZE = 4
+
+class BVH:
+    """
+    Bounding volume hierarchy (of axis aligned boxes) over the bounding spheres of the bodies,
+    to find the bodies along a ray, closest to a point or around a point without testing all of them.
+    The tree is built once, then only its boxes are refitted when the bodies move.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.centers = np.zeros((0, 3))
+        self.radii = np.zeros(0)
+
+        # nodes are stored in depth first order, so children always come after their parent
+        self.lo = np.zeros((0, 3))
+        self.hi = np.zeros((0, 3))
+        self.left = np.zeros(0, dtype=np.intp)
+        self.right = np.zeros(0, dtype=np.intp)
+        # range of the leaves in `order` (empty for inner nodes)
+        self.start = np.zeros(0, dtype=np.intp)
+        self.size = np.zeros(0, dtype=np.intp)
+        # inner nodes of each depth, from the deepest to the root
+        self.inner_levels: list[np.ndarray] = []
+        # bodies sorted so that the bodies of every leaf are contiguous
+        self.order = np.zeros(0, dtype=np.intp)
+
+    def build(self, centers: np.ndarray, radii: np.ndarray):
+        """Builds the tree over the given spheres (splitting every node in the middle of its longest axis)"""
+        n = len(centers)
+        self.count = n
+        order = np.arange(n)
+
+        lo, hi, left, right, start, size, depth = [], [], [], [], [], [], []
+        def build_node(first: int, last: int, d: int) -> int:
+            node = len(lo)
+            for column in (lo, hi):
+                column.append(np.zeros(3))
+            left.append(-1)
+            right.append(-1)
+            start.append(first)
+            size.append(0)
+            depth.append(d)
+
+            if last - first <= LEAF_SIZE:
+                size[node] = last - first
+                return node
+
+            # split at the median along the axis where the centers are the most spread out
+            idx = order[first:last]
+            axis = int(np.argmax(np.ptp(centers[idx], axis=0)))
+            middle = (last - first) // 2
+            order[first:last] = idx[np.argpartition(centers[idx, axis], middle)]
+
+            left[node] = build_node(first, first + middle, d + 1)
+            right[node] = build_node(first + middle, last, d + 1)
+            return node
+
+        if n > 0:
+            build_node(0, n, 0)
+
+        self.order = order
+        self.lo = np.array(lo).reshape(-1, 3)
+        self.hi = np.array(hi).reshape(-1, 3)
+        self.left = np.array(left, dtype=np.intp)
+        self.right = np.array(right, dtype=np.intp)
+        self.start = np.array(start, dtype=np.intp)
+        self.size = np.array(size, dtype=np.intp)
+
+        depth = np.array(depth, dtype=np.intp)
+        inner = self.size == 0
+        self.inner_levels = [np.nonzero(inner & (depth == d))[0] for d in range(int(depth.max(initial=0)), -1, -1)]
+
+        self.refit(centers, radii)
+
+    def refit(self, centers: np.ndarray, radii: np.ndarray):
+        """Updates the boxes of the tree for the new position and size of the spheres (which must be the same ones)"""
+        assert(len(centers) == self.count)
+        if self.count == 0:
+            return
+
+        sorted_centers = centers[self.order]
+        sorted_radii = radii[self.order]
+        body_lo = sorted_centers - sorted_radii[:, None]
+        body_hi = sorted_centers + sorted_radii[:, None]
+
+        # new arrays are swapped in at the end, so that queries from another thread see a consistent tree
+        lo = np.empty_like(self.lo)
+        hi = np.empty_like(self.hi)
+
+        # leaves cover `order` from start to end (in the same order), so every leaf
+        # is reduced from its start up to the next leaf's start
+        leaves = np.nonzero(self.size > 0)[0]
+        lo[leaves] = np.minimum.reduceat(body_lo, self.start[leaves])
+        hi[leaves] = np.maximum.reduceat(body_hi, self.start[leaves])
+
+        for nodes in self.inner_levels:
+            lo[nodes] = np.minimum(lo[self.left[nodes]], lo[self.right[nodes]])
+            hi[nodes] = np.maximum(hi[self.left[nodes]], hi[self.right[nodes]])
+
+        self.centers, self.radii = centers.copy(), radii.copy()
+        self.lo, self.hi = lo, hi
+
+    def update(self, centers: np.ndarray, radii: np.ndarray):
+        """Refits the tree, or rebuilds it if the number of spheres changed"""
+        if len(centers) != self.count:
+            self.build(centers, radii)
+        else:
+            self.refit(centers, radii)
+
+    def leaf_bodies(self, node: int) -> np.ndarray:
+        return self.order[self.start[node]:self.start[node] + self.size[node]]
+
+    def ray_cast(self, origin: np.ndarray, direction: np.ndarray, max_distance: float = inf) -> tuple[int, float]:
+        """
+        Returns the first sphere hit by the ray (in front of the origin) and the distance to the hit,
+        or (-1, inf) if the ray doesn't hit anything. The direction must be normalized.
+        Spheres containing the origin are hit where the ray leaves them.
+        """
+        if self.count == 0:
+            return -1, inf
+        lo, hi, centers, radii = self.lo, self.hi, self.centers, self.radii
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inv_dir = 1.0 / direction
+
+        best, best_t = -1, max_distance
+        stack = [0]
+        while len(stack) > 0:
+            node = stack.pop()
+
+            # slab test
+            with np.errstate(invalid="ignore"):
+                t1 = (lo[node] - origin) * inv_dir
+                t2 = (hi[node] - origin) * inv_dir
+            t_near = np.nanmax(np.minimum(t1, t2))
+            t_far = np.nanmin(np.maximum(t1, t2))
+            if t_near > t_far or t_far < 0 or t_near > best_t:
+                continue
+
+            if self.size[node] == 0:
+                stack.append(self.left[node])
+                stack.append(self.right[node])
+                continue
+
+            bodies = self.leaf_bodies(node)
+            to_center = origin - centers[bodies]
+            b = to_center @ direction
+            c = np.einsum("ij,ij->i", to_center, to_center) - radii[bodies]**2
+            disc = b*b - c
+            for body, bi, ci, di in zip(bodies.tolist(), b.tolist(), c.tolist(), disc.tolist()):
+                if di < 0:
+                    continue
+                # closest intersection in front of the origin (where the ray leaves the sphere if the origin is inside it)
+                t = -bi - sqrt(di) if ci > 0 else -bi + sqrt(di)
+                if t <= 0:
+                    continue
+                if t < best_t:
+                    best, best_t = body, t
+
+        return best, (best_t if best >= 0 else inf)
+
+    def nearest(self, point: np.ndarray) -> tuple[int, float]:
+        """Returns the sphere whose surface is the closest to the point and the distance to it (negative inside)"""
+        if self.count == 0:
+            return -1, inf
+        lo, hi, centers, radii = self.lo, self.hi, self.centers, self.radii
+
+        best, best_dist = -1, inf
+        stack = [0]
+        while len(stack) > 0:
+            node = stack.pop()
+
+            # distance to the box is a lower bound of the distance to the spheres inside it
+            box_dist = float(np.linalg.norm(np.maximum(np.maximum(lo[node] - point, point - hi[node]), 0.0)))
+            if box_dist >= best_dist:
+                continue
+
+            if self.size[node] == 0:
+                stack.append(self.left[node])
+                stack.append(self.right[node])
+                continue
+
+            bodies = self.leaf_bodies(node)
+            dist = np.linalg.norm(centers[bodies] - point, axis=1) - radii[bodies]
+            i = int(np.argmin(dist))
+            if dist[i] < best_dist:
+                best, best_dist = int(bodies[i]), float(dist[i])
+
+        return best, best_dist
+
+    def query_radius(self, point: np.ndarray, radius: float) -> list[int]:
+        """Returns every sphere closer than `radius` to the point (0 for the spheres containing the point)"""
+        if self.count == 0:
+            return []
+        lo, hi, centers, radii = self.lo, self.hi, self.centers, self.radii
+
+        found = []
+        stack = [0]
+        while len(stack) > 0:
+            node = stack.pop()
+
+            box_dist_sqr = float(np.sum(np.maximum(np.maximum(lo[node] - point, point - hi[node]), 0.0)**2))
+            if box_dist_sqr > radius*radius:
+                continue
+
+            if self.size[node] == 0:
+                stack.append(self.left[node])
+                stack.append(self.right[node])
+                continue
+
+            bodies = self.leaf_bodies(node)
+            dir = centers[bodies] - point
+            inside = np.einsum("ij,ij->i", dir, dir) <= (radii[bodies] + radius)**2
+            found.extend(bodies[inside].tolist())
+
+        return found
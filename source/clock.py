@@ -0,0 +1,90 @@
+import threading
+import time
+from typing import Callable
+
+class FixedStepScheduler:
+    """
+    Runs the simulation at a fixed tick rate, independently of the rendering frame rate.
+    Ticks either run on the render thread (consuming the accumulated frame time),
+    or on their own thread. Rendering should interpolate between the last two ticks with `alpha`.
+    """
+
+    def __init__(self, tick: Callable[[float], None], tick_rate: float = 60.0, threaded: bool = False, max_ticks: int = 5):
+        self.tick = tick
+        self.dt = 1 / tick_rate
+        self.threaded = threaded
+        # maximum number of ticks run to catch up in one frame (avoids the "spiral of death")
+        self.max_ticks = max_ticks
+
+        self.paused = False
+        # held while ticking, acquire it before reading the simulation state from another thread
+        self.lock = threading.RLock()
+
+        self.accumulator = 0.0
+        self.last_tick = time.perf_counter()
+
+        self.running = False
+        self.thread: threading.Thread | None = None
+
+    def start(self):
+        """Starts the simulation thread (only in threaded mode)"""
+        if not self.threaded or self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the simulation thread"""
+        self.running = False
+        if self.thread != None:
+            self.thread.join()
+            self.thread = None
+
+    def update(self, frame_time: float):
+        """Runs the ticks that are due since the last frame (does nothing in threaded mode)"""
+        if self.threaded:
+            return
+        if self.paused:
+            self.accumulator = 0.0
+            return
+
+        self.accumulator += frame_time
+        ticks = 0
+        while self.accumulator >= self.dt and ticks < self.max_ticks:
+            self.tick(self.dt)
+            self.accumulator -= self.dt
+            ticks += 1
+
+        # we can't keep up: drop the remaining time and slow the game down instead
+        if ticks == self.max_ticks:
+            self.accumulator = min(self.accumulator, self.dt)
+
+    def alpha(self) -> float:
+        """How far the current frame is between the last two ticks (0 = previous tick, 1 = last tick)"""
+        if self.paused:
+            return 1.0
+        if self.threaded:
+            elapsed = time.perf_counter() - self.last_tick
+        else:
+            elapsed = self.accumulator
+        return min(max(elapsed / self.dt, 0.0), 1.0)
+
+    def run(self):
+        """Simulation thread loop"""
+        next_tick = time.perf_counter()
+        while self.running:
+            now = time.perf_counter()
+            if now < next_tick:
+                time.sleep(next_tick - now)
+                continue
+
+            with self.lock:
+                if not self.paused:
+                    self.tick(self.dt)
+                self.last_tick = time.perf_counter()
+
+            next_tick += self.dt
+            # too far behind, don't try to catch up
+            if self.last_tick - next_tick > self.max_ticks*self.dt:
+                next_tick = self.last_tick
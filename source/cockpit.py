@@ -50,6 +50,7 @@ class Cockpit:
             draw_text_centered(f"{selected.oxygen}% de 0²", top_right_screen, font_size, GREEN)
             draw_text_centered(f"{selected.temp} °C", bottom_screen, font_size, GREEN)
         else:
+            # bodies less than 250 units away from the player
             if rl.vector_3distance_sqr(player.pos, selected.pos) > (selected.radius + 250)**2:
                 draw_text_centered("TOO FAR TO SCAN", bottom_screen, font_size, GREEN)
             else:
@@ -6,3 +6,4 @@ WHITE = Color(255, 255, 255, 255)
 BLANK = Color(0, 0, 0, 0)
 RED = Color(255, 0, 0, 255)
 GREEN = Color(0, 255, 0, 255)
+GRAY = Color(130, 130, 130, 255)
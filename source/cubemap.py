@@ -0,0 +1,161 @@
+"""
+Layout of cubemaps: directions of their texels, and the texture atlas in which planets' heightmaps are generated.
+"""
+
+import numpy as np
+import pyray as rl
+from pyray import Rectangle, RenderTexture, Texture, Vector2
+from raylib import CUBEMAP_LAYOUT_LINE_VERTICAL, PIXELFORMAT_UNCOMPRESSED_GRAYSCALE, PIXELFORMAT_UNCOMPRESSED_R8G8B8, RL_ATTACHMENT_COLOR_CHANNEL0, RL_ATTACHMENT_CUBEMAP_POSITIVE_X, ffi
+
+from colors import WHITE
+
+# texels around every face of an atlas, continuing the face's plane, so that neighbors can be read without changing faces
+GUTTER = 2
+
+def face_points(face: np.ndarray, sc: np.ndarray, tc: np.ndarray) -> np.ndarray:
+    """
+    Directions (shape (..., 3), not normalized) of the points of cubemap faces at the given coordinates (between -1 and 1),
+    in the order and orientation used by OpenGL (+X, -X, +Y, -Y, +Z, -Z)
+    """
+    one = np.ones_like(sc)
+    return np.stack((
+        np.choose(face, [one, -one, sc, sc, sc, -sc]),
+        np.choose(face, [-tc, -tc, one, -one, -tc, -tc]),
+        np.choose(face, [-sc, sc, tc, -tc, one, -one]),
+    ), axis=-1)
+
+def face_directions(size: int) -> np.ndarray:
+    """Directions of the texel centers of the 6 faces of a cubemap (shape (6, size, size, 3), not normalized)"""
+    coords = (np.arange(size) + 0.5) / size * 2 - 1
+    tc, sc = np.meshgrid(coords, coords, indexing="ij")
+    return face_points(np.arange(6)[:, None, None], sc[None], tc[None])
+
+def face_coords(dirs: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Face and texture coordinates (between 0 and 1) of the given directions in a cubemap (inverse of `face_directions`)"""
+    x, y, z = dirs[:, 0], dirs[:, 1], dirs[:, 2]
+    axis = np.argmax(np.abs(dirs), axis=1)
+    # (the center of the cube has no face, any is fine)
+    major = np.maximum(np.abs(dirs[np.arange(len(dirs)), axis]), 1e-12)
+    face = 2*axis + (dirs[np.arange(len(dirs)), axis] < 0)
+
+    # (sc, tc) of every face, see the OpenGL specification
+    sc = np.choose(face, [-z, z, x, x, x, -x])
+    tc = np.choose(face, [-y, -y, z, -z, -y, -y])
+    return face, (sc/major + 1)/2, (tc/major + 1)/2
+
+def atlas_size(face_size: int) -> tuple[int, int]:
+    """
+    Size of a texture holding the 6 faces of a cubemap of the given size, with their gutter:
+    3 faces per row, the first row (+X, -X, +Y) in the first rows of pixels
+    """
+    cell = face_size + 2*GUTTER
+    return 3*cell, 2*cell
+
+def atlas_face_size(size: tuple[int, int]) -> int:
+    """Size of the faces of an atlas of the given size (inverse of `atlas_size`)"""
+    return size[0]//3 - 2*GUTTER
+
+def atlas_faces(atlas: np.ndarray) -> np.ndarray:
+    """Faces of an atlas (shape (height, width, ...)), with their gutter (shape (6, cell, cell, ...))"""
+    cell = atlas.shape[0] // 2
+    rows = atlas.reshape(2, cell, 3, cell, *atlas.shape[2:])
+    return np.ascontiguousarray(rows.swapaxes(1, 2)).reshape(6, cell, cell, *atlas.shape[2:])
+
+def atlas_directions(size: tuple[int, int], u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """
+    Directions (shape (..., 3), not normalized) of the points of an atlas at the given texture coordinates,
+    as drawn in a render texture (`v` going up from the last row of pixels, see shaders/noise_frag.glsl)
+    """
+    face_size = atlas_face_size(size)
+    x, y = np.asarray(u)*3, (1.0 - np.asarray(v))*2
+    cx, cy = np.minimum(np.floor(x), 2), np.minimum(np.floor(y), 1)
+    face = (cy*3 + cx).astype(np.intp)
+    cell = face_size + 2*GUTTER
+    sc = ((x - cx)*cell - GUTTER) / face_size * 2 - 1
+    tc = ((y - cy)*cell - GUTTER) / face_size * 2 - 1
+    return face_points(face, sc, tc)
+
+# normalized directions of the texels of atlases' faces, with their gutter, by size of the faces with their gutter
+cell_directions: dict[int, np.ndarray] = {}
+
+def atlas_cell_directions(cell: int) -> np.ndarray:
+    """Normalized directions of the texels of the 6 faces of an atlas, with their gutter (shape (6, cell, cell, 3), as 32 bit floats)"""
+    if cell not in cell_directions:
+        size = cell - 2*GUTTER
+        coords = ((np.arange(cell) - GUTTER + 0.5) / size * 2 - 1).astype(np.float32)
+        tc, sc = np.meshgrid(coords, coords, indexing="ij")
+        dirs = face_points(np.arange(6)[:, None, None], sc[None], tc[None])
+        cell_directions[cell] = dirs / np.linalg.norm(dirs, axis=-1, keepdims=True)
+    return cell_directions[cell]
+
+def surface_normals(faces: np.ndarray, height_scale: float) -> np.ndarray:
+    """
+    Normals of a unit sphere displaced by the faces of a heightmap (bytes, with their gutter, see `atlas_faces`) times `height_scale`,
+    encoded as bytes (shape (6, size, size, 3), without the gutter)
+    """
+    cell = faces.shape[1]
+    size = cell - 2*GUTTER
+    points = atlas_cell_directions(cell)*(1 + faces[..., None]*np.float32(height_scale / 255))
+
+    # differences between the neighbors on both sides of every texel, the gutter holds the ones of the texels on the edges
+    inner = slice(GUTTER, GUTTER + size)
+    ds = points[:, inner, 2*GUTTER:] - points[:, inner, :size]
+    dt = points[:, 2*GUTTER:, inner] - points[:, :size, inner]
+
+    # all the faces have the same orientation, this cross product points out of the sphere
+    normals = np.stack((
+        dt[..., 1]*ds[..., 2] - dt[..., 2]*ds[..., 1],
+        dt[..., 2]*ds[..., 0] - dt[..., 0]*ds[..., 2],
+        dt[..., 0]*ds[..., 1] - dt[..., 1]*ds[..., 0],
+    ), axis=-1)
+    normals /= np.sqrt(np.einsum("...i,...i->...", normals, normals))[..., None]
+    return (normals*127.5 + 128).astype(np.uint8)
+
+def cubemap_format(faces: np.ndarray) -> int:
+    """Pixel format of a cubemap with the given faces (shape (6, size, size) or (6, size, size, 3), as bytes)"""
+    return PIXELFORMAT_UNCOMPRESSED_GRAYSCALE if faces.ndim == 3 else PIXELFORMAT_UNCOMPRESSED_R8G8B8
+
+def faces_image(faces: np.ndarray, strip: np.ndarray) -> rl.Image:
+    """Image of the faces of a cubemap one below the other (`strip` being them as contiguous bytes, which must be kept alive)"""
+    size = faces.shape[1]
+    return rl.Image(ffi.cast("void *", ffi.from_buffer(strip)), size, 6*size, 1, cubemap_format(faces))
+
+def load_cubemap(faces: np.ndarray) -> Texture:
+    """Uploads the faces of a cubemap (shape (6, size, size) or (6, size, size, 3), as bytes)"""
+    # faces one below the other, which is already how OpenGL expects them
+    strip = np.ascontiguousarray(faces, dtype=np.uint8)
+    return rl.load_texture_cubemap(faces_image(faces, strip), CUBEMAP_LAYOUT_LINE_VERTICAL)
+
+# 2D textures the faces are uploaded to before being drawn into a cubemap (by size and format),
+# and the framebuffer the faces of the cubemaps are attached to
+staging_textures: dict[tuple[int, int], Texture] = {}
+staging_framebuffer = 0
+
+def update_cubemap(cubemap: Texture, faces: np.ndarray):
+    """
+    Replaces the faces of a cubemap (of the same size and format, see `load_cubemap`) without allocating a new one.
+    raylib can only upload the pixels of 2D textures, so the faces are uploaded to a 2D texture then drawn into each face.
+    """
+    global staging_framebuffer
+    size = faces.shape[1]
+    assert((cubemap.width, cubemap.format) == (size, cubemap_format(faces)))
+
+    strip = np.ascontiguousarray(faces, dtype=np.uint8)
+    key = (size, cubemap.format)
+    if key not in staging_textures:
+        staging_textures[key] = rl.load_texture_from_image(faces_image(faces, strip))
+    else:
+        rl.update_texture(staging_textures[key], ffi.from_buffer(strip))
+    staging = staging_textures[key]
+
+    if staging_framebuffer == 0:
+        staging_framebuffer = rl.rl_load_framebuffer(size, size)
+    target = RenderTexture(staging_framebuffer, cubemap, Texture(0, 0, 0, 0, 0))
+
+    for face in range(6):
+        # (attaching unbinds the framebuffer, so it's done before texture mode binds it)
+        rl.rl_framebuffer_attach(staging_framebuffer, cubemap.id, RL_ATTACHMENT_COLOR_CHANNEL0, RL_ATTACHMENT_CUBEMAP_POSITIVE_X + face, 0)
+        rl.begin_texture_mode(target)
+        # texture mode draws the first row of pixels at the bottom: flip the face so that its rows stay in the same order
+        rl.draw_texture_pro(staging, Rectangle(0, face*size, size, -size), Rectangle(0, 0, size, size), Vector2(0, 0), 0, WHITE)
+        rl.end_texture_mode()
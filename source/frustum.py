@@ -0,0 +1,64 @@
+from math import radians, tan
+
+import numpy as np
+from pyray import Camera3D
+
+from heightmap import TERRAIN_HEIGHT
+from utils import vec3_to_array
+
+# near clipping distance used by raylib for perspective cameras
+# (there is no far plane: the game is built with a raylib fork that draws everything in front of the camera)
+CULL_DISTANCE_NEAR = 0.01
+
+# displaced terrain can go up to this much further than a sphere's radius (see planet_vert.glsl)
+TERRAIN_MARGIN = 1 + TERRAIN_HEIGHT
+
+class Frustum:
+    """
+    Volume seen by a perspective camera, used to skip drawing the bodies that are off-screen.
+    Keeps count of the spheres tested and culled since it was created.
+    """
+
+    def __init__(self, camera: Camera3D, aspect: float, near: float = CULL_DISTANCE_NEAR):
+        position = vec3_to_array(camera.position)
+        forward = vec3_to_array(camera.target) - position
+        forward /= np.linalg.norm(forward)
+        right = np.cross(forward, vec3_to_array(camera.up))
+        right /= np.linalg.norm(right)
+        up = np.cross(right, forward)
+
+        # half extents of the view at a distance of 1
+        half_height = tan(radians(camera.fovy) / 2)
+        half_width = half_height * aspect
+
+        # inward normals of the planes, the 4 side planes go through the camera position
+        normals = np.array([
+            forward,
+            np.cross(forward - right*half_width, up),
+            np.cross(up, forward + right*half_width),
+            np.cross(right, forward - up*half_height),
+            np.cross(forward + up*half_height, right),
+        ])
+        normals /= np.linalg.norm(normals, axis=1)[:, None]
+
+        # planes as (normal, d) so that a point p is inside when dot(normal, p) + d >= 0
+        self.planes = np.empty((5, 4))
+        self.planes[:, :3] = normals
+        self.planes[:, 3] = -normals @ position
+        self.planes[0, 3] -= near
+
+        self.tested = 0
+        self.culled = 0
+
+    def spheres_visible(self, centers: np.ndarray, radii: np.ndarray) -> np.ndarray:
+        """Returns which of the given spheres are (at least partially) inside the frustum"""
+        distances = centers @ self.planes[:, :3].T + self.planes[:, 3]
+        visible = np.all(distances >= -radii[:, None], axis=1)
+
+        self.tested += len(visible)
+        self.culled += len(visible) - int(np.count_nonzero(visible))
+        return visible
+
+    def sphere_visible(self, center: np.ndarray, radius: float) -> bool:
+        """Returns whether the given sphere is (at least partially) inside the frustum"""
+        return bool(self.spheres_visible(center[None, :], np.array([radius]))[0])
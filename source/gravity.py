@@ -0,0 +1,262 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# bodies closer than this distance don't attract (avoids numerical explosion)
+MIN_DISTANCE = 0.05
+
+# opening angle of the tree: a node is approximated by its center of mass
+# when its size seen from the point is smaller than this (in radians, roughly)
+THETA = 0.5
+# below this number of bodies, gravity is summed exactly instead of using a tree
+TREE_THRESHOLD = 256
+# maximum number of bodies in a leaf of the tree
+LEAF_SIZE = 16
+# maximum depth of the tree (cells are never smaller than 1/2^depth of the root)
+MAX_DEPTH = 8
+# interaction lists are reused for points this close and for this many seconds (see `Interactions`)
+INTERACTION_SLACK = 20.0
+INTERACTION_DURATION = 2.0
+
+def gravity_acceleration(gm: np.ndarray, body_pos: np.ndarray, point: np.ndarray) -> np.ndarray:
+    """
+    Returns the gravitational acceleration at the given point,
+    caused by bodies with the given positions and masses (multiplied by G)
+    """
+    dir = body_pos - point
+    dist_sqr = np.einsum("ij,ij->i", dir, dir)
+    dist_cube = dist_sqr*np.sqrt(dist_sqr)
+
+    # G * m / d^2 along the normalized direction
+    factor = gm / np.maximum(dist_cube, MIN_DISTANCE**3)
+    factor[dist_cube < MIN_DISTANCE**3] = 0.0 # avoid numerical explosion
+    return factor @ dir
+
+def rotate_y(local: np.ndarray, angle: np.ndarray) -> np.ndarray:
+    """Rotates the points (relative to the center of their orbit) along their orbit by the given angles"""
+    c, s = np.cos(angle), np.sin(angle)
+    rotated = local.copy()
+    rotated[:, 0] = c*local[:, 0] - s*local[:, 2]
+    rotated[:, 2] = s*local[:, 0] + c*local[:, 2]
+    return rotated
+
+def ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of the ranges [start; end[ (without a python loop)"""
+    counts = ends - starts
+    if len(counts) == 0:
+        return counts
+    total = counts.cumsum()
+    offsets = (starts - total + counts).repeat(counts)
+    return offsets + np.arange(int(total[-1]))
+
+def morton_codes(cells: np.ndarray, depth: int) -> np.ndarray:
+    """Interleaves the bits of the cell coordinates (shape (n, 3)), so that sorting the codes sorts the cells along a Z-order curve"""
+    codes = np.zeros(len(cells), dtype=np.uint64)
+    for bit in range(depth):
+        for axis in range(3):
+            codes |= ((cells[:, axis] >> bit) & 1).astype(np.uint64) << np.uint64(3*bit + axis)
+    return codes
+
+@dataclass
+class TreeLevel:
+    """Nodes of one depth of the tree"""
+    # range of the node's bodies (in the tree's order)
+    start: np.ndarray
+    end: np.ndarray
+    mass: np.ndarray
+    # center of mass, relative to the center of the orbits
+    com: np.ndarray
+    # mean angular speed of the bodies (weighted by their mass)
+    speed: np.ndarray
+    # radius of the sphere around the center of mass containing every body
+    size: np.ndarray
+    # how fast the bodies spread away from the center of mass (since they orbit at different speeds)
+    spread: np.ndarray
+    leaf: np.ndarray
+    # range of the children in the next level
+    child_start: np.ndarray
+    child_end: np.ndarray
+
+class OrbitTree:
+    """
+    Barnes-Hut octree over bodies on circular orbits around a common center (the asteroids of a belt),
+    to approximate their gravity far away by the center of mass of groups of bodies.
+    The tree is built for the bodies' positions at one time, but can be evaluated at any time from it:
+    every node turns around the center at the mean speed of its bodies, and its size grows with time
+    since its bodies drift apart (so nodes are opened more and more often, until the tree is rebuilt).
+    """
+
+    def __init__(self, center: np.ndarray, mass: np.ndarray, orbit_radius: np.ndarray, angle: np.ndarray, height: np.ndarray, speed: np.ndarray,
+                 leaf_size: int = LEAF_SIZE, depth: int = MAX_DEPTH):
+        self.center = center.copy()
+        n = len(mass)
+        self.count = n
+
+        local = np.stack((np.cos(angle)*orbit_radius, height, np.sin(angle)*orbit_radius), axis=1)
+
+        # sort the bodies along a Z-order curve, so that the bodies of every node are contiguous
+        lo = local.min(axis=0, initial=0.0)
+        extent = max(float(np.ptp(local, axis=0).max(initial=0.0)), 1e-9)
+        cells = np.minimum(((local - lo) / extent * 2**depth).astype(np.int64), 2**depth - 1)
+        codes = morton_codes(cells, depth)
+        order = np.argsort(codes, kind="stable")
+        codes = codes[order]
+
+        self.mass = mass[order]
+        self.orbit_radius = orbit_radius[order]
+        self.angle = angle[order]
+        self.height = height[order]
+        self.speed = speed[order]
+        local = local[order]
+
+        self.levels: list[TreeLevel] = []
+        if n == 0:
+            return
+
+        # cells of every depth, as the start of their range (the cells of a depth are split into the cells of the next one)
+        starts = []
+        for level in range(depth + 1):
+            key = codes >> np.uint64(3*(depth - level))
+            starts.append(np.concatenate(([0], np.flatnonzero(key[1:] != key[:-1]) + 1)).astype(np.intp))
+
+        # statistics of the deepest cells from their bodies, then of every cell from its children (much fewer than the bodies)
+        stats = [self.cell_stats(starts[depth], self.mass, local*self.mass[:, None], self.speed*self.mass,
+                                 self.orbit_radius, self.speed, self.speed, local, np.zeros(n))]
+        for level in range(depth - 1, -1, -1):
+            child = stats[0]
+            first_child = np.searchsorted(starts[level + 1], starts[level])
+            stats.insert(0, self.cell_stats(first_child, child["mass"], child["moment"], child["speed_moment"],
+                                            child["max_radius"], child["min_speed"], child["max_speed"], child["com"], child["size"]))
+
+        # only the cells under a split cell are nodes (leaves aren't split)
+        parent_start, parent_inner = np.zeros(1, dtype=np.intp), np.ones(1, dtype=bool)
+        for level in range(depth + 1):
+            start = starts[level]
+            end = np.append(start[1:], n)
+            cells = stats[level]
+
+            keep = parent_inner[np.searchsorted(parent_start, start, side="right") - 1]
+            start, end = start[keep], end[keep]
+            leaf = (end - start <= leaf_size) | (level == depth)
+            weight = np.where(cells["mass"] > 0, cells["mass"], 1.0)
+            self.levels.append(TreeLevel(
+                start, end, cells["mass"][keep], cells["com"][keep], (cells["speed_moment"] / weight)[keep], cells["size"][keep],
+                (cells["max_radius"]*(cells["max_speed"] - cells["min_speed"]))[keep], leaf,
+                np.zeros(len(start), dtype=np.intp), np.zeros(len(start), dtype=np.intp)
+            ))
+
+            parent_start, parent_inner = start, ~leaf
+            if np.all(leaf):
+                break
+
+        # children of every node are contiguous in the next level
+        for parent, children in zip(self.levels, self.levels[1:]):
+            parent_of_child = np.searchsorted(parent.start, children.start, side="right") - 1
+            nodes = np.arange(len(parent.start))
+            parent.child_start = np.searchsorted(parent_of_child, nodes, side="left")
+            parent.child_end = np.searchsorted(parent_of_child, nodes, side="right")
+
+    def positions_at(self, idx: np.ndarray, t: float) -> np.ndarray:
+        """Positions of the given bodies (in the tree's order) `t` seconds after the tree was built"""
+        angle = self.angle[idx] + self.speed[idx]*t
+        r = self.orbit_radius[idx]
+        return np.stack((np.cos(angle)*r, self.height[idx], np.sin(angle)*r), axis=1) + self.center
+
+    @staticmethod
+    def cell_stats(first: np.ndarray, mass: np.ndarray, moment: np.ndarray, speed_moment: np.ndarray,
+                   max_radius: np.ndarray, min_speed: np.ndarray, max_speed: np.ndarray, com: np.ndarray, size: np.ndarray) -> dict[str, np.ndarray]:
+        """
+        Statistics of cells made of contiguous parts (bodies or smaller cells) starting at `first`, from the statistics of the parts.
+        The size of a cell is bounded by its parts' size (the exact size for bodies, which have a size of 0).
+        """
+        cell_mass = np.add.reduceat(mass, first)
+        cell_moment = np.add.reduceat(moment, first)
+        cell_com = cell_moment / np.where(cell_mass > 0, cell_mass, 1.0)[:, None]
+
+        cell = np.repeat(np.arange(len(first)), np.diff(np.append(first, len(mass))))
+        dir = com - cell_com[cell]
+        return {
+            "mass": cell_mass,
+            "moment": cell_moment,
+            "speed_moment": np.add.reduceat(speed_moment, first),
+            "max_radius": np.maximum.reduceat(max_radius, first),
+            "min_speed": np.minimum.reduceat(min_speed, first),
+            "max_speed": np.maximum.reduceat(max_speed, first),
+            "com": cell_com,
+            "size": np.maximum.reduceat(np.sqrt(np.einsum("ij,ij->i", dir, dir)) + size, first),
+        }
+
+    def interactions(self, point: np.ndarray, t: float = 0.0, theta: float = THETA, slack: float = 0.0, duration: float = 0.0) -> "Interactions":
+        """
+        Returns what attracts the given point `t` seconds after the tree was built: the center of mass of the nodes far enough
+        (seen under an angle smaller than `theta`), and the bodies of the other leaves.
+        The result stays valid for points up to `slack` away and for `duration` more seconds (nodes have to be further away).
+        """
+        masses, coms, speeds = [], [], []
+        leaf_start, leaf_end = [], []
+        nodes = np.zeros(1 if self.count > 0 and len(self.levels) > 0 else 0, dtype=np.intp)
+        for level in self.levels:
+            if len(nodes) == 0:
+                break
+            com = rotate_y(level.com[nodes], level.speed[nodes]*t) + self.center
+            dir = com - point
+            dist = np.sqrt(np.einsum("ij,ij->i", dir, dir))
+            size = level.size[nodes] + level.spread[nodes]*(abs(t) + duration) + slack
+            far = size < theta*(dist - slack)
+
+            accepted = nodes[far]
+            masses.append(level.mass[accepted])
+            coms.append(level.com[accepted])
+            speeds.append(level.speed[accepted])
+
+            near = nodes[~far]
+            is_leaf = level.leaf[near]
+            leaf_start.append(level.start[near[is_leaf]])
+            leaf_end.append(level.end[near[is_leaf]])
+
+            inner = near[~is_leaf]
+            nodes = ranges(level.child_start[inner], level.child_end[inner])
+
+        # bodies of the leaves that are too close are exact
+        bodies = ranges(np.concatenate(leaf_start, dtype=np.intp), np.concatenate(leaf_end, dtype=np.intp))
+        return Interactions(
+            self, np.concatenate(masses), np.concatenate(coms).reshape(-1, 3), np.concatenate(speeds), bodies, self.mass[bodies],
+            theta, point.copy(), t, slack, duration
+        )
+
+    def acceleration_at(self, G: float, point: np.ndarray, t: float = 0.0, theta: float = THETA) -> np.ndarray:
+        """Returns the approximate gravitational acceleration caused by the bodies at the given point, `t` seconds after the tree was built"""
+        return self.interactions(point, t, theta).acceleration_at(G, point, t)
+
+@dataclass
+class Interactions:
+    """
+    Interaction list of a point (see `OrbitTree.interactions`): everything attracting it, either a node or a body.
+    It can be reused for nearby points and times, which is much cheaper than going through the tree again.
+    """
+    tree: OrbitTree
+    # approximated nodes (center of mass relative to the center of the orbits)
+    mass: np.ndarray
+    com: np.ndarray
+    speed: np.ndarray
+    # exact bodies
+    bodies: np.ndarray
+    body_mass: np.ndarray
+    # for which opening angle, where and when it is valid
+    theta: float
+    point: np.ndarray
+    t: float
+    slack: float
+    duration: float
+
+    def valid(self, tree: OrbitTree, theta: float, point: np.ndarray, t: float) -> bool:
+        """Can the list be used with this tree for the given point and time (in seconds after the tree was built)?"""
+        if tree is not self.tree or theta != self.theta:
+            return False
+        dir = point - self.point
+        return bool(dir @ dir <= self.slack*self.slack) and self.t - self.duration <= t <= self.t + self.duration
+
+    def acceleration_at(self, G: float, point: np.ndarray, t: float) -> np.ndarray:
+        tree = self.tree
+        com = rotate_y(self.com, self.speed*t) + tree.center
+        return gravity_acceleration(G*self.mass, com, point) + gravity_acceleration(G*self.body_mass, tree.positions_at(self.bodies, t), point)
@@ -0,0 +1,177 @@
+"""
+CPU implementation of the noise generated by shaders/noise_frag.glsl, to get planet heightmaps without a GPU.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cubemap import GUTTER, atlas_directions, face_coords
+from noise import TERRAIN_HEIGHT, NoiseParams
+
+# number of rows computed at once (limits the size of the temporary arrays)
+CHUNK_ROWS = 32
+
+def mod289(x: np.ndarray) -> np.ndarray:
+    return x - np.floor(x * (1.0 / 289.0)) * 289.0
+
+def permute(x: np.ndarray) -> np.ndarray:
+    return mod289(((x*34.0) + 10.0)*x)
+
+def taylor_inv_sqrt(r: np.ndarray) -> np.ndarray:
+    return 1.79284291400159 - 0.85373472095314 * r
+
+def snoise(v: np.ndarray) -> np.ndarray:
+    """
+    3D simplex noise of every point (array of shape (..., 3)), same as `snoise` in noise_frag.glsl.
+    See https://github.com/stegu/webgl-noise
+    Components are kept in separate arrays (instead of vectors) since it's much faster with numpy.
+    """
+    vx, vy, vz = v[..., 0], v[..., 1], v[..., 2]
+
+    # First corner
+    s = (vx + vy + vz) * (1.0/3.0)
+    ix, iy, iz = np.floor(vx + s), np.floor(vy + s), np.floor(vz + s)
+    t = (ix + iy + iz) * (1.0/6.0)
+    x0, y0, z0 = vx - ix + t, vy - iy + t, vz - iz + t
+
+    # Other corners
+    gx, gy, gz = x0 >= y0, y0 >= z0, z0 >= x0
+    lx, ly, lz = ~gx, ~gy, ~gz
+    i1x, i1y, i1z = gx & lz, gy & lx, gz & ly
+    i2x, i2y, i2z = gx | lz, gy | lx, gz | ly
+
+    x1, y1, z1 = x0 - i1x + 1.0/6.0, y0 - i1y + 1.0/6.0, z0 - i1z + 1.0/6.0
+    x2, y2, z2 = x0 - i2x + 1.0/3.0, y0 - i2y + 1.0/3.0, z0 - i2z + 1.0/3.0
+    x3, y3, z3 = x0 - 0.5, y0 - 0.5, z0 - 0.5
+
+    ix, iy, iz = mod289(ix), mod289(iy), mod289(iz)
+
+    n_ = 0.142857142857 # 1.0/7.0
+    value = np.zeros(vx.shape)
+    # contribution of every corner
+    for cx, cy, cz, px, py, pz in (
+        (0, 0, 0, x0, y0, z0),
+        (i1x, i1y, i1z, x1, y1, z1),
+        (i2x, i2y, i2z, x2, y2, z2),
+        (1, 1, 1, x3, y3, z3)
+    ):
+        # Permutations
+        p = permute(permute(permute(iz + cz) + iy + cy) + ix + cx)
+
+        # Gradients: 7x7 points over a square, mapped onto an octahedron.
+        j = p - 49.0 * np.floor(p * n_ * n_) # mod(p,7*7)
+        x_ = np.floor(j * n_)
+        y_ = np.floor(j - 7.0 * x_) # mod(j,N)
+        ax = x_ * (2.0*n_) + (0.5*n_ - 1.0)
+        ay = y_ * (2.0*n_) + (0.5*n_ - 1.0)
+        h = 1.0 - np.abs(ax) - np.abs(ay)
+
+        sh = h <= 0.0
+        ax = ax - (np.floor(ax)*2.0 + 1.0)*sh
+        ay = ay - (np.floor(ay)*2.0 + 1.0)*sh
+
+        # Normalise gradients
+        norm = taylor_inv_sqrt(ax*ax + ay*ay + h*h)
+
+        # Mix final noise value
+        m = np.maximum(0.5 - (px*px + py*py + pz*pz), 0.0)
+        m = m * m
+        value += m*m * (ax*px + ay*py + h*pz)*norm
+    return 105.0 * value
+
+def noise_at(params: NoiseParams, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """
+    Value of the noise (between 0 and 1) at the given texture coordinates of the cubemap atlas,
+    as computed by the noise shader (`fragTexCoord` = (u, v))
+    """
+    points = atlas_directions(params.size, u, v)
+    points /= np.linalg.norm(points, axis=-1, keepdims=True)
+    p = points*np.array(params.scale) + np.array((params.pos[0], params.pos[1], 0.0))
+
+    amp = 1.0
+    freq = 1.0
+    value = np.zeros(u.shape)
+    # maximum possible value (to normalize)
+    maximum = 1.0
+
+    warp_noise = snoise(p)[..., None]
+    for _ in range(params.octaves):
+        value += snoise(p*freq + warp_noise*params.warp)*amp
+        maximum += amp
+        freq *= params.frequency
+        amp *= params.amplitude
+
+    if params.ridge:
+        value = np.abs(value)*-2.0 + 1.0
+    if params.invert:
+        value *= -1.0
+
+    # normalize value to [-1; 1]
+    value /= maximum
+    # normalize value to [0; 1]
+    return value*0.5 + 0.5
+
+def bake_rows(params: NoiseParams, start: int, end: int) -> np.ndarray:
+    """Computes the rows [start; end[ of the heightmap (see `bake`)"""
+    width, height = params.size
+    u = (np.arange(width) + 0.5) / width
+    # the noise is rendered upside down in the render texture
+    # (row 0 of the texture is drawn at the bottom of the render target)
+    v = 1.0 - (np.arange(start, end) + 0.5) / height
+    uu, vv = np.meshgrid(u, v)
+    # the render texture clamps values to [0; 1]
+    return np.clip(noise_at(params, uu, vv), 0.0, 1.0).astype(np.float32)
+
+def bake(params: NoiseParams, workers: int = 0) -> np.ndarray:
+    """
+    Computes the heightmap the GPU renders for the given noise parameters, on the CPU.
+    Returns an array of shape (height, width) with values between 0 and 1, in the same order as the texture's pixels
+    (the faces of a cubemap, see `atlas_faces`).
+    With `workers` > 0, the rows are split across that many processes.
+    """
+    height = params.size[1]
+    chunks = [(start, min(start + CHUNK_ROWS, height)) for start in range(0, height, CHUNK_ROWS)]
+
+    if workers <= 0:
+        rows = [bake_rows(params, start, end) for start, end in chunks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            rows = list(pool.map(bake_rows, [params]*len(chunks), *zip(*chunks)))
+
+    return np.concatenate(rows)
+
+def sample(faces: np.ndarray, dirs: np.ndarray) -> np.ndarray:
+    """
+    Samples the faces of a cubemap (with their gutter, see `atlas_faces`) in the given directions (shape (..., 3)),
+    with bilinear filtering like the planet shaders. Heightmaps of bytes are scaled to values between 0 and 1.
+    """
+    shape = dirs.shape[:-1]
+    face, u, v = face_coords(dirs.reshape(-1, 3))
+    cell = faces.shape[1]
+    size = cell - 2*GUTTER
+    # the gutter holds the neighbors of the texels on the edges of the face
+    x = np.clip(u*size - 0.5 + GUTTER, 0, cell - 1)
+    y = np.clip(v*size - 0.5 + GUTTER, 0, cell - 1)
+    x0, y0 = np.minimum(x.astype(np.intp), cell - 2), np.minimum(y.astype(np.intp), cell - 2)
+    fx, fy = x - x0, y - y0
+
+    values = (
+        (faces[face, y0, x0]*(1.0 - fx) + faces[face, y0, x0 + 1]*fx)*(1.0 - fy)
+        + (faces[face, y0 + 1, x0]*(1.0 - fx) + faces[face, y0 + 1, x0 + 1]*fx)*fy
+    )
+    if faces.dtype == np.uint8:
+        values /= 255.0
+    return values.reshape(shape)
+
+def terrain_radius(heights: np.ndarray, radius: float, rotation: float | np.ndarray, center: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """
+    Distance from the center of a planet to its displaced surface, in the direction of each point (shape (..., 3)).
+    `heights` are the faces of the planet's heightmap (see `atlas_faces`).
+    `rotation` is the planet's rotation (see `BodyTable.compute_transforms`), for all points or for each of them.
+    """
+    d = points - center
+    c, s = np.cos(rotation), np.sin(rotation)
+    # direction in the planet's model space (inverse of the rotation in `BodyTable.compute_transforms`)
+    local = np.stack((c*d[..., 0] + s*d[..., 2], -s*d[..., 0] + c*d[..., 2], -d[..., 1]), axis=-1)
+    return radius*(1.0 + sample(heights, local)*TERRAIN_HEIGHT)
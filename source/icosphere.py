@@ -1,14 +1,20 @@
 from dataclasses import dataclass
 from math import sqrt
-from pyray import Mesh, Vector3, vector3_add, vector3_normalize, vector3_scale
+import os
+
+import numpy as np
+from pyray import Mesh
 from raylib import ffi
 import pyray as rl
 
+from utils import CACHE_DIR
+
 @dataclass
 class SimpleMesh:
-    vertices: list[Vector3]
-    # faces with vertices indicated in counter-clockwise order
-    faces: list[tuple[int, int, int]]
+    # array of vertex positions (shape (n, 3))
+    vertices: np.ndarray
+    # faces with vertices indicated in counter-clockwise order (shape (m, 3))
+    faces: np.ndarray
 
     def create_mesh(self) -> Mesh:
         """Create a raylib mesh from the given simple mesh"""
@@ -16,25 +22,18 @@ class SimpleMesh:
         # raylib uses unsigned shorts for indices
         assert(len(self.vertices) < 2**16)
 
-        # create raylib mesh (copy python data to C memory buffers)
-        vertices = ffi.cast("float *", rl.mem_alloc(len(self.vertices)*3*ffi.sizeof("float")))
-        normals = ffi.cast("float *", rl.mem_alloc(len(self.vertices)*3*ffi.sizeof("float")))
-        faces = ffi.cast("unsigned short *", rl.mem_alloc(len(self.faces)*3*ffi.sizeof("unsigned short")))
+        # the normal is the same as the point's position since this is the unit sphere 
+        vertex_data = np.ascontiguousarray(self.vertices, dtype=np.float32)
+        face_data = np.ascontiguousarray(self.faces, dtype=np.uint16)
 
-        for i, v in enumerate(self.vertices):
-            vertices[i*3] = v.x
-            vertices[i*3 + 1] = v.y
-            vertices[i*3 + 2] = v.z
+        # create raylib mesh (copy the arrays to C memory buffers in one go)
+        vertices = ffi.cast("float *", rl.mem_alloc(vertex_data.nbytes))
+        normals = ffi.cast("float *", rl.mem_alloc(vertex_data.nbytes))
+        faces = ffi.cast("unsigned short *", rl.mem_alloc(face_data.nbytes))
 
-            # the normal is the same as the point's position since this is the unit sphere 
-            normals[i*3] = v.x
-            normals[i*3 + 1] = v.y
-            normals[i*3 + 2] = v.z
-
-        for i, (v0, v1, v2) in enumerate(self.faces):
-            faces[i*3] = v0
-            faces[i*3 + 1] = v1
-            faces[i*3 + 2] = v2
+        ffi.memmove(vertices, ffi.from_buffer(vertex_data), vertex_data.nbytes)
+        ffi.memmove(normals, ffi.from_buffer(vertex_data), vertex_data.nbytes)
+        ffi.memmove(faces, ffi.from_buffer(face_data), face_data.nbytes)
 
         # see https://github.com/raysan5/raylib/blob/9a8d73e6c32514275a0ba53fe528bcb7c2693e27/src/raylib.h#L339
         mesh = Mesh(
@@ -61,20 +60,20 @@ class SimpleMesh:
 def gen_icosahedron() -> SimpleMesh:
     phi = (1 + sqrt(5)) / 2
     vertices = [
-        Vector3(-1,  phi,  0),
-        Vector3( 1,  phi,  0),
-        Vector3(-1, -phi,  0),
-        Vector3( 1, -phi,  0),
-
-        Vector3( 0, -1,  phi),
-        Vector3( 0,  1,  phi),
-        Vector3( 0, -1, -phi),
-        Vector3( 0,  1, -phi),
-
-        Vector3( phi,  0, -1),
-        Vector3( phi,  0,  1),
-        Vector3(-phi,  0, -1),
-        Vector3(-phi,  0,  1)
+        (-1,  phi,  0),
+        ( 1,  phi,  0),
+        (-1, -phi,  0),
+        ( 1, -phi,  0),
+
+        ( 0, -1,  phi),
+        ( 0,  1,  phi),
+        ( 0, -1, -phi),
+        ( 0,  1, -phi),
+
+        ( phi,  0, -1),
+        ( phi,  0,  1),
+        (-phi,  0, -1),
+        (-phi,  0,  1)
     ]
     faces = [
         # 5 faces around point 0
@@ -105,26 +104,10 @@ def gen_icosahedron() -> SimpleMesh:
         (8, 6, 7),
         (9, 8, 1)
     ]
-    return SimpleMesh(vertices, faces)
-
-def midpoint(a: Vector3, b: Vector3) -> Vector3:
-    # (a+b)/2
-    return vector3_scale(vector3_add(a, b), 0.5)
+    return SimpleMesh(np.array(vertices, dtype=np.float64), np.array(faces, dtype=np.int64))
 
 def subdivide(ico: SimpleMesh):
     """Subdivide every triangle in the given icosahedron into 4 new triangles"""
-    # map vertices to their index
-    vertex_set = { v: i for i, v in enumerate(ico.vertices) }
-    faces = []
-
-    def add_vert(v: Vector3) -> int:
-        if v not in vertex_set:
-            idx = len(ico.vertices)
-            ico.vertices.append(v)
-            vertex_set[v] = idx
-            return idx
-        else:
-            return vertex_set[v]
 
     # subdivide every triangle into 4 new triangle
     #
@@ -136,28 +119,43 @@ def subdivide(ico: SimpleMesh):
     #  /          \          /   \  /   \
     # v2-----------v0      v2-----c-----v0
 
-    for v0, v1, v2 in ico.faces:
-        p0 = ico.vertices[v0]
-        p1 = ico.vertices[v1]
-        p2 = ico.vertices[v2]
+    v0, v1, v2 = ico.faces[:, 0], ico.faces[:, 1], ico.faces[:, 2]
+    # every edge of every face (as rows of a, b and c)
+    edges = np.concatenate((
+        np.stack((v0, v1), axis=1),
+        np.stack((v1, v2), axis=1),
+        np.stack((v2, v0), axis=1)
+    ))
+
+    # edges shared by two faces should only create one vertex:
+    # key every edge by its (sorted) pair of vertex indices and deduplicate them
+    n = len(ico.vertices)
+    keys = edges.min(axis=1)*n + edges.max(axis=1)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    lo, hi = unique_keys // n, unique_keys % n
 
-        a = add_vert(midpoint(p0, p1))
-        b = add_vert(midpoint(p1, p2))
-        c = add_vert(midpoint(p2, p0))
+    # (a+b)/2
+    midpoints = (ico.vertices[lo] + ico.vertices[hi]) * 0.5
+    ico.vertices = np.concatenate((ico.vertices, midpoints))
 
-        # keep faces in counter-clockwise order
-        faces.append((v0, a, c))
-        faces.append((a, v1, b))
-        faces.append((c, b, v2))
-        faces.append((a, b, c))
+    m = len(ico.faces)
+    mid = inverse.reshape(3, m) + n
+    a, b, c = mid[0], mid[1], mid[2]
 
-    ico.faces = faces
+    # keep faces in counter-clockwise order
+    ico.faces = np.stack((
+        np.stack((v0, a, c), axis=1),
+        np.stack((a, v1, b), axis=1),
+        np.stack((c, b, v2), axis=1),
+        np.stack((a, b, c), axis=1)
+    ), axis=1).reshape(-1, 3)
 
 def gen_icosphere(num: int) -> SimpleMesh:
     """
     Creates a unit icosphere mesh with the given number of subdivisions.
     Panics if the number of subdivisions is less or equal to 0.
-    Use `create_mesh` on the resulting object to create a drawable raylib mesh.
+    Use `create_mesh` on the resulting object to create a drawable raylib mesh
+    (only possible up to 6 subdivisions, since raylib uses 16 bit indices).
     """
     assert(num > 0)
 
@@ -166,6 +164,19 @@ def gen_icosphere(num: int) -> SimpleMesh:
         subdivide(current)
     
     # map icosahedron point to sphere
-    for i in range(len(current.vertices)):
-        current.vertices[i] = vector3_normalize(current.vertices[i])
+    current.vertices /= np.linalg.norm(current.vertices, axis=1)[:, None]
     return current
+
+def load_icosphere(num: int) -> SimpleMesh:
+    """Same as `gen_icosphere`, but the generated mesh is cached on disk"""
+    path = os.path.join(CACHE_DIR, f"icosphere_{num}.npz")
+    try:
+        with np.load(path) as data:
+            return SimpleMesh(data["vertices"], data["faces"])
+    except (OSError, KeyError, ValueError):
+        pass
+
+    mesh = gen_icosphere(num)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    np.savez(path, vertices=mesh.vertices.astype(np.float32), faces=mesh.faces.astype(np.uint32))
+    return mesh
@@ -0,0 +1,158 @@
+from typing import Callable, TypeAlias
+
+import numpy as np
+
+# acceleration at the given position and time
+Field: TypeAlias = Callable[[np.ndarray, float], np.ndarray]
+
+class Integrator:
+    """Advances a position and velocity through an acceleration field"""
+
+    # does the integrator choose its own time step?
+    adaptive = False
+
+    def step(self, field: Field, pos: np.ndarray, vel: np.ndarray, t: float, dt: float) -> tuple[np.ndarray, np.ndarray, float]:
+        """
+        Advances the state (at time `t`) by at most `dt`.
+        Returns the new position and velocity, and the time step that was actually taken.
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget any state kept between steps (use when the state is modified from the outside)"""
+        pass
+
+    def shift(self, dt: float):
+        """The times of the field moved back by `dt` (its bodies advanced): keep the state kept between steps valid"""
+        pass
+
+class SymplecticEuler(Integrator):
+    """
+    First order integrator (the one the game originally used):
+    gravity is applied to the velocity, then velocity to the position
+    """
+
+    def step(self, field: Field, pos: np.ndarray, vel: np.ndarray, t: float, dt: float) -> tuple[np.ndarray, np.ndarray, float]:
+        vel = vel + field(pos, t + dt)*dt
+        return pos + vel*dt, vel, dt
+
+class VelocityVerlet(Integrator):
+    """
+    Second order symplectic integrator (kick-drift-kick leapfrog).
+    Only one evaluation of the field per step, since the last acceleration is reused.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.last: tuple[float, np.ndarray, np.ndarray] | None = None
+
+    def shift(self, dt: float):
+        if self.last != None:
+            last_t, last_pos, last_acc = self.last
+            self.last = (last_t - dt, last_pos, last_acc)
+
+    def acceleration(self, field: Field, pos: np.ndarray, t: float) -> np.ndarray:
+        if self.last != None:
+            last_t, last_pos, last_acc = self.last
+            # (positions kept in raylib vectors between steps are rounded to 32 bit floats)
+            if last_t == t and np.allclose(last_pos, pos, rtol=1e-6, atol=0.0):
+                return last_acc
+        return field(pos, t)
+
+    def step(self, field: Field, pos: np.ndarray, vel: np.ndarray, t: float, dt: float) -> tuple[np.ndarray, np.ndarray, float]:
+        half_vel = vel + self.acceleration(field, pos, t)*(dt/2)
+        pos = pos + half_vel*dt
+        acc = field(pos, t + dt)
+        self.last = (t + dt, pos, acc)
+        return pos, half_vel + acc*(dt/2), dt
+
+class Yoshida4(Integrator):
+    """Fourth order symplectic integrator (three evaluations of the field per step)"""
+
+    # https://en.wikipedia.org/wiki/Leapfrog_integration#Yoshida_algorithms
+    W1 = 1 / (2 - 2**(1/3))
+    W0 = -2**(1/3) / (2 - 2**(1/3))
+    DRIFTS = (W1/2, (W0 + W1)/2, (W0 + W1)/2, W1/2)
+    KICKS = (W1, W0, W1)
+
+    def step(self, field: Field, pos: np.ndarray, vel: np.ndarray, t: float, dt: float) -> tuple[np.ndarray, np.ndarray, float]:
+        time = t
+        for drift, kick in zip(self.DRIFTS, self.KICKS):
+            pos = pos + vel*(drift*dt)
+            time += drift*dt
+            vel = vel + field(pos, time)*(kick*dt)
+        pos = pos + vel*(self.DRIFTS[3]*dt)
+        return pos, vel, dt
+
+class DormandPrince45(Integrator):
+    """
+    Adaptive fifth order Runge-Kutta integrator with embedded fourth order error estimation.
+    Steps are as large as possible (up to the requested `dt`) while keeping the error under the tolerances.
+    """
+
+    adaptive = True
+
+    # https://en.wikipedia.org/wiki/Dormand%E2%80%93Prince_method
+    C = (0.0, 1/5, 3/10, 4/5, 8/9, 1.0, 1.0)
+    A = (
+        (),
+        (1/5,),
+        (3/40, 9/40),
+        (44/45, -56/15, 32/9),
+        (19372/6561, -25360/2187, 64448/6561, -212/729),
+        (9017/3168, -355/33, 46732/5247, 49/176, -5103/18656),
+        (35/384, 0.0, 500/1113, 125/192, -2187/6784, 11/84),
+    )
+    # difference between the fifth and fourth order solutions
+    E = (
+        35/384 - 5179/57600, 0.0, 500/1113 - 7571/16695, 125/192 - 393/640,
+        -2187/6784 + 92097/339200, 11/84 - 187/2100, -1/40
+    )
+
+    def __init__(self, rtol: float = 1e-6, atol: float = 1e-3, min_dt: float = 1e-4):
+        self.rtol = rtol
+        self.atol = atol
+        self.min_dt = min_dt
+        self.reset()
+
+    def reset(self):
+        # suggested size of the next step
+        self.next_dt = np.inf
+
+    def step(self, field: Field, pos: np.ndarray, vel: np.ndarray, t: float, dt: float) -> tuple[np.ndarray, np.ndarray, float]:
+        # the state is y = (pos, vel) and its derivative is (vel, acceleration)
+        y = np.concatenate((pos, vel))
+        def f(t: float, y: np.ndarray) -> np.ndarray:
+            return np.concatenate((y[3:], field(y[:3], t)))
+
+        h = min(self.next_dt, dt)
+        while True:
+            k = [f(t, y)]
+            for c, a in zip(self.C[1:], self.A[1:]):
+                k.append(f(t + c*h, y + h*sum(ai*ki for ai, ki in zip(a, k))))
+            # the last stage is evaluated at the fifth order solution
+            new_y = y + h*sum(ai*ki for ai, ki in zip(self.A[6], k))
+
+            error = h*sum(ei*ki for ei, ki in zip(self.E, k))
+            scale = self.atol + self.rtol*np.maximum(np.abs(y), np.abs(new_y))
+            norm = float(np.max(np.abs(error) / scale))
+
+            # grow or shrink the step, without changing too abruptly
+            factor = min(5.0, max(0.2, 0.9*norm**-0.2)) if norm > 0 else 5.0
+            if norm <= 1.0 or h <= self.min_dt:
+                self.next_dt = h*factor
+                return new_y[:3], new_y[3:], h
+            h = max(h*factor, self.min_dt)
+
+INTEGRATORS: dict[str, type[Integrator]] = {
+    "euler": SymplecticEuler,
+    "verlet": VelocityVerlet,
+    "yoshida": Yoshida4,
+    "rk45": DormandPrince45,
+}
+
+def make_integrator(name: str) -> Integrator:
+    """Creates an integrator from its name (see `INTEGRATORS`)"""
+    return INTEGRATORS[name]()
@@ -0,0 +1,70 @@
+import pyray as rl
+from pyray import Camera3D, Mesh, Vector3
+
+from icosphere import load_icosphere
+from utils import get_projected_sphere_radius
+
+# subdivisions of the sphere meshes, from the least to the most detailed
+# (the last one is the near field level, detailed enough for displaced terrain seen up close)
+LOD_LEVELS = (2, 3, 4, 5, 6)
+# projected radius (in pixels) from which each level is used
+LOD_THRESHOLDS = (0.0, 24.0, 80.0, 240.0, 600.0)
+
+class SphereLods:
+    """
+    Sphere meshes of increasing detail, the one drawn for each body is chosen every frame
+    from its size on screen. A body only switches level once its size is past the threshold
+    by a margin (`hysteresis`), so that it doesn't pop back and forth around a threshold.
+    """
+
+    def __init__(self, levels: tuple[int, ...] = LOD_LEVELS, thresholds: tuple[float, ...] = LOD_THRESHOLDS, hysteresis: float = 0.15):
+        assert(len(levels) == len(thresholds))
+
+        self.levels = levels
+        self.thresholds = thresholds
+        self.hysteresis = hysteresis
+        self.meshes = [load_icosphere(level).create_mesh() for level in levels]
+
+        # level currently used by every body
+        self.current: dict[object, int] = {}
+
+    def mesh_for_level(self, level: int) -> Mesh:
+        """Returns the mesh with the given number of subdivisions"""
+        return self.meshes[self.levels.index(level)]
+
+    def select(self, body: object, projected_radius: float) -> int:
+        """Returns the index of the level to use for the body with the given size on screen (in pixels)"""
+        # the camera is inside the sphere (see `get_projected_sphere_radius`)
+        if projected_radius <= 0:
+            lod = len(self.levels) - 1
+            self.current[body] = lod
+            return lod
+
+        lod = self.current.get(body)
+        if lod == None:
+            # first time we see this body, no hysteresis
+            lod = 0
+            while lod + 1 < len(self.levels) and projected_radius >= self.thresholds[lod + 1]:
+                lod += 1
+        else:
+            while lod + 1 < len(self.levels) and projected_radius >= self.thresholds[lod + 1]*(1 + self.hysteresis):
+                lod += 1
+            while lod > 0 and projected_radius < self.thresholds[lod]*(1 - self.hysteresis):
+                lod -= 1
+
+        self.current[body] = lod
+        return lod
+
+    def mesh(self, body: object, camera: Camera3D, screen_height: float, center: Vector3, radius: float) -> Mesh:
+        """Returns the mesh to draw the given body (a sphere) with this frame"""
+        projected_radius = get_projected_sphere_radius(camera, screen_height, center, radius)
+        return self.meshes[self.select(body, projected_radius)]
+
+    def clear(self):
+        """Forgets the level of every body (use when the bodies are replaced)"""
+        self.current.clear()
+
+    def unload(self):
+        for mesh in self.meshes:
+            rl.unload_mesh(mesh)
+        self.meshes = []
@@ -1,70 +1,109 @@
-from math import inf, pi, log1p
+import argparse
+from math import pi, log1p
+import random
+import time
 
+import numpy as np
 import pyray as rl
 from pyray import Rectangle, Vector2, Vector3
+from clock import FixedStepScheduler
 from cockpit import Cockpit
 
-from icosphere import gen_icosphere
+from integrators import INTEGRATORS, make_integrator
 from map import Map
-from shaders import PlanetMaterial, SunMaterial, WormholeEffect, WormholeMaterial
-from sky import Sky
-from utils import get_projected_sphere_radius, randf
+from noise import NoiseQueue
+from prefetch import SystemPrefetcher
+from profiler import Profiler
+from replay import FrameInput, InputRecorder, InputReplay
+from resolution import ResolutionScaler
+from scene import Scene
+from shaders import WormholeEffect
+from utils import get_projected_sphere_radius, randf, seed, vec3_to_array
 from player import Player
 from system import Planet, System, NewSystem
 from colors import BLACK, WHITE
 
+# distance to the wormhole from which the next system starts being generated
+PREFETCH_DISTANCE = 500
+
 def get_viewed_planet(player: Player, sys: System) -> Planet | None:
     """Get the closest planet that the player is currently looking at"""
     cx = rl.get_render_width()/2
     cy = rl.get_render_height()/2
     ray = rl.get_mouse_ray(Vector2(cx, cy), player.camera)
 
-    closest_dist, closest = inf, None
-    for planet in sys.bodies:
-        # skip if we're looking away from the planet
-        player_to_planet = rl.vector3_subtract(planet.pos, player.pos)
-        if rl.vector_3dot_product(ray.direction, player_to_planet) < 0:
-            continue
-
-        coll = rl.get_ray_collision_sphere(ray, planet.pos, planet.radius)
-        if coll.hit:
-            dist = rl.vector3_length_sqr(player_to_planet)
-            if dist < closest_dist:
-                closest_dist = dist
-                closest = planet
-    return closest
-
-def main():
+    # first body hit by the ray (only in front of the player)
+    index, _ = sys.broadphase.ray_cast(vec3_to_array(ray.position), vec3_to_array(ray.direction))
+    return sys.bodies[index] if index >= 0 else None
+
+def main(target_fps: int = 60, tick_rate: float = 60.0, threaded: bool = False, asteroids: int | None = None, profile_trace: str | None = None,
+         record: str | None = None, replay: str | None = None, dynamic_resolution: bool = True, integrator: str = "verlet"):
+    """
+    Runs the game.
+    Rendering is capped at `target_fps` (0 for uncapped), while the simulation runs at `tick_rate` ticks per second,
+    on its own thread if `threaded` is set.
+    The number of asteroids of every system can be forced (for example `LARGE_BELT_SIZE` to test how the engine scales)
+    The duration of the phases of every frame is written to `profile_trace` when the game is closed (CSV, or JSON for a .json file),
+    the profiler overlay is toggled with F3.
+    The seed and the inputs of the game can be recorded to the `record` file, then played back exactly with `replay`
+    (uncapped, the number of frames per second is printed at the end to compare builds).
+    With `dynamic_resolution`, the 3D view is rendered at a lower resolution when the frames take too long (the HUD stays sharp).
+    The player and the map's trajectory prediction move with the given `integrator` (see `INTEGRATORS`).
+    """
+    # while recording or replaying, every frame runs exactly one simulation tick so that the game is reproducible
+    lockstep = record != None or replay != None
+    recorder = None
+    replay_input = None
+    if replay != None:
+        replay_input = InputReplay(replay)
+        seed(replay_input.seed)
+        tick_rate = replay_input.tick_rate
+        target_fps = 0
+        threaded = False
+    elif record != None:
+        seed_value = random.getrandbits(32)
+        seed(seed_value)
+        recorder = InputRecorder(record, seed_value, tick_rate)
+        # one tick per frame at the normal speed of the game
+        target_fps = round(tick_rate)
+        threaded = False
+
     rl.init_window(1280, 720, "Spaze")
     rl.init_audio_device
-    rl.set_target_fps(60)
+    rl.set_target_fps(target_fps)
     rl.set_window_state(rl.ConfigFlags.FLAG_WINDOW_RESIZABLE)
     rl.set_exit_key(rl.KeyboardKey.KEY_NULL)
 
     G = 5
-    dt = 1 / 60
 
-    sphere = gen_icosphere(4).create_mesh()
+    scene = Scene()
+    # the map doesn't need more detail
+    sphere = scene.spheres.mesh_for_level(4)
 
     game_over = rl.load_texture("assets/game over.png")
 
     back_sound = rl.load_music_stream("assets/musique_de_fond.mp3")
     rl.play_music_stream(back_sound)
 
-    planet_mat = PlanetMaterial()
-    wormhole_mat = WormholeMaterial()
     wormhole_effect = WormholeEffect()
-    sun_mat = SunMaterial()
 
     cockpit = Cockpit()
 
-    system = NewSystem()
+    # disabled by default, its scopes cost almost nothing then
+    profiler = Profiler()
+    if profile_trace != None:
+        profiler.start_recording()
+
+    # planet textures are generated over several frames, closest planets first
+    noise_queue = NoiseQueue()
+    # GPU heightmaps are finished at frames that depend on the cache and on the GPU, so they aren't used for collisions in lockstep
+    system = NewSystem(noise_queue=noise_queue, asteroids=asteroids, gpu_terrain=not lockstep)
     sys = system.new_sys(G)
     # initialize positions and transforms since the game is paused by default
     # and randomize orbit angles
     for planet in sys.planets():
         planet.orbit_angle = randf() * 2 * pi
-    sys.update(G, dt)
+    sys.place(G)
 
     player = Player(
         Vector3(0, 0, -1300),
@@ -77,10 +116,13 @@ def main():
             rl.CameraProjection.CAMERA_PERSPECTIVE
         ),
         rl.quaternion_from_euler(0, pi, 0),
-        rl.quaternion_from_euler(0, pi, 0)
+        rl.quaternion_from_euler(0, pi, 0),
+        make_integrator(integrator)
     )
 
-    sky = Sky()
+
+    # next system, generated in the background when the player gets close to the wormhole
+    prefetcher = SystemPrefetcher(G, asteroids, gpu_terrain=not lockstep)
 
     selected_planet = None
 
@@ -90,23 +132,27 @@ def main():
 
         player.pos = Vector3(0, 0, -1300)
         player.vel = Vector3(5, 0, 0)
+        player.save_state()
+        player.integrator.reset()
 
         selected_planet = None
+        scene.spheres.clear()
 
         sys.unload()
-        sys = system.new_sys(G)
-        # randomize orbit angles
-        for planet in sys.planets():
-            planet.orbit_angle = randf() * 2 * pi
+        # use the prefetched system (generated right away if it isn't)
+        sys = prefetcher.take(noise_queue)
 
+    # the 3D view is rendered in `target`, scaled to the window's size when it is drawn
+    # (always at the native resolution in lockstep, so that replays of different versions draw the same pixels)
+    resolution = ResolutionScaler(target_fps, dynamic_resolution and not lockstep)
     target = rl.load_render_texture(1280, 720)
     rl.set_texture_wrap(target.texture, rl.TextureWrap.TEXTURE_WRAP_CLAMP)
 
     paused = True
 
-    map = Map()
+    map = Map(integrator=make_integrator(integrator))
 
-    ite = 0
+    game_over_time = 0.0
     dead = False
 
     unpaused_time = 0.0
@@ -115,153 +161,211 @@ def main():
     wormhole_time = 0.0
 
     def collision_check():
-        for planet in sys.bodies:
-            if rl.vector_3distance_sqr(player.pos, planet.pos) <= planet.radius**2:
-                return True
-        return False
-
+        pos = vec3_to_array(player.pos)
+        # only check the terrain of the bodies whose bounding sphere contains the player
+        if sys.table.collision(pos, sys.broadphase.query_radius(pos, 0.0)) >= 0:
+            return True
+        return sys.table.belt != None and sys.table.belt.collision(pos) >= 0
+
+    # mouse movement accumulated since the last simulation tick
+    mouse_delta = Vector2(0, 0)
+    # inputs of the current frame (live, or from the replayed recording)
+    frame_input = FrameInput(Vector2(0, 0))
+
+    def tick(dt: float):
+        """Advance the simulation by one fixed step"""
+        nonlocal unpaused_time
+        nonlocal mouse_delta
+
+        unpaused_time += dt
+
+        player.save_state()
+        with profiler.scope("System.update"):
+            sys.update(G, dt)
+        with profiler.scope("player input"):
+            if not map.enabled:
+                player.handle_mouse_input(dt, mouse_delta, frame_input)
+            mouse_delta = Vector2(0, 0)
+            player.handle_keyboard_input(dt, frame_input)
+        # gravity and collisions of the player
+        with profiler.scope("Player.step"):
+            player.step(G, dt, sys.table)
+
+    scheduler = FixedStepScheduler(tick, tick_rate, threaded)
+    scheduler.paused = paused
+    scheduler.start()
+
+    replay_start = time.perf_counter()
+    last_frame_end = time.perf_counter()
     while not rl.window_should_close():
+        frame_start = time.perf_counter()
+        frame_time = rl.get_frame_time()
+        if lockstep:
+            frame_time = scheduler.dt
+
+        if replay_input != None:
+            next_input = replay_input.next()
+            if next_input == None:
+                break
+            frame_input = next_input
+        else:
+            frame_input = FrameInput.read()
+        if recorder != None:
+            recorder.record(frame_input)
         rl.update_music_stream(back_sound)
         
-        inverted_render_rect = Rectangle(0, 0, rl.get_render_width(), -rl.get_render_height())
-        if rl.is_window_resized():
+        # re-create the render target when the window is resized or the resolution scale changes
+        target_width, target_height = resolution.target_size(rl.get_render_width(), rl.get_render_height())
+        if (target.texture.width, target.texture.height) != (target_width, target_height):
             rl.unload_render_texture(target)
 
-            target = rl.load_render_texture(rl.get_render_width(), rl.get_render_height())
+            target = rl.load_render_texture(target_width, target_height)
             rl.set_texture_wrap(target.texture, rl.TextureWrap.TEXTURE_WRAP_CLAMP)
+            rl.set_texture_filter(target.texture, rl.TextureFilter.TEXTURE_FILTER_BILINEAR)
 
         cx = rl.get_render_width()/2
         cy = rl.get_render_height()/2
 
-        if rl.is_key_pressed(rl.KeyboardKey.KEY_SEMICOLON):
+        if frame_input.is_key_pressed(rl.KeyboardKey.KEY_SEMICOLON):
             map.toggle()
+        if rl.is_key_pressed(rl.KeyboardKey.KEY_F3):
+            profiler.toggle()
+
+        with profiler.scope("input"), scheduler.lock:
+            if not paused:
+                # the map uses the mouse to move its camera
+                if not map.enabled:
+                    mouse_delta = rl.vector2_add(mouse_delta, frame_input.mouse_delta)
+
+                if frame_input.is_left_click():
+                    viewed_planet = get_viewed_planet(player, sys)
+                    if viewed_planet == selected_planet:
+                        selected_planet = None
+                    elif viewed_planet != None:
+                        selected_planet = viewed_planet
+
+                if frame_input.is_key_pressed(rl.KeyboardKey.KEY_ESCAPE):
+                    rl.enable_cursor()
+                    paused = True
+            else:
+                if frame_input.is_left_click():
+                    rl.disable_cursor()
+                    paused = False
+            scheduler.paused = paused
+
+        # run the simulation ticks due for this frame (if not on its own thread)
+        scheduler.update(frame_time)
+
+        with profiler.scope("prepare"), scheduler.lock:
+            if not dead and collision_check():
+                game_over_time = 0.0
+                dead = True
+                paused = True
+                scheduler.paused = True
 
-        if not paused:
-            unpaused_time += dt
+            # start generating the next system
+            if rl.vector_3distance_sqr(player.pos, sys.wormhole_pos) < PREFETCH_DISTANCE**2:
+                prefetcher.start()
 
-            sys.update(G, dt)
-            player.apply_gravity(G, dt, sys.bodies)
-            if not map.enabled:
-                player.handle_mouse_input(dt)
-            player.handle_keyboard_input()
-            player.integrate(dt)
-            player.sync_camera()
-
-            if rl.is_mouse_button_pressed(rl.MouseButton.MOUSE_BUTTON_LEFT):
-                viewed_planet = get_viewed_planet(player, sys)
-                if viewed_planet == selected_planet:
-                    selected_planet = None
-                elif viewed_planet != None:
-                    selected_planet = viewed_planet
-
-            if rl.is_key_pressed(rl.KeyboardKey.KEY_ESCAPE):
-                rl.enable_cursor()
-                paused = True
-        else:
-            if rl.is_mouse_button_pressed(rl.MouseButton.MOUSE_BUTTON_LEFT):
-                rl.disable_cursor()
-                paused = False
+            # wormhole touched
+            if not wormholing and rl.vector_3distance_sqr(player.pos, sys.wormhole_pos) < sys.wormhole_size**2:
+                wormholing = True
+                wormhole_time = 0.0
+                prefetcher.start()
 
-        if not dead and collision_check():
-            ite = 0
-            dead = True
-            paused = True
+            # interpolate between the last two simulation ticks
+            alpha = scheduler.alpha()
+            sys.table.compute_transforms(alpha)
+            player.sync_camera(alpha)
 
-        # wormhole touched
-        if not wormholing and rl.vector_3distance_sqr(player.pos, sys.wormhole_pos) < sys.wormhole_size**2:
-            wormholing = True
-            wormhole_time = 0.0
+            # skip drawing the bodies that are off-screen
+            frustum = scene.prepare(player, sys, alpha, unpaused_time, target_width, target_height)
 
-        planet_mat.set_global_values(player, sys)
-        sun_mat.set_global_values(player, unpaused_time)
-        wormhole_mat.set_global_values(unpaused_time)
+            noise_queue.update(vec3_to_array(player.pos))
 
+        profiler.begin("draw 3D")
         rl.begin_texture_mode(target)
         rl.clear_background(BLACK)
 
-        rl.begin_mode_3d(player.camera)
-
-        sky.draw()
-
-        rl.draw_mesh(sphere, sun_mat.mat, sys.bodies[0].transform)
-        for planet in sys.planets():
-            planet_mat.set_planet_values(planet)
-            rl.draw_mesh(sphere, planet_mat.mat, planet.transform) #ICI
-
-        # draw wormhole
-        rl.draw_mesh(sphere, wormhole_mat.mat, sys.wormhole_transform)
-
-        rl.end_mode_3d()
-
-        # draw UI
-        rl.draw_fps(10, 10)
-
-        cockpit.draw(player, sys, selected_planet)
-
-        if selected_planet != None:
-            planet = selected_planet
-
-            # show the relative velocity between the player and the selected planet
-            pos_diff = rl.vector3_subtract(planet.pos, player.pos)
-            projected_radius = get_projected_sphere_radius(player.camera, rl.get_render_height(), planet.pos, planet.radius)
-            # don't render if the planet is behind us
-            if projected_radius > 0 and rl.vector_3dot_product(rl.vector3_subtract(player.camera.target, player.pos), pos_diff) > 0:
-                # don't let the radius get bigger than half the screen
-                projected_radius = min(min(projected_radius, cx), cy)
-
-                vel = rl.vector3_subtract(player.vel, planet.vel)
-
-                # scale vector logarithmically
-                vel_length = rl.vector3_length(vel)
-                scaled_vel = rl.vector3_scale(vel, 2*log1p(vel_length) / vel_length)
-
-                # place first point in the direction of the planet (make it appear at its center)
-                # but always have it at a fixed distance to remove perspective effect
-                p1_world = rl.vector3_add(player.pos, rl.vector3_scale(rl.vector3_normalize(pos_diff), 30.0))
-                p1 = rl.get_world_to_screen(p1_world, player.camera)
-                p2 = rl.get_world_to_screen(rl.vector3_add(p1_world, scaled_vel), player.camera)
-
-                # Draw thicker lines under first (outline)
-                rl.draw_circle_v(p1, 3, BLACK)
-                rl.draw_line_ex(p1, Vector2(p2.x, p1.y), 3, BLACK)
-                rl.draw_line_ex(p1, Vector2(p1.x, p2.y), 3, BLACK)
-
-                # Draw lines above
-                rl.draw_line_v(p1, Vector2(p2.x, p1.y), WHITE)
-                rl.draw_line_v(p1, Vector2(p1.x, p2.y), WHITE)
-
-                # Draw the four corners
-                radius = projected_radius + 20
-                rl.draw_ring_lines(p1, radius, radius, 22.5, 22.5+45, 24, WHITE)
-                rl.draw_ring_lines(p1, radius, radius, 112.5, 112.5+45, 24, WHITE)
-                rl.draw_ring_lines(p1, radius, radius, 202.5, 202.5+45, 24, WHITE)
-                rl.draw_ring_lines(p1, radius, radius, 292.5, 292.5+45, 24, WHITE)
-
-                # Draw the text
-
-                # if velocity points in the same direction as player->planet then velocity is positive, otherwise (points away), it's negative
-                # forward speed is the orthogonal projection of velocity on position
-                # which is the dot product divided by distance
-                distance = rl.vector3_length(pos_diff)
-                forward_speed = rl.vector_3dot_product(vel, pos_diff) / distance
-
-                text_pos = rl.vector2_add(p1, Vector2(radius, -10))
-                rl.draw_text("{:.1f} m".format(distance), int(text_pos.x), int(text_pos.y), 20, WHITE)
-                rl.draw_text("{:.1f} m/s".format(forward_speed), int(text_pos.x), int(text_pos.y+20), 20, WHITE)
-
-        rl.draw_line_v(Vector2(cx, cy - 6), Vector2(cx, cy + 6), WHITE)
-        rl.draw_line_v(Vector2(cx - 6, cy), Vector2(cx + 6, cy), WHITE)
-
+        scene.draw(player.camera, sys, target_height)
         rl.end_texture_mode()
+        profiler.end("draw 3D")
 
         # draw target to screen
         rl.begin_drawing()
 
         if map.enabled:
-            map.update(G, player, sys)
-            map.draw(player, sys, sphere, wormhole_mat)
+            with profiler.scope("Map.update"), scheduler.lock:
+                map.update(G, player, sys, unpaused_time)
+            map.draw(player, sys, sphere, scene.wormhole_mat)
         else:
-            rl.draw_texture_rec(target.texture, inverted_render_rect, Vector2(0, 0), WHITE)
+            # upscaled to the window with bilinear filtering
+            rl.draw_texture_pro(target.texture, Rectangle(0, 0, target_width, -target_height),
+                                Rectangle(0, 0, rl.get_render_width(), rl.get_render_height()), Vector2(0, 0), 0.0, WHITE)
+
+            # draw UI at the native resolution, over the 3D view
+            profiler.begin("HUD")
+            rl.draw_fps(10, 10)
+            profiler.end("HUD")
+            with profiler.scope("Cockpit.draw"):
+                cockpit.draw(player, sys, selected_planet)
+            profiler.begin("HUD")
+
+            if selected_planet != None:
+                planet = selected_planet
+
+                # show the relative velocity between the player and the selected planet
+                pos_diff = rl.vector3_subtract(planet.pos, player.pos)
+                projected_radius = get_projected_sphere_radius(player.camera, rl.get_render_height(), planet.pos, planet.radius)
+                # don't render if the planet is behind us
+                if projected_radius > 0 and rl.vector_3dot_product(rl.vector3_subtract(player.camera.target, player.pos), pos_diff) > 0:
+                    # don't let the radius get bigger than half the screen
+                    projected_radius = min(min(projected_radius, cx), cy)
+
+                    vel = rl.vector3_subtract(player.vel, planet.vel)
+
+                    # scale vector logarithmically
+                    vel_length = rl.vector3_length(vel)
+                    scaled_vel = rl.vector3_scale(vel, 2*log1p(vel_length) / vel_length)
+
+                    # place first point in the direction of the planet (make it appear at its center)
+                    # but always have it at a fixed distance to remove perspective effect
+                    p1_world = rl.vector3_add(player.pos, rl.vector3_scale(rl.vector3_normalize(pos_diff), 30.0))
+                    p1 = rl.get_world_to_screen(p1_world, player.camera)
+                    p2 = rl.get_world_to_screen(rl.vector3_add(p1_world, scaled_vel), player.camera)
+
+                    # Draw thicker lines under first (outline)
+                    rl.draw_circle_v(p1, 3, BLACK)
+                    rl.draw_line_ex(p1, Vector2(p2.x, p1.y), 3, BLACK)
+                    rl.draw_line_ex(p1, Vector2(p1.x, p2.y), 3, BLACK)
+
+                    # Draw lines above
+                    rl.draw_line_v(p1, Vector2(p2.x, p1.y), WHITE)
+                    rl.draw_line_v(p1, Vector2(p1.x, p2.y), WHITE)
+
+                    # Draw the four corners
+                    radius = projected_radius + 20
+                    rl.draw_ring_lines(p1, radius, radius, 22.5, 22.5+45, 24, WHITE)
+                    rl.draw_ring_lines(p1, radius, radius, 112.5, 112.5+45, 24, WHITE)
+                    rl.draw_ring_lines(p1, radius, radius, 202.5, 202.5+45, 24, WHITE)
+                    rl.draw_ring_lines(p1, radius, radius, 292.5, 292.5+45, 24, WHITE)
+
+                    # Draw the text
+
+                    # if velocity points in the same direction as player->planet then velocity is positive, otherwise (points away), it's negative
+                    # forward speed is the orthogonal projection of velocity on position
+                    # which is the dot product divided by distance
+                    distance = rl.vector3_length(pos_diff)
+                    forward_speed = rl.vector_3dot_product(vel, pos_diff) / distance
+
+                    text_pos = rl.vector2_add(p1, Vector2(radius, -10))
+                    rl.draw_text("{:.1f} m".format(distance), int(text_pos.x), int(text_pos.y), 20, WHITE)
+                    rl.draw_text("{:.1f} m/s".format(forward_speed), int(text_pos.x), int(text_pos.y+20), 20, WHITE)
+
+            rl.draw_line_v(Vector2(cx, cy - 6), Vector2(cx, cy + 6), WHITE)
+            rl.draw_line_v(Vector2(cx - 6, cy), Vector2(cx + 6, cy), WHITE)
+
+            profiler.end("HUD")
 
         if paused:
             rl.draw_rectangle_rounded(Rectangle(cx - 50, cy - 15, 100, 30), 0.5, 16, BLACK)
@@ -270,31 +374,72 @@ def main():
             rl.draw_text("Paused", int(cx - pause_width/2), int(cy-10), 20, WHITE)
 
         if dead:
-            if ite < 300:
+            if game_over_time < 5.0:
                 rl.draw_texture_pro(game_over, Rectangle(0, 0, 1280, 720),
                                     Rectangle(0, 0, rl.get_render_width(), rl.get_render_height()), Vector2(0, 0), 0.0,
                                     WHITE)
-                ite += 1
+                game_over_time += frame_time
             else:
-                reset_system()
-                paused = False
+                with scheduler.lock:
+                    reset_system()
+                    paused = False
+                    scheduler.paused = False
                 dead = False
         
         if wormholing:
             wormhole_effect.set_global_values(wormhole_time)
             wormhole_effect.draw()
 
-            wormhole_time += dt
+            # generate the next system's textures while the effect hides the screen
+            # (closest to where the player will appear first)
+            prefetcher.upload(np.array((0.0, 0.0, -1300.0)))
+
+            wormhole_time += frame_time
 
             # effect finished
             if wormhole_time >= 8.0:
                 wormhole_time = 0.0
                 wormholing = False
-                reset_system()
-
-        rl.end_drawing()
+                with scheduler.lock:
+                    reset_system()
+
+        # profiler overlay, over everything
+        profiler.draw(10, 32, (f"culled: {frustum.culled}/{frustum.tested}", f"resolution: {round(resolution.scale*100)}%"))
+
+        # waits for the GPU (and the vertical sync)
+        cpu_time = time.perf_counter() - frame_start
+        with profiler.scope("end_drawing"):
+            rl.end_drawing()
+        profiler.end_frame()
+
+        # no GPU timer queries in raylib: the time between the end of consecutive frames includes waiting for the GPU
+        now = time.perf_counter()
+        resolution.update(now - last_frame_end, cpu_time)
+        last_frame_end = now
+    scheduler.stop()
+    if recorder != None:
+        recorder.close()
+    if replay_input != None:
+        elapsed = time.perf_counter() - replay_start
+        print(f"replayed {replay_input.frame} frames in {elapsed:.2f} s ({replay_input.frame / elapsed:.1f} frames per second)")
+    if profile_trace != None:
+        profiler.dump(profile_trace)
+    rl.unload_render_texture(target)
+    scene.unload()
     rl.unload_music_stream(back_sound)
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Spaze")
+    parser.add_argument("--fps", type=int, default=60, help="maximum number of frames per second (0 for uncapped)")
+    parser.add_argument("--tick-rate", type=float, default=60.0, help="number of simulation ticks per second")
+    parser.add_argument("--threaded", action="store_true", help="run the simulation on its own thread")
+    parser.add_argument("--asteroids", type=int, help="number of asteroids of every system")
+    parser.add_argument("--profile-trace", help="write the duration of the phases of every frame to this file (CSV or JSON)")
+    parser.add_argument("--record", help="record the seed and the inputs of the game to this file")
+    parser.add_argument("--replay", help="replay a recording as fast as possible")
+    parser.add_argument("--no-dynamic-resolution", action="store_true", help="always render the 3D view at the window's resolution")
+    parser.add_argument("--integrator", choices=INTEGRATORS, default="verlet", help="integrator of the player's motion and of the map's prediction")
+    args = parser.parse_args()
+    main(args.fps, args.tick_rate, args.threaded, args.asteroids, args.profile_trace, args.record, args.replay,
+         not args.no_dynamic_resolution, args.integrator)
@@ -1,49 +1,18 @@
-from copy import copy
+import numpy as np
 import pyray as rl
 from pyray import Mesh, Vector3
-from colors import BLACK, RED, WHITE
+from raylib.defines import RL_LINES
+from colors import BLACK, GRAY, RED, WHITE
 from player import Player
+from integrators import Integrator, VelocityVerlet
+from predictor import TrajectoryCache
 from shaders import WormholeMaterial
 
 from system import System
-
-def copy_state(system: System, player: Player) -> tuple[System, Player]:
-    """
-    Creates a copy of the given system and player state (with all texture/graphics information shared),
-    to allow simulating them at a different speed than the real-time simulation.
-    """
-    system_copy = System(system.bodies[0])
-    system_copy.wormhole_pos = system.wormhole_pos
-    system_copy.wormhole_size = system.wormhole_size
-    system_copy.wormhole_transform = system.wormhole_transform
-
-    body_indices = { body: i for i, body in enumerate(system.bodies) }
-    for planet in system.planets():
-        p = copy(planet)
-        p.orbit_center = None if planet.orbit_center == None else system_copy.bodies[body_indices[planet.orbit_center]]
-        p.orbit_radius = planet.orbit_radius
-        p.mass = planet.mass
-        p.radius = planet.radius
-        p.orbit_angle = planet.orbit_angle
-        p.pos = planet.pos
-        p.colors = planet.colors
-        p.type = planet.type
-        p.vel = planet.vel
-
-        system_copy.add(p)
-
-    player_copy = Player(
-        player.pos,
-        player.vel,
-        player.camera,
-        player.rotation,
-        player.target_rotation
-    )
-
-    return system_copy, player_copy
+from utils import array_to_vec3, vec3_to_array
 
 class Map:
-    def __init__(self):
+    def __init__(self, steps: int = 100, simul_dt: float = 1/2, integrator: Integrator | None = None):
         self.isometric_cam = rl.Camera3D(
             Vector3(1200, 1200, 1200),
             Vector3(0, 0, 0),
@@ -54,36 +23,24 @@ class Map:
 
         self.enabled = False
 
-        self.trace = []
+        # prediction horizon (by default, simulate 50 seconds in advance)
+        self.steps = steps
+        self.simul_dt = simul_dt
+        self.integrator = VelocityVerlet() if integrator == None else integrator
+
+        # the prediction is kept between frames and only recomputed when the player's trajectory changes
+        self.cache = TrajectoryCache()
+        self.trace = np.zeros((0, 3))
         self.collided = False
 
     def toggle(self):
         self.enabled = not self.enabled
 
-    def update(self, G: float, player: Player, sys: System):
+    def update(self, G: float, player: Player, sys: System, time: float):
+        """Update the predicted trajectory (`time` is the current simulation time)"""
         rl.update_camera(self.isometric_cam, rl.CameraMode.CAMERA_THIRD_PERSON)
 
-        sys_copy, player_copy = copy_state(sys, player)
-
-        simul_dt = 1/2
-        self.trace = [player.pos]
-        self.collided = False
-
-        # simulate 50 seconds in advance
-        for _ in range(100):
-            sys_copy.update(G, simul_dt)
-            player_copy.apply_gravity(G, simul_dt, sys_copy.bodies)
-            player_copy.integrate(simul_dt)
-
-            for body in sys_copy.bodies:
-                if rl.vector_3distance_sqr(player_copy.pos, body.pos) < body.radius*body.radius:
-                    self.collided = True
-                    break
-
-            if self.collided:
-                break
-
-            self.trace.append(player_copy.pos)
+        self.trace, self.collided = self.cache.update(sys.table, G, time, vec3_to_array(player.pos), vec3_to_array(player.vel), self.simul_dt, self.steps, self.integrator)
 
     def draw(self, player: Player, sys: System, sphere_mesh: Mesh, wormhole_mat: WormholeMaterial):
         rl.begin_mode_3d(self.isometric_cam)
@@ -94,16 +51,24 @@ class Map:
                 rl.draw_circle_3d(body.orbit_center.pos, body.orbit_radius, Vector3(1, 0, 0), 90, rl.fade(body.colors[3], 0.5))
 
             rl.draw_sphere(body.pos, body.radius, body.colors[3])
+
+        # the edges of the asteroid belt
+        belt = sys.table.belt
+        if belt != None:
+            for radius in (belt.inner, belt.outer):
+                rl.draw_circle_3d(sys.bodies[0].pos, radius, Vector3(1, 0, 0), 90, rl.fade(GRAY, 0.5))
         rl.draw_mesh(sphere_mesh, wormhole_mat.mat, sys.wormhole_transform)
 
-        for i in range(1, len(self.trace)):
-            prev = self.trace[i-1]
-            new = self.trace[i]
-            rl.draw_line_3d(prev, new, WHITE)
+        # draw the whole trace in a single batch
+        rl.rl_begin(RL_LINES)
+        rl.rl_color4ub(WHITE.r, WHITE.g, WHITE.b, WHITE.a)
+        for prev, new in zip(self.trace[:-1].tolist(), self.trace[1:].tolist()):
+            rl.rl_vertex3f(*prev)
+            rl.rl_vertex3f(*new)
+        rl.rl_end()
 
-        if len(self.trace) < 101:
-            l = len(self.trace)-1
-            rl.draw_sphere(self.trace[l], 10, RED)
+        if self.collided:
+            rl.draw_sphere(array_to_vec3(self.trace[-1]), 10, RED)
 
         rl.draw_cube(rl.vector3_add(player.pos, Vector3(5, 5, 5)), 10, 10, 10, WHITE)
 
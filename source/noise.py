@@ -1,8 +1,17 @@
-from pyray import RenderTexture, Vector2, Vector3
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+import hashlib
+import os
+from typing import Callable
+
+import numpy as np
+from pyray import RenderTexture, Texture, Vector2, Vector3
 import pyray as rl
-from raylib import ffi
+from raylib import SHADER_UNIFORM_FLOAT, ffi
 
-from utils import draw_rectangle_tex_coords
+from cubemap import GUTTER, atlas_face_size, atlas_faces, atlas_size, cubemap_format, load_cubemap, surface_normals, update_cubemap
+from utils import CACHE_DIR, draw_rectangle_tex_coords
 
 class NoiseShader:
     def __init__(self):
@@ -15,11 +24,234 @@ class NoiseShader:
         self.u_warp = rl.get_shader_location(self.shader, "warp")
         self.u_ridge = rl.get_shader_location(self.shader, "ridge")
         self.u_invert = rl.get_shader_location(self.shader, "invert")       
+        self.u_face_size = rl.get_shader_location(self.shader, "faceSize")
+        self.u_gutter = rl.get_shader_location(self.shader, "gutter")
+        rl.set_shader_value(self.shader, self.u_gutter, ffi.new("float *", GUTTER), SHADER_UNIFORM_FLOAT)
 
 noise_shader: NoiseShader | None = None
 
-def generate_noise(size: tuple[int, int], scale: Vector3, pos: Vector2, octaves: int, frequency: float, amplitude: float, warp: float, ridge: bool, invert: bool) -> RenderTexture:
-    """Generate a spherically mapped noise texture"""
+class RenderTexturePool:
+    """
+    Keeps unused render textures to reuse them instead of allocating new ones.
+    At most `capacity` textures are kept, the least recently released ones are unloaded first.
+    """
+
+    def __init__(self, capacity: int = 16):
+        self.capacity = capacity
+        # free textures (by id), from the least to the most recently released
+        self.free: OrderedDict[int, RenderTexture] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, size: tuple[int, int]) -> RenderTexture:
+        """Returns a render texture of the given size (its content is undefined)"""
+        for id, render in reversed(self.free.items()):
+            if (render.texture.width, render.texture.height) == size:
+                del self.free[id]
+                self.hits += 1
+                return render
+
+        self.misses += 1
+        return rl.load_render_texture(size[0], size[1])
+
+    def release(self, render: RenderTexture):
+        """Gives back a render texture which isn't used anymore"""
+        self.free[render.id] = render
+        self.free.move_to_end(render.id)
+        while len(self.free) > self.capacity:
+            _, evicted = self.free.popitem(last=False)
+            rl.unload_render_texture(evicted)
+
+    def clear(self):
+        """Unloads every free texture"""
+        for render in self.free.values():
+            rl.unload_render_texture(render)
+        self.free.clear()
+
+# pool of the noise textures (they are only used until they are read back)
+noise_textures = RenderTexturePool(32)
+
+class CubemapPool:
+    """
+    Keeps unused cubemaps to fill them with new faces instead of allocating new ones (like `RenderTexturePool`).
+    At most `capacity` cubemaps are kept, the least recently released ones are unloaded first.
+    """
+
+    def __init__(self, capacity: int = 16):
+        self.capacity = capacity
+        # free cubemaps (by id), from the least to the most recently released
+        self.free: OrderedDict[int, Texture] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def upload(self, faces: np.ndarray) -> Texture:
+        """Returns a cubemap with the given faces (see `load_cubemap`), reusing a free one of the same size and format if possible"""
+        size, format = faces.shape[1], cubemap_format(faces)
+        for id, cubemap in reversed(self.free.items()):
+            if (cubemap.width, cubemap.format) == (size, format):
+                del self.free[id]
+                self.hits += 1
+                update_cubemap(cubemap, faces)
+                return cubemap
+
+        self.misses += 1
+        return load_cubemap(faces)
+
+    def release(self, cubemap: Texture):
+        """Gives back a cubemap which isn't used anymore"""
+        self.free[cubemap.id] = cubemap
+        self.free.move_to_end(cubemap.id)
+        while len(self.free) > self.capacity:
+            _, evicted = self.free.popitem(last=False)
+            rl.unload_texture(evicted)
+
+    def clear(self):
+        """Unloads every free cubemap"""
+        for cubemap in self.free.values():
+            rl.unload_texture(cubemap)
+        self.free.clear()
+
+# pool of the planets' height and normal cubemaps (enough for the full maps of a whole system)
+terrain_cubemaps = CubemapPool(32)
+
+# change it when the noise shader changes, to ignore the heightmaps cached with the previous version
+NOISE_VERSION = 2
+
+# terrain is displaced by the heightmap's value times this (relative to the radius, see planet_vert.glsl)
+TERRAIN_HEIGHT = 1/6
+
+@dataclass
+class NoiseParams:
+    """
+    Parameters of a noise texture (see `generate_noise`), which can be chosen without a GPU.
+    The texture holds the faces of a cubemap (its size is given by `atlas_size`).
+    """
+    size: tuple[int, int]
+    scale: tuple[float, float, float]
+    pos: tuple[float, float]
+    octaves: int
+    frequency: float
+    amplitude: float
+    warp: float
+    ridge: bool
+    invert: bool
+
+    def generate(self) -> "TerrainMaps":
+        """Generate the noise texture with these parameters, and the planet's maps from it"""
+        return generate_noise(self.size, Vector3(*self.scale), Vector2(*self.pos), self.octaves, self.frequency, self.amplitude, self.warp, self.ridge, self.invert)
+
+    def resized(self, size: tuple[int, int]) -> "NoiseParams":
+        """Same noise at another resolution (the noise only depends on texture coordinates)"""
+        return replace(self, size=size)
+
+    def key(self) -> str:
+        """Hash identifying the generated texture"""
+        # the shader only gets 32 bit floats, so parameters which only differ beyond that give the same texture
+        def f32(value: float) -> float:
+            return np.float32(value).item()
+
+        values = (
+            tuple(self.size),
+            tuple(f32(x) for x in self.scale),
+            tuple(f32(x) for x in self.pos),
+            int(self.octaves),
+            f32(self.frequency),
+            f32(self.amplitude),
+            f32(self.warp),
+            bool(self.ridge),
+            bool(self.invert),
+        )
+        return hashlib.sha1(repr((NOISE_VERSION, values)).encode()).hexdigest()
+
+class HeightmapCache:
+    """
+    Noise textures that were already generated, stored on disk by hash of their parameters (see `NoiseParams.key`).
+    Files are memory mapped when loaded. When the cache grows over `max_bytes`, the least recently used files are deleted.
+    """
+
+    def __init__(self, directory: str = os.path.join(CACHE_DIR, "heightmaps"), max_bytes: int = 256*2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, params: NoiseParams) -> str:
+        return os.path.join(self.directory, params.key() + ".npy")
+
+    def load(self, params: NoiseParams) -> np.ndarray | None:
+        """Returns the cached heightmap (as bytes, of shape (height, width)) or None if it isn't cached"""
+        path = self.path(params)
+        try:
+            heights = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if heights.shape != (params.size[1], params.size[0]) or heights.dtype != np.uint8:
+            self.misses += 1
+            return None
+
+        # keep track of the last use for the eviction
+        os.utime(path)
+        self.hits += 1
+        return heights
+
+    def store(self, params: NoiseParams, heights: np.ndarray):
+        """Adds a heightmap (as bytes, of shape (height, width)) to the cache"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(params)
+
+        # write to a temporary file first so that an interrupted write doesn't leave a broken file
+        temp = path + ".tmp"
+        with open(temp, "wb") as f:
+            np.save(f, np.ascontiguousarray(heights, dtype=np.uint8))
+        try:
+            os.replace(temp, path)
+        except OSError:
+            # the file is already cached and memory mapped (which prevents replacing it on Windows)
+            os.remove(temp)
+
+        self.evict()
+
+    def evict(self):
+        """Deletes the least recently used files until the cache fits in `max_bytes`"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npy"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # already evicted (the cache can be written from several threads),
+                # or still memory mapped (which prevents deleting it on Windows, it will be evicted later)
+                pass
+            total -= size
+
+heightmap_cache = HeightmapCache()
+
+def read_pixels(render: RenderTexture) -> np.ndarray:
+    """Reads back a render texture from the GPU (as bytes, of shape (height, width, 4))"""
+    image = rl.load_image_from_texture(render.texture)
+    pixels = np.frombuffer(ffi.buffer(image.data, image.width*image.height*4), dtype=np.uint8)
+    pixels = pixels.reshape(image.height, image.width, 4).copy()
+    rl.unload_image(image)
+    return pixels
+
+def read_noise(render: RenderTexture) -> np.ndarray:
+    """Reads back a noise texture from the GPU (as bytes, of shape (height, width))"""
+    return np.ascontiguousarray(read_pixels(render)[:, :, 0])
+
+def set_noise_values(size: tuple[int, int], scale: Vector3, pos: Vector2, octaves: int, frequency: float, amplitude: float, warp: float, ridge: bool, invert: bool) -> NoiseShader:
+    """Set the uniforms of the noise shader (loading it if needed)"""
 
     global noise_shader
     if noise_shader == None:
@@ -33,16 +265,201 @@ def generate_noise(size: tuple[int, int], scale: Vector3, pos: Vector2, octaves:
     rl.set_shader_value(noise_shader.shader, noise_shader.u_warp, ffi.new("float *", warp), rl.ShaderUniformDataType.SHADER_UNIFORM_FLOAT)
     rl.set_shader_value(noise_shader.shader, noise_shader.u_ridge, ffi.new("int *", int(ridge)), rl.ShaderUniformDataType.SHADER_UNIFORM_INT)
     rl.set_shader_value(noise_shader.shader, noise_shader.u_invert, ffi.new("int *", int(invert)), rl.ShaderUniformDataType.SHADER_UNIFORM_INT)
+    rl.set_shader_value(noise_shader.shader, noise_shader.u_face_size, ffi.new("float *", atlas_face_size(size)), SHADER_UNIFORM_FLOAT)
+
+    return noise_shader
 
-    print(f"CREATING NOISE TEXTURE [{size[0]}x{size[1]}]")
+def draw_noise_rows(render: RenderTexture, size: tuple[int, int], start: int, end: int):
+    """Draw the rows [start; end[ of a noise texture (the noise shader's uniforms must already be set)"""
+    assert(noise_shader != None)
 
-    render = rl.load_render_texture(size[0], size[1])
     rl.begin_texture_mode(render)
     rl.begin_shader_mode(noise_shader.shader)
 
-    draw_rectangle_tex_coords(0, 0, size[0], size[1])
+    draw_rectangle_tex_coords(0, start, size[0], end - start, start / size[1], end / size[1])
 
     rl.end_shader_mode()
     rl.end_texture_mode()
 
-    return render
+def terrain_normals(heights: np.ndarray) -> np.ndarray:
+    """Normals of the terrain of a noise texture's content (as bytes, of shape (6, size, size, 3), see `surface_normals`)"""
+    return surface_normals(atlas_faces(heights), TERRAIN_HEIGHT)
+
+# computes the normals of the finished noise textures, so that the render thread only uploads them
+# (numpy releases the GIL while it works on the arrays)
+normal_workers = ThreadPoolExecutor(1)
+
+class TerrainMaps:
+    """
+    Height and normal cubemaps of a planet's terrain, sampled by the planet shaders with the direction of the surface.
+    Made from the content of a noise texture, whose gutters are dropped.
+    """
+
+    def __init__(self, heights: np.ndarray, normals: np.ndarray):
+        """Uploads the faces of a noise texture (`heights` being its content) and its normals (see `terrain_normals`) to pooled cubemaps"""
+        self.height: Texture = terrain_cubemaps.upload(atlas_faces(heights)[:, GUTTER:-GUTTER, GUTTER:-GUTTER])
+        self.normal: Texture = terrain_cubemaps.upload(normals)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """Size of the noise texture the maps were made from"""
+        return atlas_size(self.height.width)
+
+    def unload(self):
+        """Gives back the cubemaps to the pool (`terrain_cubemaps`)"""
+        terrain_cubemaps.release(self.height)
+        terrain_cubemaps.release(self.normal)
+
+def generate_noise(size: tuple[int, int], scale: Vector3, pos: Vector2, octaves: int, frequency: float, amplitude: float, warp: float, ridge: bool, invert: bool) -> TerrainMaps:
+    """
+    Generate a cubemap noise texture (or load it from the heightmap cache), and a planet's maps from it.
+    Everything is done right away, `NoiseQueue` spreads the work over several frames instead.
+    """
+
+    params = NoiseParams(size, (scale.x, scale.y, scale.z), (pos.x, pos.y), octaves, frequency, amplitude, warp, ridge, invert)
+
+    heights = heightmap_cache.load(params)
+    if heights is None:
+        render = noise_textures.acquire(size)
+        set_noise_values(size, scale, pos, octaves, frequency, amplitude, warp, ridge, invert)
+        draw_noise_rows(render, size, 0, size[1])
+
+        heights = read_noise(render)
+        heightmap_cache.store(params, heights)
+        # only the cubemaps are kept
+        noise_textures.release(render)
+
+    return TerrainMaps(heights, terrain_normals(heights))
+
+# resolution of the textures shown while the full ones are being generated
+PLACEHOLDER_SIZE = atlas_size(32)
+
+class NoiseJob:
+    """Noise texture being generated a few rows at a time by a `NoiseQueue`"""
+
+    def __init__(self, params: NoiseParams, position: Callable[[], np.ndarray], done: Callable[[TerrainMaps], None]):
+        self.params = params
+        # position of the object the texture is for (closer objects are generated first)
+        self.position = position
+        # called with the maps made from the finished texture
+        self.done = done
+
+        self.render: RenderTexture | None = None
+        # next row to generate
+        self.row = 0
+        self.cancelled = False
+
+        # content of the finished texture, and its normals being computed in the background
+        self.heights: np.ndarray | None = None
+        self.normals: Future[np.ndarray] | None = None
+
+    def cancel(self):
+        """Stops the generation (the texture generated so far is given back to the pool by the queue)"""
+        self.cancelled = True
+
+    def drawn(self) -> bool:
+        """Are all the rows of the texture drawn? (it is read back by the queue on the next frame)"""
+        return self.render != None and self.row >= self.params.size[1]
+
+    def uploadable(self) -> bool:
+        """Are the normals of the finished texture computed? (the maps are uploaded by the queue)"""
+        return self.normals != None and self.normals.done()
+
+class NoiseQueue:
+    """
+    Generates noise textures progressively, a few rows per frame, so that creating a system doesn't stall the game.
+    Since the GPU runs asynchronously, the budget is expressed in pixels generated per frame rather than in time.
+    The normals of the finished textures are computed in the background (`normal_workers`), then the maps are uploaded.
+    """
+
+    def __init__(self, pixel_budget: int = 200_000, strip_rows: int = 50):
+        self.pixel_budget = pixel_budget
+        self.strip_rows = strip_rows
+        self.jobs: list[NoiseJob] = []
+
+    def add(self, params: NoiseParams, position: Callable[[], np.ndarray], done: Callable[[TerrainMaps], None]) -> NoiseJob:
+        """Queues the generation of a noise texture, `done` is called with the maps made from it once it is finished"""
+        job = NoiseJob(params, position, done)
+        self.jobs.append(job)
+        return job
+
+    def pending(self) -> int:
+        """Number of textures that are not finished yet"""
+        return sum(1 for job in self.jobs if not job.cancelled)
+
+    def update(self, origin: np.ndarray):
+        """Generates the next rows of the textures closest to the given position, within the budget"""
+        self.drop_cancelled()
+
+        # maps whose normals are ready are uploaded (only one per frame)
+        for job in self.jobs:
+            if job.uploadable():
+                self.finish(job)
+                break
+
+        # textures drawn during a previous frame are read back now: the GPU is done with them,
+        # reading them right after drawing them would wait for it
+        for job in [job for job in self.jobs if job.drawn()]:
+            assert(job.render != None)
+            heights = read_noise(job.render)
+            heightmap_cache.store(job.params, heights)
+            noise_textures.release(job.render)
+            job.render = None
+            self.compute_normals(job, heights)
+
+        budget = self.pixel_budget
+        while budget > 0:
+            jobs = [job for job in self.jobs if job.heights is None and not job.drawn()]
+            if len(jobs) == 0:
+                break
+            job = min(jobs, key=lambda job: float(np.sum((job.position() - origin)**2)))
+            params = job.params
+            width, height = params.size
+
+            if job.render == None:
+                # already generated before: only the normals are left to compute
+                heights = heightmap_cache.load(params)
+                if heights is not None:
+                    self.compute_normals(job, heights)
+                    continue
+                job.render = noise_textures.acquire(params.size)
+
+            # always generate at least one row per frame
+            rows = min(max(budget // width, 1), self.strip_rows, height - job.row)
+            set_noise_values(params.size, Vector3(*params.scale), Vector2(*params.pos), params.octaves, params.frequency, params.amplitude, params.warp, params.ridge, params.invert)
+            draw_noise_rows(job.render, params.size, job.row, job.row + rows)
+            job.row += rows
+            budget -= rows*width
+
+    def compute_normals(self, job: NoiseJob, heights: np.ndarray):
+        """Starts computing the normals of a finished job in the background (`heights` being the content of its texture)"""
+        job.heights = heights
+        job.normals = normal_workers.submit(terrain_normals, heights)
+
+    def finish(self, job: NoiseJob):
+        """Uploads the maps of a job whose normals are computed"""
+        assert(job.heights is not None and job.normals != None)
+        self.jobs.remove(job)
+        job.done(TerrainMaps(job.heights, job.normals.result()))
+
+    def drop_cancelled(self):
+        """Gives back the textures of the cancelled jobs to the pool"""
+        for job in self.jobs:
+            if job.cancelled:
+                if job.render != None:
+                    noise_textures.release(job.render)
+                if job.normals != None:
+                    job.normals.cancel()
+        self.jobs = [job for job in self.jobs if not job.cancelled]
+
+    def transfer(self, other: "NoiseQueue"):
+        """Moves the jobs that aren't finished yet to another queue (they keep their progress)"""
+        self.drop_cancelled()
+        other.jobs.extend(self.jobs)
+        self.jobs = []
+
+    def clear(self):
+        """Cancels every job"""
+        for job in self.jobs:
+            job.cancel()
+        self.drop_cancelled()
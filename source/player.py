@@ -1,11 +1,13 @@
-from dataclasses import dataclass
-from typing import Iterable
+from dataclasses import dataclass, field
 
 import pyray as rl
-from pyray import Vector3, Camera3D, KeyboardKey
-from system import Planet
+from pyray import Vector2, Vector3, Camera3D, KeyboardKey
+from integrators import Integrator, VelocityVerlet
+from predictor import gravity_field
+from replay import FrameInput
+from system import BodyTable
 
-from utils import Quat, vec3_zero
+from utils import Quat, array_to_vec3, vec3_to_array, vec3_zero
 
 @dataclass
 class Player:
@@ -14,10 +16,15 @@ class Player:
     camera: Camera3D
     rotation: Quat
     target_rotation: Quat
-
-    def handle_mouse_input(self, dt: float):
-        """Update view angle"""
-        mouse_speed = 0.3
+    integrator: Integrator = field(default_factory=VelocityVerlet)
+    # state before the last simulation tick (to interpolate the camera between ticks)
+    prev_pos: "Vector3 | None" = None
+    prev_rotation: "Quat | None" = None
+
+    def handle_mouse_input(self, dt: float, d: Vector2, input: FrameInput | None = None):
+        """Update view angle from the mouse movement `d` (in pixels), keys are read from `input` (or live)"""
+        is_key_down = rl.is_key_down if input == None else input.is_key_down
+        mouse_speed = 0.3/60 # radians per pixel
         roll_speed = 0.5
 
         # calculate local coordinate system
@@ -27,20 +34,21 @@ class Player:
         right = rl.vector3_transform(Vector3(1, 0, 0), rot_matrix)
 
         # get rotation delta
-        d = rl.get_mouse_delta()
-        yaw = rl.quaternion_from_axis_angle(up, -d.x*mouse_speed*dt)
-        pitch = rl.quaternion_from_axis_angle(right, -d.y*mouse_speed*dt)
-        roll = rl.quaternion_from_axis_angle(forward, roll_speed*(float(rl.is_key_down(KeyboardKey.KEY_E))-float(rl.is_key_down(KeyboardKey.KEY_Q)))*dt)
+        yaw = rl.quaternion_from_axis_angle(up, -d.x*mouse_speed)
+        pitch = rl.quaternion_from_axis_angle(right, -d.y*mouse_speed)
+        roll = rl.quaternion_from_axis_angle(forward, roll_speed*(float(is_key_down(KeyboardKey.KEY_E))-float(is_key_down(KeyboardKey.KEY_Q)))*dt)
 
         # apply it
         rot = rl.quaternion_multiply(yaw, pitch)
         rot = rl.quaternion_multiply(rot, roll)
         self.target_rotation = rl.quaternion_multiply(rot, self.target_rotation)
-        self.rotation = rl.quaternion_slerp(self.rotation, self.target_rotation, 0.3)
+        # the rotation catches up 30% of the way every 60th of a second, whatever the tick rate
+        self.rotation = rl.quaternion_slerp(self.rotation, self.target_rotation, 1 - 0.7**(dt*60))
 
-    def handle_keyboard_input(self):
-        """Accelerate ship with keyboard inputs, and sync raylib camera with player movement"""
-        move_speed = 0.2
+    def handle_keyboard_input(self, dt: float, input: FrameInput | None = None):
+        """Accelerate ship with keyboard inputs (read from `input`, or live), and sync raylib camera with player movement"""
+        is_key_down = rl.is_key_down if input == None else input.is_key_down
+        move_speed = 0.2 # per 60th of a second
 
         # calculate local coordinate system
         rot_matrix = rl.quaternion_to_matrix(self.rotation)
@@ -49,43 +57,60 @@ class Player:
         right = rl.vector3_transform(Vector3(1, 0, 0), rot_matrix)
 
         # apply movement
-        forward_input = float(rl.is_key_down(KeyboardKey.KEY_W))-float(rl.is_key_down(KeyboardKey.KEY_S))
-        right_input = float(rl.is_key_down(KeyboardKey.KEY_D))-float(rl.is_key_down(KeyboardKey.KEY_A))
-        up_input = float(rl.is_key_down(KeyboardKey.KEY_SPACE))-float(rl.is_key_down(KeyboardKey.KEY_LEFT_CONTROL))
+        forward_input = float(is_key_down(KeyboardKey.KEY_W))-float(is_key_down(KeyboardKey.KEY_S))
+        right_input = float(is_key_down(KeyboardKey.KEY_D))-float(is_key_down(KeyboardKey.KEY_A))
+        up_input = float(is_key_down(KeyboardKey.KEY_SPACE))-float(is_key_down(KeyboardKey.KEY_LEFT_CONTROL))
 
         acc = vec3_zero()
         acc = rl.vector3_add(acc, rl.vector3_scale(forward, forward_input))
         acc = rl.vector3_add(acc, rl.vector3_scale(right, right_input))
         acc = rl.vector3_add(acc, rl.vector3_scale(up, up_input))
-        acc = rl.vector3_scale(acc, move_speed)
-
-        self.vel = rl.vector3_add(self.vel, acc) # don't multiply by dt (impulse instead of force)
-
-    def apply_gravity(self, G: float, dt: float, bodies: Iterable[Planet]):
-        """Apply gravity force to the player from all bodies"""
-        acc = vec3_zero()
-        for p in bodies:
-            dir = rl.vector3_subtract(p.pos, self.pos)
-            distance = rl.vector3_length(dir)
-            if distance < 0.05:
-                continue # avoid numerical explosion
-
-            normalized = rl.vector3_scale(dir, 1.0 / distance) # normalize `dir`
-            acceleration = G * p.mass / (distance*distance)
-            acc = rl.vector3_add(acc, rl.vector3_scale(normalized, acceleration))
-        self.vel = rl.vector3_add(self.vel, rl.vector3_scale(acc, dt))
-
-    def integrate(self, dt: float):
-        """Apply velocity to position"""
-        self.pos = rl.vector3_add(self.pos, rl.vector3_scale(self.vel, dt))
+        acc = rl.vector3_scale(acc, move_speed*dt*60)
+
+        self.vel = rl.vector3_add(self.vel, acc)
+
+    def step(self, G: float, dt: float, bodies: BodyTable):
+        """
+        Move the player through the gravity field of all bodies during `dt` seconds,
+        the bodies should already have been updated to the end of the step
+        """
+        gravity = gravity_field(bodies, G)
+        # the end of the last step is now at -dt (the acceleration computed there is still valid)
+        self.integrator.shift(dt)
+
+        pos = vec3_to_array(self.pos)
+        vel = vec3_to_array(self.vel)
+
+        # times are relative to the bodies' current state, so the step goes from -dt to 0
+        # (adaptive integrators may need several smaller steps)
+        t = -dt
+        while t < 0.0:
+            pos, vel, taken = self.integrator.step(gravity, pos, vel, t, -t)
+            t += taken
+
+        self.pos = array_to_vec3(pos)
+        self.vel = array_to_vec3(vel)
     
-    def sync_camera(self):
-        """Synchronise the camera with the player's transforms"""
-        rot_matrix = rl.quaternion_to_matrix(self.rotation)
+    def save_state(self):
+        """Remember the current position and rotation as the previous ones (call before a simulation tick)"""
+        self.prev_pos = self.pos
+        self.prev_rotation = self.rotation
+
+    def sync_camera(self, alpha: float = 1.0):
+        """
+        Synchronise the camera with the player's transforms,
+        interpolated between the previous (`alpha` = 0) and current state
+        """
+        pos, rotation = self.pos, self.rotation
+        if self.prev_pos != None and self.prev_rotation != None:
+            pos = rl.vector3_lerp(self.prev_pos, self.pos, alpha)
+            rotation = rl.quaternion_slerp(self.prev_rotation, self.rotation, alpha)
+
+        rot_matrix = rl.quaternion_to_matrix(rotation)
         forward = rl.vector3_transform(Vector3(0, 0, -1), rot_matrix)
         up = rl.vector3_transform(Vector3(0, 1, 0), rot_matrix)
 
         # sync camera
         self.camera.up = up
-        self.camera.position = self.pos
+        self.camera.position = pos
         self.camera.target = rl.vector3_add(self.camera.position, forward)
@@ -0,0 +1,252 @@
+import numpy as np
+
+from heightmap import terrain_radius
+from integrators import Field, Integrator
+from gravity import THETA, gravity_acceleration
+from system import BodyTable
+
+# number of steps integrated between two collision checks
+COLLISION_CHECK_INTERVAL = 16
+
+class Orbits:
+    """
+    Snapshot of the bodies' orbits, to evaluate their positions at any time (in seconds from the snapshot).
+    Since orbits are perfectly circular, positions are computed analytically.
+    """
+
+    def __init__(self, bodies: BodyTable, G: float):
+        n = bodies.count
+        self.count = n
+        self.angles = bodies.orbit_angle[:n].copy()
+        self.speeds = bodies.angular_speeds(G)
+        self.orbit_radius = bodies.orbit_radius[:n].copy()
+        self.parent = bodies.parent[:n].copy()
+        self.levels = bodies.levels()
+        # current positions (bodies without a parent don't move)
+        self.current = bodies.pos[:n].copy()
+
+        # shape of the bodies, for collisions
+        self.radius = bodies.radius[:n].copy()
+        self.bounding_radius = bodies.bounding_radius()
+        self.terrain = bodies.terrain[:n].copy()
+        self.heightmaps = bodies.heightmaps[:n]
+        self.rotation = bodies.rotation[:n].copy()
+        self.rotation_speed = bodies.rotation_speed[:n].copy()
+        # the asteroids aren't copied, they only move with the bodies
+        self.belt = bodies.belt
+
+        self.local = np.zeros((n, 3))
+
+    def positions(self, times: np.ndarray) -> np.ndarray:
+        """
+        Evaluates the position of every body at all the given times at once.
+        Returns an array of shape (len(times), number of bodies, 3)
+        """
+        angles = self.angles + np.outer(times, self.speeds)
+
+        local = np.zeros((len(times), self.count, 3))
+        local[:, :, 0] = np.cos(angles)*self.orbit_radius
+        local[:, :, 2] = np.sin(angles)*self.orbit_radius
+
+        positions = np.broadcast_to(self.current, local.shape).copy()
+        for idx in self.levels:
+            positions[:, idx] = local[:, idx] + positions[:, self.parent[idx]]
+        return positions
+
+    def positions_at(self, t: float) -> np.ndarray:
+        """Evaluates the position of every body at the given time (faster than `positions` for a single time)"""
+        if t == 0.0:
+            return self.current
+
+        angles = self.angles + self.speeds*t
+        self.local[:, 0] = np.cos(angles)*self.orbit_radius
+        self.local[:, 2] = np.sin(angles)*self.orbit_radius
+
+        positions = self.current.copy()
+        for idx in self.levels:
+            positions[idx] = self.local[idx] + positions[self.parent[idx]]
+        return positions
+
+def body_positions(bodies: BodyTable, G: float, times: np.ndarray) -> np.ndarray:
+    """
+    Evaluates the position of every body at the given times (in seconds from now).
+    Returns an array of shape (len(times), number of bodies, 3)
+    """
+    return Orbits(bodies, G).positions(times)
+
+def gravity_field(bodies: BodyTable, G: float, orbits: Orbits | None = None, theta: float = THETA) -> Field:
+    """
+    Returns the gravity field of the bodies, at times relative to their current state.
+    The gravity of big asteroid belts is approximated with a tree (see `AsteroidBelt.acceleration_at`),
+    `theta` being its opening angle (0 to sum every asteroid exactly)
+    """
+    if orbits == None:
+        orbits = Orbits(bodies, G)
+    gm = G*bodies.mass[:bodies.count]
+    belt = orbits.belt
+
+    if belt == None:
+        def field(pos: np.ndarray, t: float) -> np.ndarray:
+            return gravity_acceleration(gm, orbits.positions_at(t), pos)
+        return field
+
+    def belt_field(pos: np.ndarray, t: float) -> np.ndarray:
+        return gravity_acceleration(gm, orbits.positions_at(t), pos) + belt.acceleration_at(G, pos, t, theta)
+    return belt_field
+
+def first_collision(trace: np.ndarray, times: np.ndarray, positions: np.ndarray, orbits: Orbits) -> int:
+    """
+    Returns the index of the first point of the trace which is inside a body (under its terrain) or an asteroid,
+    or -1 if the trace never hits anything.
+    `positions` are the positions of the bodies at the time of every point (see `Orbits.positions`)
+    """
+    dir = positions - trace[:, None, :]
+    dist_sqr = np.einsum("tij,tij->ti", dir, dir)
+
+    near = dist_sqr <= orbits.bounding_radius**2
+    # bodies without terrain are their bounding sphere
+    inside = near & ~orbits.terrain
+
+    # only look at the terrain of the bodies whose bounding sphere contains a point
+    near &= orbits.terrain
+    for i in np.nonzero(near.any(axis=0))[0]:
+        t = np.nonzero(near[:, i])[0]
+        rotation = orbits.rotation[i] + orbits.rotation_speed[i]*times[t]
+        surface = terrain_radius(orbits.heightmaps[i], orbits.radius[i], rotation, positions[t, i], trace[t])
+        inside[t, i] = dist_sqr[t, i] <= surface**2
+
+    hits = np.nonzero(inside.any(axis=1))[0]
+    hit = int(hits[0]) if len(hits) > 0 else -1
+
+    # asteroids are only checked before the first hit
+    if orbits.belt != None:
+        end = hit if hit >= 0 else len(trace)
+        asteroid_hit = orbits.belt.first_collision(trace[:end], times[:end])
+        if asteroid_hit >= 0:
+            hit = asteroid_hit
+    return hit
+
+def integrate(bodies: BodyTable, G: float, pos: np.ndarray, vel: np.ndarray, start: float, duration: float, dt: float, integrator: Integrator) -> tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Integrates the player's trajectory from `start` seconds from now, for at least `duration` seconds
+    with steps of at most `dt` (exactly `dt` for non adaptive integrators).
+    Returns the time (from now), position and velocity after each step,
+    and the index of the first step ending inside a body (-1 if there is none).
+    Integration stops at the first collision.
+    """
+    orbits = Orbits(bodies, G)
+    field = gravity_field(bodies, G, orbits)
+    integrator.reset()
+
+    times, trace, vels = [], [], []
+    t, end = start, start + duration - 1e-9
+    checked, hit = 0, -1
+    while t < end:
+        pos, vel, taken = integrator.step(field, pos, vel, t, dt)
+        t += taken
+        times.append(t)
+        trace.append(pos)
+        vels.append(vel)
+
+        # check collisions by batches, so that we don't integrate (with tiny steps) through a body
+        if len(trace) - checked >= COLLISION_CHECK_INTERVAL or t >= end:
+            batch_times = np.array(times[checked:])
+            hit = first_collision(np.array(trace[checked:]), batch_times, orbits.positions(batch_times), orbits)
+            if hit >= 0:
+                hit += checked
+                break
+            checked = len(trace)
+
+    return np.array(times), np.array(trace).reshape(-1, 3), np.array(vels).reshape(-1, 3), hit
+
+def predict(bodies: BodyTable, G: float, pos: np.ndarray, vel: np.ndarray, dt: float, steps: int, integrator: Integrator) -> tuple[np.ndarray, bool]:
+    """
+    Predicts the player's trajectory for `steps*dt` seconds, without modifying the bodies.
+    Returns the trace (starting at the current position) and whether it ends in a collision.
+    """
+    _, trace, _, hit = integrate(bodies, G, pos, vel, 0.0, steps*dt, dt, integrator)
+    trace = np.vstack((pos, trace))
+    if hit >= 0:
+        return trace[:hit + 1], True
+    return trace, False
+
+class TrajectoryCache:
+    """
+    Predicted trajectory kept from one frame to the next.
+    While the player coasts, consumed samples are dropped and only the tail is extended.
+    The whole trajectory is only recomputed when the player's state leaves the prediction
+    (thrust, or integration error beyond the tolerances), or when the system changes.
+    """
+
+    def __init__(self, vel_tolerance: float = 0.1, pos_tolerance: float = 1.0):
+        self.vel_tolerance = vel_tolerance
+        self.pos_tolerance = pos_tolerance
+
+        self.bodies: BodyTable | None = None
+        self.integrator: Integrator | None = None
+        self.G = 0.0
+        self.dt = 0.0
+
+        # simulation time, position and velocity of every sample
+        self.times = np.zeros(0)
+        self.positions = np.zeros((0, 3))
+        self.velocities = np.zeros((0, 3))
+        self.collided = False
+
+    def invalidate(self):
+        """Forces the trajectory to be recomputed on the next update"""
+        self.bodies = None
+
+    def matches(self, time: float, pos: np.ndarray, vel: np.ndarray) -> bool:
+        """Checks if the given player state (at the given time) is still on the predicted trajectory"""
+        i = int(np.searchsorted(self.times, time, side="right")) - 1
+        if i < 0 or i + 1 >= len(self.times):
+            return False
+
+        # interpolate between the two samples around the current time
+        f = (time - self.times[i]) / (self.times[i + 1] - self.times[i])
+        predicted_pos = self.positions[i] + (self.positions[i + 1] - self.positions[i])*f
+        predicted_vel = self.velocities[i] + (self.velocities[i + 1] - self.velocities[i])*f
+
+        return bool(
+            np.linalg.norm(vel - predicted_vel) <= self.vel_tolerance
+            and np.linalg.norm(pos - predicted_pos) <= self.pos_tolerance
+        )
+
+    def update(self, bodies: BodyTable, G: float, time: float, pos: np.ndarray, vel: np.ndarray, dt: float, steps: int, integrator: Integrator) -> tuple[np.ndarray, bool]:
+        """
+        Returns the trace predicted for the next `steps*dt` seconds, starting at the current position
+        (at the given simulation time), and whether it ends in a collision
+        """
+        valid = (
+            self.bodies is bodies and self.integrator is integrator
+            and self.G == G and self.dt == dt
+            and self.matches(time, pos, vel)
+        )
+        if not valid:
+            self.bodies, self.integrator, self.G, self.dt = bodies, integrator, G, dt
+            self.times = np.array([time])
+            self.positions = pos[None, :].copy()
+            self.velocities = vel[None, :].copy()
+            self.collided = False
+        else:
+            # drop consumed samples (but keep the one right before the current time to interpolate from)
+            i = int(np.searchsorted(self.times, time, side="right")) - 1
+            self.times = self.times[i:]
+            self.positions = self.positions[i:]
+            self.velocities = self.velocities[i:]
+
+        # extend the tail up to the horizon
+        missing = time + steps*dt - self.times[-1]
+        if not self.collided and missing > 0:
+            start = self.times[-1] - time
+            times, trace, vels, hit = integrate(bodies, G, self.positions[-1], self.velocities[-1], start, missing, dt, integrator)
+            if hit >= 0:
+                times, trace, vels = times[:hit], trace[:hit], vels[:hit]
+                self.collided = True
+
+            self.times = np.concatenate((self.times, time + times))
+            self.positions = np.vstack((self.positions, trace))
+            self.velocities = np.vstack((self.velocities, vels))
+
+        return np.vstack((pos, self.positions[1:])), self.collided
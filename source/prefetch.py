@@ -0,0 +1,88 @@
+from math import pi
+import threading
+
+import numpy as np
+
+from noise import NoiseQueue
+from sky import gen_sky
+from system import NewSystem, System
+from utils import randf
+
+class SystemPrefetcher:
+    """
+    Prepares the next system before it is needed: its parameters and terrain are generated on a worker thread
+    (without any GPU resources), then its textures are generated progressively with `upload`
+    (for example while the wormhole effect hides the screen), so that switching to it is instant.
+    """
+
+    def __init__(self, G: float, asteroids: int | None = None, gpu_terrain: bool = True):
+        """The number of asteroids of the next systems and where their terrain comes from can be forced (see `NewSystem`)"""
+        self.G = G
+        self.asteroids = asteroids
+        self.gpu_terrain = gpu_terrain
+        # textures of the next system are generated separately from the current system's ones
+        self.queue = NoiseQueue()
+
+        self.thread: threading.Thread | None = None
+        self.system: System | None = None
+        self.uploading = False
+
+    def start(self):
+        """Starts generating the next system on a worker thread (does nothing if it's already started)"""
+        if self.thread != None or self.system != None:
+            return
+        self.thread = threading.Thread(target=self.generate, daemon=True)
+        self.thread.start()
+
+    def generate(self):
+        """Generates the next system, without its textures"""
+        system = NewSystem(headless=True, asteroids=self.asteroids, gpu_terrain=self.gpu_terrain).new_sys(self.G)
+        # randomize orbit angles
+        for planet in system.planets():
+            planet.orbit_angle = randf() * 2 * pi
+        system.place(self.G)
+        # collisions with the terrain work before the textures are generated
+        if self.gpu_terrain:
+            for planet in system.planets():
+                planet.load_terrain()
+        # the sky is only uploaded when switching to the system
+        system.sky_faces = gen_sky(system.sky_seed)
+        self.system = system
+
+    def ready(self) -> bool:
+        """Is the next system generated? (its textures may not be)"""
+        return self.system != None
+
+    def upload(self, origin: np.ndarray):
+        """Generates the next rows of the next system's textures (closest to the given position first), call it every frame"""
+        if self.system == None:
+            return
+
+        if not self.uploading:
+            for planet in self.system.bodies:
+                planet.load_noise(self.queue)
+            self.uploading = True
+        self.queue.update(origin)
+
+    def take(self, noise_queue: NoiseQueue) -> System:
+        """
+        Returns the next system (generating it right away if needed) and forgets it.
+        Its textures that aren't finished yet are moved to the given queue.
+        """
+        if self.thread != None:
+            self.thread.join()
+            self.thread = None
+        if self.system == None:
+            self.generate()
+        assert(self.system != None)
+
+        system = self.system
+        if self.uploading:
+            self.queue.transfer(noise_queue)
+        else:
+            for planet in system.bodies:
+                planet.load_noise(noise_queue)
+
+        self.system = None
+        self.uploading = False
+        return system
@@ -0,0 +1,187 @@
+from collections import deque
+import csv
+import json
+import threading
+import time
+
+import numpy as np
+import pyray as rl
+
+from colors import BLACK, WHITE
+
+# number of frames kept for the statistics of the overlay
+HISTORY = 240
+
+class NullScope:
+    """Scope of a disabled profiler, does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SCOPE = NullScope()
+
+class Scope:
+    """Times a named phase of the frame (adds up if it's entered several times in the same frame)"""
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        # (the simulation thread can end a scope while the main thread ends the frame)
+        with self.profiler.lock:
+            frame = self.profiler.frame
+            frame[self.name] = frame.get(self.name, 0.0) + duration
+        return False
+
+class Profiler:
+    """
+    Measures the duration of the phases of every frame (named scopes), keeps rolling statistics for an overlay
+    and can record a trace of every frame to write it to disk.
+    When disabled, `scope` returns a shared scope that does nothing, so the scopes can stay in the game loop.
+    Phases that run on the simulation thread are counted in the frame during which they end.
+    """
+
+    def __init__(self, enabled: bool = False, history: int = HISTORY):
+        self.enabled = enabled
+        # is the overlay shown?
+        self.overlay = enabled
+        self.history = history
+        # durations of the phases of the current frame (in seconds), only changed with the lock held
+        self.frame: dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.frame_start = time.perf_counter()
+        # durations of the last frames by phase (in milliseconds), the "frame" phase being the whole frame
+        self.times: dict[str, deque[float]] = {}
+        self.frame_count = 0
+
+        # one row per frame while recording
+        self.recording = False
+        self.trace: list[dict[str, float]] = []
+
+        self.scopes: dict[str, Scope] = {}
+
+    def scope(self, name: str) -> Scope | NullScope:
+        """Context manager measuring the phase with the given name"""
+        if not self.enabled:
+            return NULL_SCOPE
+        scope = self.scopes.get(name)
+        if scope == None:
+            scope = self.scopes[name] = Scope(self, name)
+        return scope
+
+    def begin(self, name: str):
+        """Starts measuring the phase with the given name, for phases too long to be put in a `with` block"""
+        if self.enabled:
+            self.scope(name).__enter__()
+
+    def end(self, name: str):
+        """Stops measuring the phase with the given name (see `begin`)"""
+        if self.enabled:
+            self.scope(name).__exit__(None, None, None)
+
+    def end_frame(self):
+        """Stores the durations of the frame that ends and starts a new one (call it once per frame)"""
+        now = time.perf_counter()
+        if not self.enabled:
+            self.frame_start = now
+            return
+
+        with self.lock:
+            frame, self.frame = self.frame, {}
+        frame["frame"] = now - self.frame_start
+        self.frame_start = now
+
+        for name in frame:
+            if name not in self.times:
+                self.times[name] = deque(maxlen=self.history)
+        # phases that didn't run this frame took no time
+        for name, times in self.times.items():
+            times.append(frame.get(name, 0.0)*1000)
+
+        if self.recording:
+            row = { "index": self.frame_count }
+            row.update((name, duration*1000) for name, duration in frame.items())
+            self.trace.append(row)
+        self.frame_count += 1
+
+    def toggle(self):
+        """Shows/Hides the overlay (the profiler is disabled when it is hidden, unless it is recording)"""
+        self.overlay = not self.overlay
+        self.enabled = self.overlay or self.recording
+        with self.lock:
+            self.frame = {}
+        self.frame_start = time.perf_counter()
+        self.times = {}
+
+    def start_recording(self):
+        """Starts recording the trace of every frame (enables the profiler)"""
+        self.enabled = True
+        self.recording = True
+        self.trace = []
+        self.frame_start = time.perf_counter()
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Rolling statistics of every phase over the last frames (in milliseconds)"""
+        stats = {}
+        for name, times in self.times.items():
+            values = np.array(times)
+            stats[name] = {
+                "min": float(values.min()),
+                "mean": float(values.mean()),
+                "p99": float(np.percentile(values, 99)),
+            }
+        return stats
+
+    def dump(self, path: str):
+        """Writes the recorded trace (durations in milliseconds), as JSON if the path ends with .json, as CSV otherwise"""
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({ "frames": self.trace, "stats": self.stats() }, f, indent=4)
+            return
+
+        names = ["index", "frame"]
+        for row in self.trace:
+            names.extend(name for name in row if name not in names)
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, names, restval=0.0)
+            writer.writeheader()
+            writer.writerows(self.trace)
+
+    def draw(self, x: int, y: int, info: tuple[str, ...] = (), font_size: int = 10):
+        """
+        Draws the statistics of every phase, under the given lines of information about the frame
+        (does nothing when the overlay is hidden)
+        """
+        if not self.overlay or len(self.times) == 0:
+            return
+
+        stats = self.stats()
+        # whole frame first, then the slowest phases
+        names = sorted(stats, key=lambda name: (name != "frame", -stats[name]["mean"]))
+        rows = [("phase (ms)", "min", "mean", "p99")]
+        rows.extend((name, *(f"{stats[name][key]:.2f}" for key in ("min", "mean", "p99"))) for name in names)
+
+        # the default font isn't monospaced: names are left aligned, numbers right aligned in columns
+        line_height = font_size + 2
+        name_width = max(rl.measure_text(row[0], font_size) for row in rows) + font_size
+        column_width = rl.measure_text("000.00", font_size) + font_size
+        width = max([name_width + 3*column_width] + [rl.measure_text(line, font_size) for line in info])
+        rl.draw_rectangle(x, y, width + 10, line_height*(len(info) + len(rows)) + 8, rl.fade(BLACK, 0.6))
+        for i, line in enumerate(info):
+            rl.draw_text(line, x + 5, y + 4 + i*line_height, font_size, WHITE)
+        for i, row in enumerate(rows):
+            row_y = y + 4 + (len(info) + i)*line_height
+            rl.draw_text(row[0], x + 5, row_y, font_size, WHITE)
+            for j, text in enumerate(row[1:]):
+                right = x + 5 + name_width + (j + 1)*column_width
+                rl.draw_text(text, right - rl.measure_text(text, font_size), row_y, font_size, WHITE)
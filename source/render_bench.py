@@ -0,0 +1,161 @@
+"""
+Scripted flythrough benchmark of the rendering: the camera flies past every body of a seeded system
+(close enough for the planets to fill the screen) and the duration of every frame is measured,
+rendered offscreen like in the game, with the vertical sync and the frame rate cap disabled.
+
+Run it from the root of the project. It works without a GPU with Mesa's software renderer (llvmpipe), for example:
+    xvfb-run -a env LIBGL_ALWAYS_SOFTWARE=1 python source/render_bench.py
+
+Usage: python source/render_bench.py [--frames 120] [--planets 5] [--asteroids 5000] [--seed 1234] [--size 1280 720] [--json results.json]
+"""
+
+import argparse
+import json
+from math import pi
+import time
+
+import numpy as np
+import pyray as rl
+from pyray import Rectangle, Vector2, Vector3
+
+from bench import G, new_player, summarize
+from colors import BLACK, WHITE
+from scene import Scene
+from system import NewSystem, System
+from utils import randf, vec3_to_array
+
+# closest distance of the camera to a body during its pass (in radii), the body fills the screen there
+CLOSE_PASS = 1.6
+# distance of the camera to a body at the start and end of its pass (in radii)
+APPROACH = 8.0
+# frames rendered before measuring a segment (the levels of detail are picked and the shaders are warmed up)
+WARMUP_FRAMES = 10
+
+Segment = tuple[str, np.ndarray, np.ndarray]
+
+def body_pass(name: str, center: np.ndarray, radius: float, side: np.ndarray, frames: int) -> Segment:
+    """Camera flying past a sphere, from `side` of it and always looking at its center"""
+    side = side / np.linalg.norm(side)
+    # fly perpendicular to the side, in the orbital plane
+    along = np.cross(side, np.array((0.0, 1.0, 0.0)))
+    if np.linalg.norm(along) < 1e-6:
+        along = np.array((1.0, 0.0, 0.0))
+    along /= np.linalg.norm(along)
+
+    s = np.linspace(-1.0, 1.0, frames)[:, None]
+    positions = center + side*CLOSE_PASS*radius + along*s*APPROACH*radius
+    return name, positions, np.repeat(center[None, :], frames, axis=0)
+
+def flythrough(sys: System, frames: int) -> list[Segment]:
+    """Path of the camera: an overview of the system, then a pass by every body, the wormhole and through the asteroid belt"""
+    sun = vec3_to_array(sys.bodies[0].pos)
+    extent = max((planet.orbit_radius for planet in sys.planets()), default=1000.0)*1.5
+
+    angles = np.linspace(0.0, pi/2, frames)
+    overview = sun + np.stack((np.cos(angles)*extent, np.full(frames, extent/2), np.sin(angles)*extent), axis=1)
+    segments = [("overview", overview, np.repeat(sun[None, :], frames, axis=0))]
+
+    segments.append(body_pass("sun", sun, sys.bodies[0].radius, np.array((0.0, 0.2, -1.0)), frames))
+    for i, planet in enumerate(sys.planets()):
+        center = vec3_to_array(planet.pos)
+        # from the lit side of the planet
+        side = sun - center
+        side[1] = 0.2*np.linalg.norm(side)
+        segments.append(body_pass(f"planet {i + 1}", center, planet.radius, side, frames))
+
+    wormhole = vec3_to_array(sys.wormhole_pos)
+    segments.append(body_pass("wormhole", wormhole, sys.wormhole_size, sun - wormhole, frames))
+
+    belt = sys.table.belt
+    if belt != None:
+        # along the middle of the ring, looking ahead
+        angles = np.linspace(0.0, pi/8, frames)
+        radius = (belt.inner + belt.outer)/2
+        positions = belt.center + np.stack((np.cos(angles)*radius, np.zeros(frames), np.sin(angles)*radius), axis=1)
+        ahead = belt.center + np.stack((np.cos(angles + 0.1)*radius, np.zeros(frames), np.sin(angles + 0.1)*radius), axis=1)
+        segments.append(("asteroid belt", positions, ahead))
+
+    return segments
+
+def run(segments: list[Segment], sys: System, scene: Scene, width: int, height: int) -> dict[str, dict[str, float]]:
+    """Renders every segment and returns statistics of its frame times (in milliseconds)"""
+    player = new_player()
+    camera = player.camera
+    target = rl.load_render_texture(width, height)
+    screen_rect = Rectangle(0, 0, width, -height)
+    # the system doesn't move, only the camera
+    sys.table.compute_transforms(1.0)
+
+    def render_frame(position: np.ndarray, look_at: np.ndarray, t: float):
+        camera.position = Vector3(*position.tolist())
+        camera.target = Vector3(*look_at.tolist())
+        scene.prepare(player, sys, 1.0, t, width, height)
+
+        rl.begin_texture_mode(target)
+        rl.clear_background(BLACK)
+        scene.draw(camera, sys, height)
+        rl.end_texture_mode()
+
+        rl.begin_drawing()
+        rl.draw_texture_rec(target.texture, screen_rect, Vector2(0, 0), WHITE)
+        rl.end_drawing()
+
+    results = {}
+    t = 0.0
+    for name, positions, targets in segments:
+        for _ in range(WARMUP_FRAMES):
+            render_frame(positions[0], targets[0], t)
+
+        # time between the end of consecutive frames, which includes waiting for the GPU when it is the bottleneck
+        times = []
+        last = time.perf_counter()
+        for position, look_at in zip(positions, targets):
+            t += 1/60
+            render_frame(position, look_at, t)
+            now = time.perf_counter()
+            times.append((now - last)*1000)
+            last = now
+        results[name] = summarize(np.array(times), (50, 95, 99))
+
+    rl.unload_render_texture(target)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=120, help="number of frames measured for every segment of the path")
+    parser.add_argument("--planets", type=int, default=5, help="number of planets of the system")
+    parser.add_argument("--asteroids", type=int, default=5000, help="number of asteroids of the system (0 for none)")
+    parser.add_argument("--seed", type=int, default=1234, help="seed of the generated system")
+    parser.add_argument("--size", type=int, nargs=2, default=[1280, 720], help="size of the rendered frames")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+    width, height = args.size
+
+    # no vertical sync (it's only enabled with FLAG_VSYNC_HINT) and no frame rate cap
+    rl.set_config_flags(rl.ConfigFlags.FLAG_WINDOW_HIDDEN)
+    rl.init_window(width, height, "Spaze render benchmark")
+    rl.set_target_fps(0)
+
+    scene = Scene()
+    # textures are generated right away (without a noise queue)
+    sys = NewSystem().new_sys(G, args.seed, args.planets, args.asteroids)
+    for planet in sys.planets():
+        planet.orbit_angle = randf() * 2 * pi
+    sys.place(G)
+
+    results = run(flythrough(sys, args.frames), sys, scene, width, height)
+
+    print(f"== {width}x{height}, {args.frames} frames per segment")
+    for name, stats in results.items():
+        print(f"  {name:<16} mean {stats['mean']:8.3f} ms   p50 {stats['p50']:8.3f} ms   p95 {stats['p95']:8.3f} ms   p99 {stats['p99']:8.3f} ms")
+
+    if args.json != None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+    sys.unload()
+    scene.unload()
+    rl.close_window()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pyray as rl
+from pyray import KeyboardKey, MouseButton, Vector2
+
+# keys held down that move the player (see `Player`)
+HELD_KEYS = (
+    KeyboardKey.KEY_W, KeyboardKey.KEY_S, KeyboardKey.KEY_A, KeyboardKey.KEY_D,
+    KeyboardKey.KEY_SPACE, KeyboardKey.KEY_LEFT_CONTROL, KeyboardKey.KEY_Q, KeyboardKey.KEY_E,
+)
+# keys pressed that change the state of the game (see `main`), the left click being recorded with them
+PRESSED_KEYS = (KeyboardKey.KEY_ESCAPE, KeyboardKey.KEY_SEMICOLON)
+
+# header of a recording: magic number, version of the format, seed of the generation and tick rate
+MAGIC = b"SPZI"
+VERSION = 1
+HEADER = np.dtype([("magic", "S4"), ("version", "<u4"), ("seed", "<u8"), ("tick_rate", "<f8")])
+# one record per frame (there is exactly one simulation tick per frame while recording or replaying)
+RECORD = np.dtype([("mouse_delta", "<f4", 2), ("held", "<u2"), ("pressed", "u1")])
+
+@dataclass
+class FrameInput:
+    """Inputs of a frame that affect the game, read live or from a recording"""
+    mouse_delta: Vector2
+    # bits of `HELD_KEYS` held down
+    held: int = 0
+    # bits of `PRESSED_KEYS` pressed this frame, then the left click
+    pressed: int = 0
+
+    @staticmethod
+    def read() -> "FrameInput":
+        """Reads the current state of the mouse and keyboard"""
+        held = sum(1 << i for i, key in enumerate(HELD_KEYS) if rl.is_key_down(key))
+        pressed = sum(1 << i for i, key in enumerate(PRESSED_KEYS) if rl.is_key_pressed(key))
+        if rl.is_mouse_button_pressed(MouseButton.MOUSE_BUTTON_LEFT):
+            pressed |= 1 << len(PRESSED_KEYS)
+        return FrameInput(rl.get_mouse_delta(), held, pressed)
+
+    def is_key_down(self, key: KeyboardKey) -> bool:
+        return bool(self.held & (1 << HELD_KEYS.index(key)))
+
+    def is_key_pressed(self, key: KeyboardKey) -> bool:
+        return bool(self.pressed & (1 << PRESSED_KEYS.index(key)))
+
+    def is_left_click(self) -> bool:
+        return bool(self.pressed & (1 << len(PRESSED_KEYS)))
+
+class InputRecorder:
+    """
+    Records the seed of the generation and the inputs of every frame, to replay the same game with `InputReplay`.
+    The recording is written to disk when it is closed (11 bytes per frame).
+    """
+
+    def __init__(self, path: str, seed_value: int, tick_rate: float):
+        self.path = path
+        self.seed = seed_value
+        self.tick_rate = tick_rate
+        self.records: list[tuple] = []
+
+    def record(self, frame: FrameInput):
+        self.records.append(((frame.mouse_delta.x, frame.mouse_delta.y), frame.held, frame.pressed))
+
+    def close(self):
+        header = np.array([(MAGIC, VERSION, self.seed, self.tick_rate)], dtype=HEADER)
+        with open(self.path, "wb") as f:
+            f.write(header.tobytes())
+            f.write(np.array(self.records, dtype=RECORD).tobytes())
+
+class InputReplay:
+    """Inputs of a recording made by `InputRecorder`, given back frame by frame"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+
+        header = np.frombuffer(data, dtype=HEADER, count=1)[0]
+        if header["magic"] != MAGIC or header["version"] != VERSION:
+            raise ValueError(f"{path} isn't an input recording (or was made by another version)")
+        self.seed = int(header["seed"])
+        self.tick_rate = float(header["tick_rate"])
+        self.records = np.frombuffer(data, dtype=RECORD, offset=HEADER.itemsize)
+        self.frame = 0
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def next(self) -> FrameInput | None:
+        """Returns the inputs of the next frame, or None when the recording is over"""
+        if self.frame >= len(self.records):
+            return None
+        record = self.records[self.frame]
+        self.frame += 1
+        return FrameInput(Vector2(*record["mouse_delta"].tolist()), int(record["held"]), int(record["pressed"]))
@@ -0,0 +1,85 @@
+import numpy as np
+
+# the 3D view is never rendered at less than this fraction of the window's size
+MIN_SCALE = 0.5
+MAX_SCALE = 1.0
+# the scale changes by multiples of this (the render target is only re-created when its size changes)
+SCALE_STEP = 0.05
+# number of frames over which the frame time is measured before changing the scale
+WINDOW = 30
+# the scale goes down when frames take this much more than the budget, and up when they fit in it
+OVER_BUDGET = 1.1
+UNDER_BUDGET = 1.02
+# with a frame rate cap, frames fit in the budget even when there is no headroom left,
+# so the scale only goes up after this many windows in a row fitting in the budget
+HEADROOM_WINDOWS = 3
+# and not during this many windows after going down (doubled every time going up had to be undone, up to the maximum)
+COOLDOWN_WINDOWS = 4
+MAX_COOLDOWN_WINDOWS = 64
+
+class ResolutionScaler:
+    """
+    Dynamic resolution: picks the scale of the 3D render target (relative to the window) from the recent frame times,
+    to keep the frame rate when the GPU can't render the fragment heavy shaders at the native resolution.
+    The scale only goes down when the frames are over budget because of the rendering, not because of the CPU
+    (the time before `end_drawing`), since rendering fewer pixels wouldn't help then.
+    """
+
+    def __init__(self, target_fps: int, enabled: bool = True):
+        # uncapped frame rates aim for 60 frames per second
+        self.budget = 1 / (target_fps if target_fps > 0 else 60)
+        self.enabled = enabled
+        self.scale = MAX_SCALE
+
+        self.frame_times: list[float] = []
+        self.cpu_times: list[float] = []
+
+        # windows in a row that fit in the budget, and windows left before the scale can go up again
+        self.headroom = 0
+        self.cooldown = 0
+        self.cooldown_length = COOLDOWN_WINDOWS
+        # did the scale go up at the end of the last window?
+        self.scaled_up = False
+
+    def update(self, frame_time: float, cpu_time: float):
+        """
+        Adds the duration of the last frame and the time the CPU took before waiting for the GPU,
+        and changes the scale every `WINDOW` frames if needed
+        """
+        if not self.enabled:
+            return
+        self.frame_times.append(frame_time)
+        self.cpu_times.append(cpu_time)
+        if len(self.frame_times) < WINDOW:
+            return
+
+        frame_time = float(np.mean(self.frame_times))
+        cpu_time = float(np.mean(self.cpu_times))
+        self.frame_times.clear()
+        self.cpu_times.clear()
+
+        scaled_up, self.scaled_up = self.scaled_up, False
+        self.cooldown = max(self.cooldown - 1, 0)
+
+        if frame_time > self.budget*OVER_BUDGET and cpu_time < self.budget:
+            # the number of pixels is proportional to the square of the scale
+            scale = self.scale*max(np.sqrt(self.budget / frame_time), 0.75)
+            self.headroom = 0
+            self.cooldown_length = min(self.cooldown_length*2, MAX_COOLDOWN_WINDOWS) if scaled_up else COOLDOWN_WINDOWS
+            self.cooldown = self.cooldown_length
+        elif frame_time < self.budget*UNDER_BUDGET:
+            # the frames fit in the budget (probably waiting for the frame rate cap), try a bit more once it lasts
+            self.headroom += 1
+            if self.headroom < HEADROOM_WINDOWS or self.cooldown > 0 or self.scale >= MAX_SCALE:
+                return
+            scale = self.scale + SCALE_STEP
+            self.headroom = 0
+            self.scaled_up = True
+        else:
+            self.headroom = 0
+            return
+        self.scale = min(max(round(scale / SCALE_STEP)*SCALE_STEP, MIN_SCALE), MAX_SCALE)
+
+    def target_size(self, width: int, height: int) -> tuple[int, int]:
+        """Size of the 3D render target for a window of the given size"""
+        return max(round(width*self.scale), 1), max(round(height*self.scale), 1)
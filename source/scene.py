@@ -0,0 +1,84 @@
+import numpy as np
+import pyray as rl
+from pyray import Camera3D
+
+from asteroids import Asteroids
+from frustum import TERRAIN_MARGIN, Frustum
+from lod import SphereLods
+from player import Player
+from shaders import PlanetMaterial, SunMaterial, WormholeMaterial
+from sky import Sky
+from system import System
+from utils import vec3_to_array
+
+class Scene:
+    """
+    Draws the 3D view of a system: the sky, the sun, the planets, the asteroids and the wormhole,
+    skipping the bodies that are off-screen and picking the level of detail of the others.
+    Used by the game and by the render benchmark.
+    """
+
+    def __init__(self):
+        self.spheres = SphereLods()
+        self.sky = Sky()
+        self.planet_mat = PlanetMaterial()
+        self.sun_mat = SunMaterial()
+        self.wormhole_mat = WormholeMaterial()
+        self.asteroids = Asteroids()
+
+        # bodies to draw, found by `prepare`
+        self.frustum: Frustum | None = None
+        self.visible = np.zeros(0, dtype=bool)
+        self.wormhole_visible = False
+
+    def prepare(self, player: Player, sys: System, alpha: float, time: float, width: int, height: int) -> Frustum:
+        """
+        Finds the visible bodies and uploads the values of the shaders, for a view of the given size
+        (call it while the simulation is locked, after the transforms are computed)
+        """
+        self.sky.update(sys)
+
+        camera = player.camera
+        frustum = Frustum(camera, width / height)
+        n = sys.table.count
+        self.visible = frustum.spheres_visible(sys.table.transforms[:n, :3, 3], sys.table.radius[:n]*TERRAIN_MARGIN)
+        self.wormhole_visible = frustum.sphere_visible(vec3_to_array(sys.wormhole_pos), sys.wormhole_size*TERRAIN_MARGIN)
+        self.asteroids.update(sys.table.belt, camera, frustum, height, alpha)
+        self.frustum = frustum
+
+        self.planet_mat.set_global_values(player, sys)
+        self.sun_mat.set_global_values(player, time)
+        self.asteroids.mat.set_global_values(sys)
+        self.wormhole_mat.set_global_values(time)
+        return frustum
+
+    def draw(self, camera: Camera3D, sys: System, screen_height: int):
+        """Draws what `prepare` found visible (in the current render target)"""
+        rl.begin_mode_3d(camera)
+
+        self.sky.draw()
+
+        # pick the level of detail of every sphere from its size on screen
+        spheres = self.spheres
+        sun = sys.bodies[0]
+        if self.visible[sun.index]:
+            rl.draw_mesh(spheres.mesh(sun, camera, screen_height, sun.pos, sun.radius), self.sun_mat.mat, sun.transform)
+        for planet in sys.planets():
+            if not self.visible[planet.index]:
+                continue
+            self.planet_mat.set_planet_values(planet)
+            rl.draw_mesh(spheres.mesh(planet, camera, screen_height, planet.pos, planet.radius), self.planet_mat.mat, planet.transform)
+
+        # all the asteroids in a single draw call
+        self.asteroids.draw()
+
+        # draw wormhole
+        if self.wormhole_visible:
+            rl.draw_mesh(spheres.mesh("wormhole", camera, screen_height, sys.wormhole_pos, sys.wormhole_size), self.wormhole_mat.mat, sys.wormhole_transform)
+
+        rl.end_mode_3d()
+
+    def unload(self):
+        self.spheres.unload()
+        self.asteroids.unload()
+        self.sky.unload()
@@ -1,5 +1,6 @@
 import pyray as rl
-from raylib import MATERIAL_MAP_ALBEDO, SHADER_ATTRIB_VEC3, SHADER_LOC_MATRIX_MODEL, SHADER_UNIFORM_FLOAT, SHADER_UNIFORM_VEC3, SHADER_UNIFORM_VEC4, ffi
+from pyray import Texture
+from raylib import MATERIAL_MAP_ALBEDO, MATERIAL_MAP_CUBEMAP, MATERIAL_MAP_IRRADIANCE, SHADER_LOC_MAP_CUBEMAP, SHADER_LOC_MAP_IRRADIANCE, SHADER_LOC_MATRIX_MODEL, SHADER_UNIFORM_FLOAT, SHADER_UNIFORM_VEC3, SHADER_UNIFORM_VEC4, ffi
 
 from player import Player
 from system import Planet, System
@@ -11,29 +12,38 @@ class PlanetMaterial:
         self.u_ambient = rl.get_shader_location(self.shader, "ambient")
         self.u_sun_pos = rl.get_shader_location(self.shader, "sunPos")
         self.u_view_pos = rl.get_shader_location(self.shader, "viewPos")
-        self.u_first_layer = rl.get_shader_location(self.shader, "first_layer")
-        self.u_second_layer = rl.get_shader_location(self.shader, "second_layer")
-        self.u_third_layer = rl.get_shader_location(self.shader, "third_layer")
-        self.u_fourth_layer = rl.get_shader_location(self.shader, "fourth_layer")
-        self.u_fifth_layer = rl.get_shader_location(self.shader, "fifth_layer")
+        self.u_layers = rl.get_shader_location(self.shader, "layers")
 
         rl.set_shader_value(self.shader, self.u_ambient, rl.Vector4(0.1, 0.1, 0.1, 1.0), SHADER_UNIFORM_VEC4)
         self.shader.locs[rl.ShaderLocationIndex.SHADER_LOC_VECTOR_VIEW] = self.u_view_pos
+        # raylib only binds the cubemap, irradiance and prefilter maps as cubemaps: the height and normal maps use the first two
+        self.shader.locs[SHADER_LOC_MAP_CUBEMAP] = rl.get_shader_location(self.shader, "heightMap")
+        self.shader.locs[SHADER_LOC_MAP_IRRADIANCE] = rl.get_shader_location(self.shader, "normalMap")
 
         self.mat = rl.load_material_default()
         self.mat.shader = self.shader
 
+        # last values uploaded, uniforms keep their value until they are changed
+        self.view_pos: tuple[float, float, float] | None = None
+        self.sun_pos: tuple[float, float, float] | None = None
+
     def set_planet_values(self, planet: Planet):
-        self.mat.maps[MATERIAL_MAP_ALBEDO].texture = planet.noise.texture
-        rl.set_shader_value(self.shader, self.u_first_layer, rl.Vector4(planet.colors[0].r / 255.0, planet.colors[0].g / 255.0, planet.colors[0].b / 255.0, planet.colors[0].a / 255.0), SHADER_UNIFORM_VEC4)
-        rl.set_shader_value(self.shader, self.u_second_layer, rl.Vector4(planet.colors[1].r / 255.0, planet.colors[1].g / 255.0, planet.colors[1].b / 255.0, planet.colors[1].a / 255.0), SHADER_UNIFORM_VEC4)
-        rl.set_shader_value(self.shader, self.u_third_layer, rl.Vector4(planet.colors[2].r / 255.0, planet.colors[2].g / 255.0, planet.colors[2].b / 255.0, planet.colors[2].a / 255.0), SHADER_UNIFORM_VEC4)
-        rl.set_shader_value(self.shader, self.u_fourth_layer, rl.Vector4(planet.colors[3].r / 255.0, planet.colors[3].g / 255.0, planet.colors[3].b / 255.0, planet.colors[3].a / 255.0), SHADER_UNIFORM_VEC4)
-        rl.set_shader_value(self.shader, self.u_fifth_layer, rl.Vector4(planet.colors[4].r / 255.0, planet.colors[4].g / 255.0, planet.colors[4].b / 255.0, planet.colors[4].a / 255.0), SHADER_UNIFORM_VEC4)
+        self.mat.maps[MATERIAL_MAP_CUBEMAP].texture = planet.maps.height
+        self.mat.maps[MATERIAL_MAP_IRRADIANCE].texture = planet.maps.normal
+        rl.set_shader_value_v(self.shader, self.u_layers, ffi.from_buffer(planet.layer_colors), SHADER_UNIFORM_VEC4, len(planet.layer_colors))
 
     def set_global_values(self, player: Player, sys: System):
-        rl.set_shader_value(self.shader, self.u_view_pos, player.camera.position, SHADER_UNIFORM_VEC3)
-        rl.set_shader_value(self.shader, self.u_sun_pos, sys.bodies[0].pos, SHADER_ATTRIB_VEC3)
+        """Uploads the camera and sun positions, only if they moved since the last upload"""
+        view_pos = (player.camera.position.x, player.camera.position.y, player.camera.position.z)
+        if view_pos != self.view_pos:
+            rl.set_shader_value(self.shader, self.u_view_pos, player.camera.position, SHADER_UNIFORM_VEC3)
+            self.view_pos = view_pos
+
+        sun = sys.bodies[0].pos
+        sun_pos = (sun.x, sun.y, sun.z)
+        if sun_pos != self.sun_pos:
+            rl.set_shader_value(self.shader, self.u_sun_pos, sun, SHADER_UNIFORM_VEC3)
+            self.sun_pos = sun_pos
 
 class SunMaterial:
     def __init__(self):
@@ -54,7 +64,7 @@ class SunMaterial:
 
 class WormholeMaterial:
     def __init__(self):
-        self.shader = rl.load_shader("shaders/planet_vert.glsl", "shaders/wormhole_frag.glsl")
+        self.shader = rl.load_shader("shaders/wormhole_vert.glsl", "shaders/wormhole_frag.glsl")
         self.u_time = rl.get_shader_location(self.shader, "time")
 
         self.mat = rl.load_material_default()
@@ -64,13 +74,37 @@ class WormholeMaterial:
         rl.set_shader_value(self.shader, self.u_time, ffi.new("float *", unpaused_time), SHADER_UNIFORM_FLOAT)
 
 class SkyMaterial:
+    """Material of the sky, a cubemap drawn around the camera"""
+
     def __init__(self):
         self.shader = rl.load_shader("shaders/sky_vert.glsl", "shaders/sky_frag.glsl")
+        # raylib binds the cubemap map of the material to this sampler
+        self.shader.locs[SHADER_LOC_MAP_CUBEMAP] = rl.get_shader_location(self.shader, "environmentMap")
+
+        self.mat = rl.load_material_default()
+        self.mat.shader = self.shader
+
+    def set_cubemap(self, texture: Texture):
+        self.mat.maps[MATERIAL_MAP_CUBEMAP].texture = texture
+
+class AsteroidMaterial:
+    """Material of the asteroids, drawn with instancing (one model matrix per instance)"""
+
+    def __init__(self):
+        self.shader = rl.load_shader("shaders/asteroid_vert.glsl", "shaders/asteroid_frag.glsl")
         self.shader.locs[SHADER_LOC_MATRIX_MODEL] = rl.get_shader_location_attrib(self.shader, "matModel")
+        self.u_ambient = rl.get_shader_location(self.shader, "ambient")
+        self.u_sun_pos = rl.get_shader_location(self.shader, "sunPos")
+
+        rl.set_shader_value(self.shader, self.u_ambient, rl.Vector4(0.1, 0.1, 0.1, 1.0), SHADER_UNIFORM_VEC4)
 
         self.mat = rl.load_material_default()
+        self.mat.maps[MATERIAL_MAP_ALBEDO].color = rl.Color(120, 105, 90, 255)
         self.mat.shader = self.shader
 
+    def set_global_values(self, sys: System):
+        rl.set_shader_value(self.shader, self.u_sun_pos, sys.bodies[0].pos, SHADER_UNIFORM_VEC3)
+
 class WormholeEffect:
     """Effect when you enter the wormhole"""
 
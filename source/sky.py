@@ -1,26 +1,119 @@
+import numpy as np
 import pyray as rl
-from raylib import ffi
+from pyray import Texture
+
+from cubemap import face_coords, face_directions, load_cubemap
+from heightmap import snoise
 from shaders import SkyMaterial
+from system import System
+
+# resolution of every face of the sky's cubemap (a texel is about a pixel of a 720p screen)
+SKY_SIZE = 1024
+# number of stars baked in the cubemap
+STAR_COUNT = 20000
+# the nebula is computed at this resolution, then interpolated to `SKY_SIZE`
+NEBULA_SIZE = 64
+NEBULA_OCTAVES = 4
+# maximum brightness of the nebula (between 0 and 1)
+NEBULA_INTENSITY = 0.25
+
+def resize_faces(faces: np.ndarray, size: int) -> np.ndarray:
+    """Bilinear interpolation of the faces (shape (6, n, n, channels)) to the given size"""
+    n = faces.shape[1]
+    coords = np.clip((np.arange(size) + 0.5) / size * n - 0.5, 0, n - 1)
+    lo = np.minimum(coords.astype(np.intp), n - 2)
+    f = coords - lo
+
+    # interpolation is separable: a matrix multiplication along each axis
+    weights = np.zeros((size, n), dtype=faces.dtype)
+    weights[np.arange(size), lo] = 1 - f
+    weights[np.arange(size), lo + 1] = f
+    rows = np.matmul(weights, faces.transpose(0, 3, 1, 2))
+    return np.matmul(rows, weights.T).transpose(0, 2, 3, 1)
+
+def gen_sky(seed_value: int, stars: int = STAR_COUNT, size: int = SKY_SIZE, nebula: bool = True) -> np.ndarray:
+    """
+    Generates the faces of the sky's cubemap (shape (6, size, size, 3), as bytes): stars, and a faint nebula.
+    Doesn't need the GPU, so that it can be generated with the rest of a system.
+    """
+    gen = np.random.default_rng(seed_value)
+    faces = np.zeros((6, size, size, 3), dtype=np.float32)
 
-from utils import randf
+    if nebula:
+        dirs = face_directions(NEBULA_SIZE)
+        dirs /= np.linalg.norm(dirs, axis=-1, keepdims=True)
+        offset = gen.uniform(-100, 100, 3)
+        density = np.zeros(dirs.shape[:-1])
+        for octave in range(NEBULA_OCTAVES):
+            density += snoise(dirs*2*2**octave + offset) / 2**octave
+        # only the densest parts are visible, with a color going from one hue to another
+        density = np.clip(density - 0.3, 0.0, 1.0)**2
+        hue = np.clip(snoise(dirs*1.5 - offset)*0.5 + 0.5, 0.0, 1.0)[..., None]
+        colors = gen.uniform(0.2, 1.0, (2, 3))
+        cloud = density[..., None]*(colors[0]*(1 - hue) + colors[1]*hue)*NEBULA_INTENSITY
+        faces += resize_faces(cloud.astype(np.float32), size)
+
+    # stars are bundled closer to the horizon line
+    dirs = np.stack((gen.uniform(-1, 1, stars), np.prod(gen.uniform(-1, 1, (3, stars)), axis=0), gen.uniform(-1, 1, stars)), axis=1)
+    face, u, v = face_coords(dirs)
+    brightness = gen.uniform(0.3, 1.0, stars)**2
+    tint = 1.0 - 0.2*gen.uniform(0, 1, (stars, 1))*np.array((0.0, 0.5, 1.0)) # from white to yellow
+    spread = gen.uniform(0.4, 0.8, stars)
+
+    # every star is splatted on the 3x3 texels around it (clamped to its face)
+    x, y = u*size - 0.5, v*size - 0.5
+    cx, cy = np.round(x).astype(np.intp), np.round(y).astype(np.intp)
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            px, py = np.clip(cx + dx, 0, size - 1), np.clip(cy + dy, 0, size - 1)
+            weight = brightness*np.exp(-((px - x)**2 + (py - y)**2) / (2*spread**2))
+            np.add.at(faces, (face, py, px), (weight[:, None]*tint).astype(np.float32))
+
+    np.clip(faces, 0.0, 1.0, out=faces)
+    faces *= 255
+    return faces.astype(np.uint8)
 
 class Sky:
+    """
+    Stars (and a nebula) baked in a cubemap, drawn around the camera in a single pass.
+    The cubemap is generated for every system (see `System.sky_seed`).
+    """
+
     def __init__(self):
-        self.model = rl.gen_mesh_sphere(1, 4, 4)
+        self.model = rl.gen_mesh_cube(1, 1, 1)
         self.mat = SkyMaterial()
+        self.texture: Texture | None = None
+        self.system: System | None = None
 
-        # allocate an array of 1000 matrices
-        self.transforms = ffi.cast("Matrix *", rl.mem_alloc(1000*ffi.sizeof("Matrix")))
-        for i in range(1000):
-            # bundle points closer to the horizon line
-            y = (randf()*2-1)*(randf()*2-1)*(randf()*2-1)
+    def update(self, sys: System):
+        """Uploads the sky of the given system if it isn't the current one (generating it if needed)"""
+        if sys is self.system:
+            return
+        faces = sys.sky_faces if sys.sky_faces is not None else gen_sky(sys.sky_seed)
+        self.upload(faces)
+        # the faces aren't needed once they are on the GPU
+        sys.sky_faces = None
+        self.system = sys
 
-            v = rl.Vector3(randf()*2 - 1, y, randf()*2 - 1)
-            v = rl.vector3_scale(rl.vector3_normalize(v), 500)
-            scale = randf() + 0.5
-            self.transforms[i] = rl.matrix_multiply(rl.matrix_scale(scale, scale, scale), rl.matrix_translate(v.x, v.y, v.z))
+    def upload(self, faces: np.ndarray):
+        """Replaces the cubemap with the given faces (see `gen_sky`)"""
+        if self.texture != None:
+            rl.unload_texture(self.texture)
+        self.texture = load_cubemap(faces)
+        self.mat.set_cubemap(self.texture)
 
     def draw(self):
+        """Draws the sky around the camera (draw it first, it doesn't write the depth)"""
+        if self.texture == None:
+            return
+        # the camera is inside the cube
+        rl.rl_disable_backface_culling()
         rl.rl_disable_depth_mask()
-        rl.draw_mesh_instanced(self.model, self.mat.mat, self.transforms, 1000)
+        rl.draw_mesh(self.model, self.mat.mat, rl.matrix_identity())
         rl.rl_enable_depth_mask()
+        rl.rl_enable_backface_culling()
+
+    def unload(self):
+        if self.texture != None:
+            rl.unload_texture(self.texture)
+            self.texture = None
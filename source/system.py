@@ -1,30 +1,360 @@
+from copy import copy
 from typing import Iterable, Self
-from math import sqrt, cos, sin, pi
-from random import randint
+from math import cos, sin, pi
 import itertools
 
-
+import numpy as np
 import pyray as rl
-from pyray import Color, Vector2, Vector3
+from pyray import Color, Matrix, Vector3
 from raylib.defines import PI
-from noise import generate_noise
+from belt import AsteroidBelt
+from broadphase import BVH
+from cubemap import atlas_faces, atlas_size
+from gravity import gravity_acceleration
+from heightmap import TERRAIN_HEIGHT, bake, terrain_radius
+from noise import PLACEHOLDER_SIZE, NoiseJob, NoiseParams, NoiseQueue, TerrainMaps, heightmap_cache
+
+from utils import randf, randfr, randint, seed
+
+# number of asteroids in the belt of the systems that have one (when it isn't forced)
+BELT_SIZE = (2000, 5000)
+# the number of asteroids of the large systems used to test how the engine scales
+LARGE_BELT_SIZE = 10_000
+
+# resolution of every face of the planets' cubemaps
+PLANET_FACE_SIZE = 384
+# resolution of the heightmaps computed on the CPU for collisions
+TERRAIN_SIZE = atlas_size(80)
+
+class BodyTable:
+    """
+    Structure-of-arrays storage for every body of a system.
+    Orbits, transforms and gravity are computed for all bodies at once with numpy,
+    instead of one pyray call per body.
+    """
+
+    # per-body scalar columns (positions, velocities and transforms are stored separately)
+    COLUMNS = ("mass", "radius", "orbit_radius", "orbit_angle", "rotation", "rotation_speed")
+
+    def __init__(self, capacity: int = 16):
+        self.count = 0
+        self.pos = np.zeros((capacity, 3))
+        self.vel = np.zeros((capacity, 3))
+        self.mass = np.zeros(capacity)
+        self.radius = np.zeros(capacity)
+        self.orbit_radius = np.zeros(capacity)
+        self.orbit_angle = np.zeros(capacity)
+        self.rotation = np.zeros(capacity)
+        self.rotation_speed = np.zeros(capacity)
+        # index of the body this one orbits around (-1 if it doesn't orbit anything)
+        self.parent = np.full(capacity, -1, dtype=np.intp)
+        # number of parents above this body (0 for the sun, 1 for planets, 2 for moons, ...)
+        self.depth = np.zeros(capacity, dtype=np.intp)
+        # state before the last update, to interpolate between simulation ticks when rendering
+        self.prev_pos = np.zeros((capacity, 3))
+        self.prev_rotation = np.zeros(capacity)
+        # model matrices in row-major order (same memory layout as raylib's `Matrix` struct)
+        self.transforms = np.zeros((capacity, 4, 4))
+        # does the body have displaced terrain (given by its heightmap) or is it a perfect sphere?
+        self.terrain = np.zeros(capacity, dtype=bool)
+        self.heightmaps: list[np.ndarray | None] = [None]*capacity
+
+        # bodies whose transform must be recomputed (their state changed since it was computed)
+        self.dirty = np.ones(capacity, dtype=bool)
+        # bodies whose current state differs from the previous one (their transform depends on the interpolation)
+        self.moving = np.zeros(capacity, dtype=bool)
+        # interpolation of the last computed transforms
+        self.transforms_alpha = 1.0
+        # cache of `levels` (reset when the hierarchy changes)
+        self._levels: list[np.ndarray] | None = None
+
+        # asteroids orbiting the first body (the sun), if there are some
+        self.belt: AsteroidBelt | None = None
+
+    def _arrays(self) -> list[str]:
+        return ["pos", "vel", "prev_pos", "prev_rotation", "parent", "depth", "transforms", "terrain", "dirty", "moving", *self.COLUMNS]
+
+    def _grow(self):
+        """Double the capacity of every column"""
+        for name in self._arrays():
+            old = getattr(self, name)
+            new = np.zeros((2*len(old), *old.shape[1:]), dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.heightmaps += [None]*len(self.heightmaps)
+
+    def add(self, parent: int, **values: float) -> int:
+        """
+        Adds a new body to the table and returns its index.
+        The parent (if any) must already be in the table (see `set_parent` otherwise).
+        """
+        if self.count == len(self.mass):
+            self._grow()
+
+        i = self.count
+        self.count += 1
+
+        self.pos[i] = 0.0
+        self.vel[i] = 0.0
+        self.transforms[i] = np.identity(4)
+        for name in self.COLUMNS:
+            getattr(self, name)[i] = values.get(name, 0.0)
+        self.prev_pos[i] = 0.0
+        self.prev_rotation[i] = self.rotation[i]
+
+        self.parent[i] = parent
+        self.depth[i] = 0 if parent < 0 else self.depth[parent] + 1
+        self.terrain[i] = False
+        self.heightmaps[i] = None
+        self.dirty[i] = True
+        self.moving[i] = False
+        self._levels = None
+        return i
+
+    def set_parent(self, i: int, parent: int):
+        """
+        Changes the body the given one orbits around (-1 for none), bodies can be re-parented in any order.
+        Raises `ValueError` (and keeps the previous parent) if it would make a cycle.
+        """
+        previous = int(self.parent[i])
+        self.parent[i] = parent
+        try:
+            self._update_depths()
+        except ValueError:
+            self.parent[i] = previous
+            raise
+        self.dirty[i] = True
+
+    def _update_depths(self):
+        """Recomputes the depth of every body from the parents (one level of the hierarchy per iteration)"""
+        n = self.count
+        parent = self.parent[:n]
+        orbiting = parent >= 0
+
+        depth = np.zeros(n, dtype=np.intp)
+        for _ in range(n + 1):
+            new_depth = np.where(orbiting, depth[parent] + 1, 0)
+            if np.array_equal(new_depth, depth):
+                break
+            depth = new_depth
+        else:
+            raise ValueError("the orbit hierarchy contains a cycle")
+
+        self.depth[:n] = depth
+        self._levels = None
+
+    def set_heightmap(self, i: int, heights: np.ndarray | None):
+        """Sets the heightmap of the body's terrain (the faces of its cubemap, see `atlas_faces`), or removes it"""
+        self.heightmaps[i] = heights
+        self.terrain[i] = heights is not None
+
+    def copy(self) -> Self:
+        """Returns an independent copy of the table (used to simulate ahead of time)"""
+        table = copy(self)
+        for name in self._arrays():
+            setattr(table, name, getattr(self, name).copy())
+        table.heightmaps = list(self.heightmaps)
+        if self.belt != None:
+            table.belt = self.belt.copy()
+        return table
+
+    def levels(self) -> list[np.ndarray]:
+        """Returns the indices of orbiting bodies grouped by depth (planets first, then moons, ...)"""
+        if self._levels == None:
+            depth = self.depth[:self.count]
+            self._levels = [np.nonzero(depth == level)[0] for level in range(1, int(depth.max(initial=0)) + 1)]
+        return self._levels
+
+    def angular_speeds(self, G: float) -> np.ndarray:
+        """Returns the orbital angular speed of every body (0 for bodies without a parent)"""
+        n = self.count
+        parent = self.parent[:n]
+        orbiting = parent >= 0
+
+        # For a perfectly circular orbit: (https://en.wikipedia.org/wiki/Circular_orbit)
+        # acceleration = angular_speed^2 * radius
+        # angular_speed = sqrt(acceleration / radius)
+
+        # acceleration = G * m1 * m2 / radius^2 / m2
+        #              = G * m1 / radius^2
+        #
+        # angular_speed = sqrt(G * m1 / radius^3)
+        speeds = np.zeros(n)
+        mass = self.mass[:n]
+        speeds[orbiting] = np.sqrt(G * (mass[parent[orbiting]] + mass[orbiting]) / self.orbit_radius[:n][orbiting]**3)
+        return speeds
+
+    def orbit(self, G: float, dt: float):
+        """Simulate perfectly circular orbits with keplerian mechanics"""
+        n = self.count
+        self.rotation[:n] += dt*self.rotation_speed[:n]
+
+        speeds = self.angular_speeds(G)
+        angle = self.orbit_angle[:n]
+        angle += speeds*dt
+        angle[angle > 2*pi] -= 2*pi
+
+        # position and velocity relative to the parent
+        # the instantaneous velocity of a circular orbit is angular_speed * radius
+        r = self.orbit_radius[:n]
+        cos_a, sin_a = np.cos(angle), np.sin(angle)
+        local_pos = np.stack((cos_a*r, np.zeros(n), sin_a*r), axis=1)
+        local_vel = np.stack((-sin_a, np.zeros(n), cos_a), axis=1) * (speeds*r)[:, None]
+
+        # add their parent's position and velocity, one level of the hierarchy at a time
+        # so that parents are always resolved before their children
+        parent = self.parent[:n]
+        for idx in self.levels():
+            self.pos[idx] = local_pos[idx] + self.pos[parent[idx]]
+            self.vel[idx] = local_vel[idx] + self.vel[parent[idx]]
+
+        changed = np.any(self.pos[:n] != self.prev_pos[:n], axis=1) | (self.rotation[:n] != self.prev_rotation[:n])
+        self.moving[:n] |= changed
+        self.dirty[:n] |= changed
+
+        if self.belt != None:
+            self.belt.orbit(dt, self.pos[0])
+
+    def save_state(self):
+        """Remembers the current state as the previous one (call before updating)"""
+        n = self.count
+        self.prev_pos[:n] = self.pos[:n]
+        self.prev_rotation[:n] = self.rotation[:n]
+
+        # the transforms of moving bodies were interpolated from the previous state
+        self.dirty[:n] |= self.moving[:n]
+        self.moving[:n] = False
+
+        if self.belt != None:
+            self.belt.save_state()
+
+    def compute_transforms(self, alpha: float = 1.0):
+        """
+        Computes the model matrix of every body, interpolated between the previous (`alpha` = 0) and current state.
+        Equivalent to `scale(radius) * rotate_xyz(pi/2, 0, rotation) * translate(pos)` in raylib's convention.
+        Since positions are already resolved through the hierarchy by `orbit` (a body's local orbit added to its parent's position),
+        only the matrices of the bodies whose state (or interpolation) changed since the last call are recomputed
+        """
+        n = self.count
+        stale = self.dirty[:n].copy()
+        if alpha != self.transforms_alpha:
+            stale |= self.moving[:n]
+        idx = np.nonzero(stale)[0]
+
+        self.dirty[:n] = False
+        self.transforms_alpha = alpha
+        if len(idx) == 0:
+            return
+
+        r = self.radius[idx]
+        pos = self.prev_pos[idx] + (self.pos[idx] - self.prev_pos[idx])*alpha
+        rotation = self.prev_rotation[idx] + (self.rotation[idx] - self.prev_rotation[idx])*alpha
+        cos_r = np.cos(rotation)*r
+        sin_r = np.sin(rotation)*r
+
+        m = np.zeros((len(idx), 4, 4))
+        m[:, 0, 0] = cos_r
+        m[:, 0, 1] = -sin_r
+        m[:, 1, 2] = -r
+        m[:, 2, 0] = sin_r
+        m[:, 2, 1] = cos_r
+        m[:, :3, 3] = pos
+        m[:, 3, 3] = 1.0
+        self.transforms[idx] = m
+
+    def acceleration_at(self, G: float, point: np.ndarray) -> np.ndarray:
+        """Returns the gravitational acceleration caused by every body (and the asteroid belt) at the given point"""
+        n = self.count
+        acc = gravity_acceleration(G*self.mass[:n], self.pos[:n], point)
+        if self.belt != None:
+            acc += self.belt.acceleration_at(G, point)
+        return acc
+
+    def bounding_radius(self) -> np.ndarray:
+        """Radius of the spheres containing every body (including its terrain)"""
+        n = self.count
+        return self.radius[:n]*np.where(self.terrain[:n], 1 + TERRAIN_HEIGHT, 1.0)
 
-from utils import randf, randfr, vec3_zero
+    def inside(self, i: int, point: np.ndarray) -> bool:
+        """Checks if the given point is inside the body (under its terrain)"""
+        dir = self.pos[i] - point
+        dist_sqr = float(dir @ dir)
+        heights = self.heightmaps[i]
+        if heights is None:
+            return dist_sqr <= self.radius[i]**2
+        return dist_sqr <= terrain_radius(heights, self.radius[i], self.rotation[i], self.pos[i], point)**2
+
+    def collision(self, point: np.ndarray, candidates: Iterable[int] | None = None) -> int:
+        """
+        Returns the index of the first body containing the given point (under its terrain), or -1 if there is none.
+        Only the given candidates are checked if there are some (see `System.broadphase`)
+        """
+        if candidates == None:
+            # only look at the terrain of the bodies whose bounding sphere contains the point
+            n = self.count
+            dir = self.pos[:n] - point
+            candidates = np.nonzero(np.einsum("ij,ij->i", dir, dir) <= self.bounding_radius()**2)[0].tolist()
+
+        for i in candidates:
+            if self.inside(i, point):
+                return i
+        return -1
+
+class Column:
+    """Exposes a scalar column of the planet's body table as an attribute"""
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, planet, owner=None) -> float:
+        return getattr(planet.table, self.name)[planet.index].item()
+
+    def __set__(self, planet, value: float):
+        getattr(planet.table, self.name)[planet.index] = value
+        planet.table.dirty[planet.index] = True
+
+class VectorColumn(Column):
+    """Exposes a vector column of the planet's body table as a `Vector3` attribute"""
+
+    def __get__(self, planet, owner=None) -> Vector3:
+        return Vector3(*getattr(planet.table, self.name)[planet.index].tolist())
+
+    def __set__(self, planet, value: Vector3):
+        getattr(planet.table, self.name)[planet.index] = (value.x, value.y, value.z)
+        planet.table.dirty[planet.index] = True
 
 class Planet:
-    def __init__(self, orbit_radius: float, orbit_center: Self | None, G: float, surface_gravity: float, radius: float):
-        self.pos = vec3_zero()
-        self.vel = vec3_zero()
-        self.rotation = 0.0
-        self.rotation_speed = randfr(0.1, 0.9)**2 # [0; 1] range is squared -> make rotation slower in general
-
-        self.type = rl.get_random_value(0, 3)
-        self.orbit_radius = orbit_radius
-        self.orbit_angle = 0.0
+    """
+    A body of the system.
+    Its physical state is a view on its row of a `BodyTable` (owned by the system once it has been added to one)
+    """
+
+    pos = VectorColumn()
+    vel = VectorColumn()
+    mass = Column()
+    radius = Column()
+    orbit_radius = Column()
+    orbit_angle = Column()
+    rotation = Column()
+    rotation_speed = Column()
+
+    def __init__(self, orbit_radius: float, orbit_center: Self | None, G: float, surface_gravity: float, radius: float, headless: bool = False):
+        rotation_speed = randfr(0.1, 0.9)**2 # [0; 1] range is squared -> make rotation slower in general
+
+        # the planet owns its own table until it is added to a system
+        self.table = BodyTable(1)
+        self.index = self.table.add(
+            -1,
+            mass=radius*radius*surface_gravity / G, # set mass based on surface gravity
+            radius=radius,
+            orbit_radius=orbit_radius,
+            rotation_speed=rotation_speed
+        )
+
+        self.type = randint(0, 3)
         self.orbit_center = orbit_center
-        self.mass = radius*radius*surface_gravity / G # set mass based on surface gravity
-        self.radius = radius
-        self.transform = rl.matrix_identity()
+        # the sun's shader doesn't displace its surface, only planets have terrain
+        self.has_terrain = orbit_center != None
         self.seed = randint(0, 100000)
 
         scale = randfr(1.0, 3.0)
@@ -33,55 +363,94 @@ class Planet:
         gain = randfr(0.3, 0.8)
         warp = randfr(0.1, 1.5)
         ridged = bool(randint(0, 1))
-        self.noise = generate_noise((1500, 500), Vector3(scale, scale, scale), Vector2(randint(0, 10000), randint(0, 10000)), octaves, lacunarity, gain, warp, ridged, False)
-        rl.set_texture_filter(self.noise.texture, rl.TextureFilter.TEXTURE_FILTER_BILINEAR)
+        self.noise_params = NoiseParams(atlas_size(PLANET_FACE_SIZE), (scale, scale, scale), (randint(0, 10000), randint(0, 10000)), octaves, lacunarity, gain, warp, ridged, False)
+        # headless planets don't have any GPU resources (until `load_noise` is called)
+        self.maps: TerrainMaps | None = None
+        # collide with the GPU generated heightmap once it is finished (otherwise only with `load_terrain`'s)
+        self.gpu_terrain = True
+        self.noise_job: NoiseJob | None = None
+        if not headless:
+            self.load_noise()
 
         self.oxygen = randint(0, 30)
         self.temp = randint(-150, 150)
         self.eau = randint(0, 75)
         self.colors = self.gen_layer() 
+        # same colors as floats between 0 and 1, uploaded to the planet shader in one call
+        self.layer_colors = np.array([(c.r, c.g, c.b, c.a) for c in self.colors], dtype=np.float32) / 255
 
         self.scanned = False
 
-    def orbit(self, G: float, dt: float):
-        """Simulate perfectly circular orbit with keplerian mechanics"""
-        self.rotation += dt*self.rotation_speed
+    def load_noise(self, queue: NoiseQueue | None = None):
+        """
+        Generate the planet's noise texture on the GPU, and its height and normal maps from it.
+        With a queue, low resolution maps are used until the queue has generated the full ones.
+        """
+        if queue == None:
+            self.set_noise(self.noise_params.generate())
+            return
+
+        self.set_noise(self.noise_params.resized(PLACEHOLDER_SIZE).generate())
+        self.noise_job = queue.add(self.noise_params, lambda: self.table.pos[self.index], self.set_noise)
+
+    def set_noise(self, maps: TerrainMaps):
+        """Replace the planet's maps (giving back the previous ones to the pool)"""
+        if self.maps != None:
+            self.maps.unload()
+        self.maps = maps
 
-        if self.orbit_center == None:
+        # the full texture was just generated (and cached), use it for collisions too
+        if self.has_terrain and self.gpu_terrain and maps.size == self.noise_params.size:
+            heights = heightmap_cache.load(self.noise_params)
+            if heights is not None:
+                self.table.set_heightmap(self.index, atlas_faces(heights))
+
+    def load_terrain(self, size: tuple[int, int] = TERRAIN_SIZE):
+        """
+        Loads the planet's heightmap for collisions without the GPU
+        (from the cache, or computed on the CPU at the given resolution)
+        """
+        if not self.has_terrain:
             return
 
-        # For a perfectly circular orbit: (https://en.wikipedia.org/wiki/Circular_orbit)
-        # acceleration = angular_speed^2 * radius
-        # angular_speed = sqrt(acceleration / radius)
+        params = self.noise_params.resized(size)
+        heights = heightmap_cache.load(params)
+        if heights is None:
+            heights = np.round(bake(params)*255).astype(np.uint8)
+            heightmap_cache.store(params, heights)
+        self.table.set_heightmap(self.index, atlas_faces(heights))
 
-        # acceleration = G * m1 * m2 / radius^2 / m2
-        #              = G * m1 / radius^2
-        #
-        # angular_speed = sqrt(G * m1 / radius^3)
+    def unload_noise(self):
+        """Give back the planet's maps to the pool, and cancel the generation of its noise texture if it isn't finished"""
+        if self.noise_job != None:
+            self.noise_job.cancel()
+            self.noise_job = None
+        if self.maps != None:
+            self.maps.unload()
+            self.maps = None
+
+    @property
+    def transform(self) -> Matrix:
+        """The planet's model matrix, as computed by `BodyTable.compute_transforms`"""
+        return Matrix(*self.table.transforms[self.index].ravel().tolist())
+
+    def attach(self, table: BodyTable):
+        """
+        Moves the planet's row into the given table.
+        If its orbit center isn't in it yet, the parent is set when the orbit center is added (see `System.add`)
+        """
+        parent = -1
+        if self.orbit_center != None and self.orbit_center.table is table:
+            parent = self.orbit_center.index
 
-        angular_speed = sqrt(G * (self.orbit_center.mass + self.mass) / (self.orbit_radius**3))
-        self.orbit_angle += angular_speed*dt
-        if self.orbit_angle > 2*pi:
-            self.orbit_angle -= 2*pi
-        self.pos = Vector3(cos(self.orbit_angle)*self.orbit_radius, 0, sin(self.orbit_angle)*self.orbit_radius)
-        self.pos = rl.vector3_add(self.pos, self.orbit_center.pos)
-
-        # get instantaneous velocity:
-        # velocity^2 / r = angular_speed^2 * r
-        # velocity = sqrt(angular_speed^2 * r^2)
-        # velocty = angular_speed * r
-        velocity = angular_speed * self.orbit_radius
-
-        self.vel = rl.vector3_scale(Vector3(-sin(self.orbit_angle), 0, cos(self.orbit_angle)), velocity)
-        # add their parent's velocity
-        self.vel = rl.vector3_add(self.vel, self.orbit_center.vel)
-
-    def compute_transform(self):
-        radius = self.radius
-        pos = self.pos
-        self.transform = rl.matrix_scale(radius, radius, radius)
-        self.transform = rl.matrix_multiply(self.transform, rl.matrix_rotate_xyz(Vector3(pi/2, 0.0, self.rotation)))
-        self.transform = rl.matrix_multiply(self.transform, rl.matrix_translate(pos.x, pos.y, pos.z))
+        index = table.add(parent, **{ name: getattr(self, name) for name in BodyTable.COLUMNS })
+        table.pos[index] = self.table.pos[self.index]
+        table.vel[index] = self.table.vel[self.index]
+        table.transforms[index] = self.table.transforms[self.index]
+        table.prev_pos[index] = table.pos[index]
+        table.prev_rotation[index] = table.rotation[index]
+        table.set_heightmap(index, self.table.heightmaps[self.index])
+        self.table, self.index = table, index
 
     def gen_layer(self):
         colors = []
@@ -103,7 +472,15 @@ class Planet:
 class System:
     def __init__(self, sun: Planet):
         sun.rotation_speed = randfr(0.02, 0.2)
+        self.table = BodyTable()
+        sun.attach(self.table)
         self.bodies = [sun]
+        # bounding volume hierarchy of the bodies, updated on every tick
+        self.broadphase = BVH()
+
+        # stars of the sky (see `gen_sky`), the faces can be generated ahead of time on another thread
+        self.sky_seed = randint(0, 100000)
+        self.sky_faces: np.ndarray | None = None
 
         angle = randf()*2*PI
         r = float(randint(2800, 3200))
@@ -115,11 +492,26 @@ class System:
     def add(self, planet: Planet):
         """
         Adds a new planet to the system.
-        Note that planets should be added "in order of orbit",
-        that means, planets should be added first, then moons, then moons of moons, etc...
+        Planets can be added in any order: the bodies already added that orbit around it are attached to it.
         """
+        planet.attach(self.table)
+        for body in self.bodies:
+            if body.orbit_center is planet:
+                self.table.set_parent(body.index, planet.index)
         self.bodies.append(planet)
 
+    def add_belt(self, G: float, count: int):
+        """
+        Adds an asteroid belt of the given size around the sun, past the outermost planet and its moons
+        (but never closer than where the player arrives in the system, and before the wormhole)
+        """
+        outermost = max((planet.orbit_radius for planet in self.planets() if planet.orbit_center is self.bodies[0]), default=0.0)
+        inner = max(outermost + 200.0, 1500.0)
+        outer = inner + randint(150, 300)
+        sun = self.bodies[0]
+        self.table.belt = AsteroidBelt(count, inner, outer, randint(10, 30), G, sun.mass, randint(0, 2**31 - 1))
+        self.table.belt.place(self.table.pos[sun.index])
+
     def planets(self) -> Iterable[Planet]:
         """
         Returns an iterator over only the system's planets (without the sun)
@@ -128,31 +520,86 @@ class System:
     
     def unload(self):
         """
-        Unload every planet's textures
+        Unload every planet's textures (their cubemaps are kept in a pool for the next system, see `TerrainMaps`)
         """
-        for planet in self.planets():
-            rl.unload_render_texture(planet.noise)
+        for planet in self.bodies:
+            planet.unload_noise()
+
+    def place(self, G: float):
+        """Computes the initial position and transform of every body (without any interpolation)"""
+        self.table.orbit(G, 0.0)
+        self.table.save_state()
+        self.table.compute_transforms()
+        self.update_broadphase()
 
     def update(self, G: float, dt: float):
-        """Updates the solar system to its next position"""
-        for body in self.bodies:
-            body.orbit(G, dt)
-            body.compute_transform()
+        """
+        Updates the solar system to its next position.
+        Transforms are not updated, use `table.compute_transforms` before rendering
+        """
+        self.table.save_state()
+        self.table.orbit(G, dt)
+        self.update_broadphase()
+
+    def update_broadphase(self):
+        """Refits the bounding volume hierarchy to the bodies' current position"""
+        self.broadphase.update(self.table.pos[:self.table.count], self.table.bounding_radius())
 
 class NewSystem:
-    def new_sys(self, G: float) -> System:
-        system = System(Planet(0, None, G, 20, 250))
+    def __init__(self, headless: bool = False, noise_queue: NoiseQueue | None = None, asteroids: int | None = None, gpu_terrain: bool = True):
+        """
+        Headless systems are generated without any GPU resources (and can be used without a window).
+        With a noise queue, the planets' textures are generated progressively by the queue instead of right away.
+        The number of asteroids of every system can be forced (for example `LARGE_BELT_SIZE`, 0 for none).
+        Without `gpu_terrain`, collisions only use the terrain computed on the CPU (see `Planet.load_terrain`),
+        which doesn't depend on when the textures are finished (to replay a game exactly).
+        """
+        self.headless = headless
+        self.noise_queue = noise_queue
+        self.asteroids = asteroids
+        self.gpu_terrain = gpu_terrain
 
-        nb_planet = randint(3,7)
+    def new_sys(self, G: float, seed_value: int | None = None, nb_planet: int | None = None, nb_asteroids: int | None = None) -> System:
+        """
+        Generates a new random system.
+        Giving a seed makes the generation reproducible, and the number of planets can be forced (3 to 7 by default).
+        The number of asteroids can be forced too, otherwise half of the systems have a belt (see `BELT_SIZE`)
+        """
+        if seed_value != None:
+            seed(seed_value)
+
+        # planets are created without textures, they are generated once the system is complete
+        headless = self.headless or self.noise_queue != None
+
+        system = System(Planet(0, None, G, 20, 250, headless))
+
+        if nb_planet == None:
+            nb_planet = randint(3,7)
 
         for i in range(nb_planet):
             radius = randint(40, 75)
-            system.add(Planet(500 + randint(175, 250)*i, system.bodies[0], G, 0.075*radius//1, radius))
+            system.add(Planet(500 + randint(175, 250)*i, system.bodies[0], G, 0.075*radius//1, radius, headless))
 
         #Génère de façon aléatoire des lunes (1 chance sur 4 par planète)  
         for j in range(1, nb_planet +1):
             lune = randint(1, 100)
             if lune <= 25:
                 radius = randint(12, 25)
-                system.add(Planet(125, system.bodies[j], G, 0.075 * radius // 1, radius))
+                system.add(Planet(125, system.bodies[j], G, 0.075 * radius // 1, radius, headless))
+
+        if nb_asteroids == None:
+            nb_asteroids = self.asteroids
+        if nb_asteroids == None:
+            nb_asteroids = randint(*BELT_SIZE) if randint(1, 2) == 1 else 0
+        if nb_asteroids > 0:
+            system.add_belt(G, nb_asteroids)
+
+        if not self.gpu_terrain:
+            for planet in system.planets():
+                planet.gpu_terrain = False
+                planet.load_terrain()
+
+        if not self.headless and self.noise_queue != None:
+            for planet in system.bodies:
+                planet.load_noise(self.noise_queue)
         return system
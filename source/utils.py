@@ -1,15 +1,31 @@
 from math import tan, radians, sqrt
 from typing import TypeAlias
+import random
 
-from pyray import Vector3, Camera3D, Vector4, vector_3distance, get_random_value, remap
+import numpy as np
+from pyray import Vector3, Camera3D, Vector4, vector_3distance, remap
 import pyray as rl
 from raylib.defines import RL_TRIANGLES
 
 Quat: TypeAlias = Vector4
 
+# directory where generated data is cached between runs
+CACHE_DIR = "cache"
+
+# random generator used by all procedural generation (seed it to get reproducible systems)
+rng = random.Random()
+
 def vec3_zero() -> Vector3:
     return Vector3(0, 0, 0)
 
+def vec3_to_array(v: Vector3) -> np.ndarray:
+    """Converts a raylib vector to a numpy array"""
+    return np.array((v.x, v.y, v.z))
+
+def array_to_vec3(a: np.ndarray) -> Vector3:
+    """Converts a numpy array of 3 elements to a raylib vector"""
+    return Vector3(*a.tolist())
+
 def print_vec3(v: Vector3):
     print(v.x, v.y, v.z)
 
@@ -32,32 +48,43 @@ def get_projected_sphere_radius(cam: Camera3D, screen_height: float, center: Vec
     pr = cot(fov) * radius / sqrt(d*d - radius*radius)
     return pr * screen_height / 2
 
+def seed(value: int):
+    """Seeds the random generator used by procedural generation"""
+    rng.seed(value)
+
+def randint(min: int, max: int) -> int:
+    """Returns a random integer between the minimum and the maximum (both inclusive)"""
+    return rng.randint(min, max)
+
 def randf() -> float:
     """Returns value between 0 (inclusive) and 1 (exclusive)"""
-    return get_random_value(0, 32767)/32767
+    return rng.random()
 
 def randfr(min: float, max: float) -> float:
     """Returns a random floating point value between the mininum (inclusive) and the maximum (exclusive)"""
     return remap(randf(), 0.0, 1.0, min, max)
 
-def draw_rectangle_tex_coords(x: float, y: float, w: float, h: float):
-    """Draw a rectangle at the given coordinates with uvs (useful for 2d shaders)"""
+def draw_rectangle_tex_coords(x: float, y: float, w: float, h: float, v0: float = 0.0, v1: float = 1.0):
+    """
+    Draw a rectangle at the given coordinates with uvs (useful for 2d shaders).
+    The vertical uvs can be restricted to [v0; v1] to only draw a part of a bigger rectangle.
+    """
     rl.rl_begin(RL_TRIANGLES)
 
     rl.rl_color4f(1.0, 1.0, 1.0, 1.0);
 
-    rl.rl_tex_coord2f(0.0, 0.0)
+    rl.rl_tex_coord2f(0.0, v0)
     rl.rl_vertex2f(x, y)
-    rl.rl_tex_coord2f(0.0, 1.0)
+    rl.rl_tex_coord2f(0.0, v1)
     rl.rl_vertex2f(x, y + h)
-    rl.rl_tex_coord2f(1.0, 0.0)
+    rl.rl_tex_coord2f(1.0, v0)
     rl.rl_vertex2f(x + w, y)
 
-    rl.rl_tex_coord2f(1.0, 0.0)
+    rl.rl_tex_coord2f(1.0, v0)
     rl.rl_vertex2f(x + w, y)
-    rl.rl_tex_coord2f(0.0, 1.0)
+    rl.rl_tex_coord2f(0.0, v1)
     rl.rl_vertex2f(x, y + h)
-    rl.rl_tex_coord2f(1.0, 1.0)
+    rl.rl_tex_coord2f(1.0, v1)
     rl.rl_vertex2f(x + w, y + h)
 
     rl.rl_end()